@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+import yaml
+
+from twicorder.auth import Credential, CredentialPool
+from twicorder.config import Config
+from twicorder.search.mockapi import MockApi, MockApiServer
+from twicorder.utils import Singleton
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'config')
+
+# Settings keeping tests fast and offline
+TEST_CONFIG = {
+    'config_reload_interval': 3600,
+    'use_mongo': False,
+    'retry': {'max_attempts': 3, 'base_delay': .01, 'max_delay': .05},
+    'circuit_breaker': {'failure_threshold': 5, 'recovery_timeout': 1},
+    'query_time_budget': 30,
+}
+
+# A short backlog of tweets, so queries finish in a few pages
+MOCK_API_OPTIONS = {'backlog': 120., 'window': 60.}
+
+
+@pytest.fixture
+def config_overrides():
+    """
+    Config settings to apply on top of the test config. Override this fixture
+    in a test module to change settings.
+    """
+    return {}
+
+
+def write_config(project_dir, overrides):
+    """
+    Writes the test config to the project dir and clears the cached config.
+
+    Args:
+        project_dir (str): Project dir
+        overrides (dict): Settings to apply on top of the test config
+
+    """
+    with open(os.path.join(CONFIG_DIR, 'config.yaml')) as stream:
+        config = yaml.safe_load(stream)
+    config.update(TEST_CONFIG)
+    config.update(overrides)
+    with open(os.path.join(project_dir, 'config.yaml'), 'w') as stream:
+        yaml.safe_dump(config, stream)
+    Config.setup(project_dir)
+    Config._cache = None
+
+
+@pytest.fixture
+def project(tmp_path, config_overrides):
+    """
+    Sets up a project dir with its own config file, app data and output, and
+    resets the singletons holding state between tests.
+    """
+    write_config(str(tmp_path), config_overrides)
+    Singleton._instances.clear()
+    yield str(tmp_path)
+    Config._cache = None
+    Singleton._instances.clear()
+
+
+@pytest.fixture
+def mock_api_options():
+    """
+    Keyword arguments for the mock API. Parametrize this fixture to inject
+    faults.
+    """
+    return {}
+
+
+@pytest.fixture
+def mock_api(project, config_overrides, mock_api_options):
+    """
+    Serves a mock API, with search queries pointed at it through the config
+    and a synthetic credential in the credential pool.
+    """
+    api = MockApi(**dict(MOCK_API_OPTIONS, **mock_api_options))
+    server = MockApiServer(api)
+    server.start()
+    write_config(project, dict(config_overrides, api_base_url=server.base_url))
+    CredentialPool().add(
+        Credential(
+            consumer_key='test-consumer',
+            consumer_secret='test',
+            access_token='test-token',
+            access_secret='test'
+        )
+    )
+    yield api
+    server.shutdown()
+    server.server_close()
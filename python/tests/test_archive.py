@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from twicorder.search.archive import ArchivePlanner, ArchiveSearch
+from twicorder.search.queries.request_queries import (
+    FullArchiveGetQuery,
+    StandardSearchQuery,
+)
+from twicorder.utils import AppData
+
+
+def make_search(concurrency, max_requests=None, query_type=None, **kwargs):
+    planner = ArchivePlanner(
+        query_type or FullArchiveGetQuery,
+        'archive',
+        '202001010000',
+        '202001020000',
+        initial_slices=4,
+        **(kwargs or {'query': '#archive'})
+    )
+    return ArchiveSearch(
+        planner, concurrency=concurrency, max_requests=max_requests
+    )
+
+
+def test_client_error_stops_slice_workers(mock_api):
+    # The mock API has no full-archive endpoints and responds with a 404
+    search = make_search(concurrency=2)
+    search.run(estimate=True)
+    # One request to estimate the counts, then one per slice worker
+    assert mock_api.stats[404] == 3
+    assert search.requests == 2
+    assert search.planner.completed == []
+
+
+@pytest.mark.parametrize('config_overrides', [
+    {'circuit_breaker': {'failure_threshold': 100, 'recovery_timeout': 1}}
+])
+@pytest.mark.parametrize('mock_api_options', [{'error_rate': 1.}])
+def test_server_errors_give_up_slice_without_spending_budget(mock_api):
+    # The mock API only injects faults for endpoints it serves
+    search = make_search(
+        concurrency=1,
+        max_requests=3,
+        query_type=StandardSearchQuery,
+        q='#archive'
+    )
+    search.run(estimate=False)
+    # The slice is given up after three failed runs of its query, each making
+    # three attempts, and no pages were fetched with the budget
+    assert search.requests == 0
+    assert sum(mock_api.stats.values()) == 9
+    assert search.planner.completed == []
+    slices = AppData().get_archive_slices(search.planner.plan_hash)
+    assert [bool(s[3]) for s in slices] == [False]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import json
+import os
+
+import pytest
+
+from twicorder.exporter.controller import Exporter
+from twicorder.search.queries.request_queries import StandardSearchQuery
+from twicorder.synthetic import TweetCorpus
+from twicorder.utils import (
+    iterlines,
+    readlines,
+    stream_to_search,
+    timestamp_to_datetime,
+)
+
+# Compare runs with --benchmark-autosave and --benchmark-compare
+pytest.importorskip('pytest_benchmark')
+
+ACCOUNT = 'benchmark'
+TWEETS_PER_FILE = 500
+ROUNDS = 3
+
+
+@pytest.fixture(params=[False, True], ids=['plain', 'compressed'])
+def corpus(request, project):
+    """
+    Writes stream files and user timelines to the project dir, plain or
+    compressed.
+
+    Returns:
+        tuple[str, list[str]]: Raw data dir and paths of files written
+
+    """
+    raw_data_path = os.path.join(project, 'raw')
+    paths = TweetCorpus(seed=0).write(
+        raw_data_path,
+        stream_files=2,
+        accounts=[ACCOUNT],
+        timeline_files=2,
+        tweets_per_file=TWEETS_PER_FILE,
+        compress=request.param
+    )
+    return raw_data_path, paths
+
+
+def lines(paths, endpoint):
+    """
+    Lines of the raw files for the given endpoint, "stream" or "timeline".
+    """
+    paths = [p for p in paths if endpoint in p.split(os.sep)]
+    return [line for p in paths for line in iterlines(p)]
+
+
+def new_db(project):
+    """
+    Paths of fresh databases in the project dir, one per round.
+    """
+    for idx in itertools.count():
+        yield os.path.join(project, f'benchmark_{idx}.db')
+
+
+def test_exporter_start(benchmark, corpus, project):
+    raw_data_path, paths = corpus
+    db_paths = new_db(project)
+
+    def setup():
+        return (Exporter(raw_data_path, output_path=next(db_paths)),), {}
+
+    benchmark.extra_info['tweets'] = len(paths) * TWEETS_PER_FILE
+    benchmark.pedantic(Exporter.start, setup=setup, rounds=ROUNDS)
+
+
+def test_register_tweet(benchmark, corpus, project):
+    raw_data_path, paths = corpus
+    raw_lines = lines(paths, 'stream') + lines(paths, 'timeline')
+    db_paths = new_db(project)
+
+    def setup():
+        exporter = Exporter(raw_data_path, output_path=next(db_paths))
+        return (exporter, [json.loads(line) for line in raw_lines]), {}
+
+    def register(exporter, tweets):
+        for line, tweet in enumerate(tweets, 1):
+            exporter.register_tweet(tweet, 'benchmark.txt', line)
+
+    benchmark.extra_info['tweets'] = len(raw_lines)
+    benchmark.pedantic(register, setup=setup, rounds=ROUNDS)
+
+
+def test_readlines(benchmark, corpus):
+    _, paths = corpus
+
+    def read():
+        for path in paths:
+            readlines(path)
+
+    benchmark(read)
+
+
+def test_iterlines(benchmark, corpus):
+    _, paths = corpus
+
+    def read():
+        for path in paths:
+            for _ in iterlines(path):
+                pass
+
+    benchmark(read)
+
+
+def test_stream_to_search(benchmark, corpus):
+    _, paths = corpus
+    raw_lines = lines(paths, 'stream')
+
+    def setup():
+        return ([json.loads(line) for line in raw_lines],), {}
+
+    def convert(tweets):
+        for tweet in tweets:
+            stream_to_search(tweet)
+
+    benchmark.extra_info['tweets'] = len(raw_lines)
+    benchmark.pedantic(convert, setup=setup, rounds=ROUNDS)
+
+
+def test_timestamp_to_datetime(benchmark, corpus):
+    _, paths = corpus
+    raw_lines = lines(paths, 'timeline')
+
+    def setup():
+        return ([json.loads(line) for line in raw_lines],), {}
+
+    def convert(tweets):
+        for tweet in tweets:
+            timestamp_to_datetime(tweet)
+
+    benchmark.extra_info['tweets'] = len(raw_lines)
+    benchmark.pedantic(convert, setup=setup, rounds=ROUNDS)
+
+
+def test_search_page(benchmark, mock_api):
+    def setup():
+        return (StandardSearchQuery('benchmark', q='#benchmark'),), {}
+
+    benchmark.pedantic(StandardSearchQuery.fetch, setup=setup, rounds=ROUNDS)
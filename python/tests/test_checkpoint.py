@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from twicorder.search.exchange import QueryExchange
+from twicorder.search.queries.request_queries import StandardSearchQuery
+from twicorder.utils import AppData
+
+
+def make_query():
+    # The mock API holds two minutes of tweets, so this takes three pages
+    return StandardSearchQuery('checkpoint', q='#checkpoint', count=50)
+
+
+def test_first_page_cursor_holds_last_id(mock_api):
+    query = make_query()
+    results = query.fetch()
+    assert not query.done
+    assert query.cursor['last_id'] == results[0]['id_str']
+
+
+def test_checkpoint_after_first_page(mock_api):
+    query = make_query()
+    query.run()
+    cursor = AppData().get_query_checkpoint(query.uid)
+    assert cursor['more_results']
+    assert cursor['last_id'] == query.last_id
+    assert AppData().get_last_query_id(query.uid) == int(query.last_id)
+
+
+def test_restored_query_keeps_newest_id(mock_api):
+    query = make_query()
+    query.run()
+    newest_id = query.last_id
+
+    # Resume in a new session from the checkpoint
+    restored = make_query()
+    restored.restore(AppData().get_query_checkpoint(restored.uid))
+    assert restored.last_id == newest_id
+    while not restored.done:
+        restored.run()
+    assert restored.pages == 2
+    assert AppData().get_last_query_id(query.uid) == int(newest_id)
+    assert AppData().get_query_checkpoint(query.uid) is None
+
+
+def test_exchange_restores_checkpointed_queries(mock_api):
+    query = make_query()
+    query.run()
+    newest_id = query.last_id
+
+    exchange = QueryExchange()
+    exchange.restore({query.name: StandardSearchQuery})
+    exchange.wait()
+    assert AppData().get_query_checkpoints() == []
+    assert AppData().get_last_query_id(query.uid) == int(newest_id)
+
+    # The next run only looks for tweets newer than those already found
+    assert make_query().kwargs['since_id'] == int(newest_id)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from twicorder.search.exchange import QueryExchange
+from twicorder.search.queries.request_queries import (
+    CoalescedSearchQuery,
+    StandardSearchQuery,
+)
+from twicorder.utils import AppData
+
+
+def make_queries():
+    return [
+        StandardSearchQuery(term, q=f'#{term}', count=50)
+        for term in ('coalesce_a', 'coalesce_b')
+    ]
+
+
+def test_members_are_finalised_on_final_page(mock_api):
+    queries = make_queries()
+    query = CoalescedSearchQuery(queries)
+    query.run()
+    assert not query.done
+    # The original queries must still search back to where they were
+    for member in queries:
+        assert AppData().get_last_query_id(member.uid) is None
+
+    while not query.done:
+        query.run()
+    for member in queries:
+        assert AppData().get_last_query_id(member.uid) == int(query.last_id)
+    assert AppData().get_query_checkpoints() == []
+
+
+def test_interrupted_search_resumes_from_cursor(mock_api, monkeypatch):
+    query = CoalescedSearchQuery(make_queries())
+    query.run()
+    query.run()
+    newest_id = query.last_id
+    cursor = AppData().get_query_checkpoint(query.uid)
+    assert cursor == query.cursor
+    assert cursor['more_results']
+
+    urls = []
+    send = StandardSearchQuery.send
+
+    def record_send(self):
+        urls.append(self.request_url)
+        return send(self)
+
+    monkeypatch.setattr(StandardSearchQuery, 'send', record_send)
+
+    # Resume in a new session, where the queries are coalesced again
+    exchange = QueryExchange()
+    exchange.restore({StandardSearchQuery._name: StandardSearchQuery})
+    exchange.wait()
+    assert urls[0].endswith(cursor['more_results'] + '&tweet_mode=extended')
+    assert AppData().get_query_checkpoints() == []
+    for member in make_queries():
+        assert AppData().get_last_query_id(member.uid) == int(newest_id)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from twicorder.search.coordination import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / 'coordination' / 'queue.db'))
+
+
+def enqueue(queue, query_hash, endpoint='search/tweets'):
+    return queue.enqueue(
+        query_hash, 'free_search', 'out', {'q': query_hash}, endpoint,
+        task_hash='task'
+    )
+
+
+def test_enqueue_is_idempotent(queue):
+    assert enqueue(queue, 'a')
+    assert not enqueue(queue, 'a')
+    queue.lease('w1', ['search/tweets'], 60.)
+    assert not enqueue(queue, 'a')
+
+
+def test_lease_is_exclusive_in_queue_order(queue):
+    enqueue(queue, 'a')
+    enqueue(queue, 'b', endpoint='statuses/user_timeline')
+    enqueue(queue, 'c')
+    lease = queue.lease('w1', ['search/tweets'], 60.)
+    assert lease == ('a', 'free_search', 'out', {'q': 'a'}, 'task', None)
+    assert queue.lease('w2', ['search/tweets'], 60.)[0] == 'c'
+    assert queue.lease('w3', ['search/tweets'], 60.) is None
+    assert queue.lease('w3', [], 60.) is None
+    assert queue.lease('w3', ['statuses/user_timeline'], 60.)[0] == 'b'
+
+
+def test_expired_lease_passes_on_with_cursor(queue):
+    enqueue(queue, 'a')
+    queue.lease('w1', ['search/tweets'], .2)
+    assert queue.update_cursor('w1', 'a', {'max_id': 10})
+    assert not queue.update_cursor('w2', 'a', {'max_id': 5})
+    assert queue.lease('w2', ['search/tweets'], 60.) is None
+
+    time.sleep(.3)
+    # The first worker lost its lease, and can't renew or advance it
+    assert queue.heartbeat('w1', 60.) == 0
+    assert not queue.update_cursor('w1', 'a', {'max_id': 5})
+    lease = queue.lease('w2', ['search/tweets'], 60.)
+    assert lease[0] == 'a'
+    assert lease[-1] == {'max_id': 10}
+
+
+def test_heartbeat_renews_leases(queue):
+    enqueue(queue, 'a')
+    queue.lease('w1', ['search/tweets'], .2)
+    assert queue.heartbeat('w1', 60.) == 1
+    time.sleep(.3)
+    assert queue.lease('w2', ['search/tweets'], 60.) is None
+
+
+def test_release_and_complete(queue):
+    enqueue(queue, 'a')
+    queue.lease('w1', ['search/tweets'], 60.)
+    queue.release('w2', 'a')
+    assert queue.lease('w2', ['search/tweets'], 60.) is None
+    queue.release('w1', 'a')
+    assert queue.lease('w2', ['search/tweets'], 60.)[0] == 'a'
+
+    assert not queue.complete('w1', 'a')
+    assert queue.complete('w2', 'a')
+    assert queue.lease('w1', ['search/tweets'], 60.) is None
+    assert enqueue(queue, 'a')
+
+
+def test_task_runs_are_claimed_once_per_interval(queue, tmp_path):
+    other = WorkQueue(str(tmp_path / 'coordination' / 'queue.db'))
+    intervals = {'t1': 900., 't2': 100.}
+    assert sorted(queue.claim_task_runs(intervals)) == ['t1', 't2']
+    assert other.claim_task_runs(intervals) == []
+    assert queue.claim_task_runs(intervals) == []
+    # Runs may be claimed early within the slack
+    assert other.claim_task_runs(intervals, slack=100.) == ['t2']
+
+
+def test_watermark_only_moves_forward(queue):
+    assert queue.get_watermark('a') is None
+    queue.set_watermark('a', '200')
+    queue.set_watermark('a', 100)
+    assert queue.get_watermark('a') == 200
+    queue.set_watermark('a', 300)
+    assert queue.get_watermark('a') == 300
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+
+from sqlalchemy import create_engine
+
+from twicorder.exporter.dedup import TweetIdIndex
+from twicorder.exporter.tables import Tweet, create_tables
+
+
+def test_membership_after_load_and_add():
+    index = TweetIdIndex()
+    index.load([2, 3, 5, 7, 11])
+    assert len(index) == 5
+    assert 7 in index
+    assert 4 not in index
+    assert 13 not in index
+    assert 1 not in index
+
+    index.add(4)
+    index.add(7)
+    index.add(4)
+    assert len(index) == 6
+    assert 4 in index
+
+
+def test_added_ids_are_merged_into_the_array():
+    ids = random.Random(0).sample(range(1, 2 ** 63), 100001)
+    index = TweetIdIndex()
+    for tweet_id in ids:
+        index.add(tweet_id)
+    assert len(index) == len(ids)
+    # Merged once more than 100 000 IDs had been added
+    assert len(index._added) == 0
+    assert list(index._ids) == sorted(ids)
+    assert all(tweet_id in index for tweet_id in ids[::1000])
+    assert ids[0] + 1 not in index
+
+
+def test_load_replaces_contents():
+    index = TweetIdIndex()
+    index.add(1)
+    index.load([5])
+    assert 1 not in index
+    assert 5 in index
+    assert len(index) == 1
+
+
+def test_from_table():
+    engine = create_engine('sqlite://')
+    create_tables(engine)
+    ids = random.Random(0).sample(range(1, 2 ** 63), 1000)
+    with engine.connect() as connection:
+        connection.execute(
+            Tweet.__table__.insert(), [{'tweet_id': i} for i in ids]
+        )
+        index = TweetIdIndex.from_table(
+            connection, Tweet.__table__.c.tweet_id, chunk_size=64
+        )
+    assert len(index) == 1000
+    assert list(index._ids) == sorted(ids)
+    assert all(tweet_id in index for tweet_id in ids)
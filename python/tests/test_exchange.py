@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from threading import Thread
+
+from twicorder.search.exchange import QueryExchange
+from twicorder.search.queries.request_queries import StandardSearchQuery
+from twicorder.utils import AppData
+
+
+def test_wait_stops_workers_and_persisters(project):
+    exchange = QueryExchange()
+    exchange.get_queue('/search/tweets')
+    exchange.get_queue('/statuses/user_timeline')
+    workers = [t for threads in exchange.threads.values() for t in threads]
+    exchange.wait()
+    for worker in workers:
+        assert not worker.is_alive()
+        assert not worker.persister.is_alive()
+
+
+def test_page_keeps_state_of_its_fetch(mock_api):
+    query = StandardSearchQuery('pipeline', q='#pipeline', count=50)
+    first = query.fetch_page()
+    second = query.fetch_page()
+    assert not first.final
+    assert first.cursor['more_results'] != second.cursor['more_results']
+
+    # Saving the first page after the second was fetched checkpoints the
+    # query where the first page left it.
+    query.persist(first.results, final=first.final, cursor=first.cursor)
+    assert AppData().get_query_checkpoint(query.uid) == first.cursor
+    assert query.results == first.results
+
+
+def test_fetch_waits_for_persist(mock_api):
+    query = StandardSearchQuery('pipeline', q='#pipeline', count=50)
+    pages = []
+    with query._lock:
+        thread = Thread(target=lambda: pages.append(query.fetch_page()))
+        thread.start()
+        # The request is sent while a page is being persisted, but the query
+        # state is only updated once persisting is done.
+        deadline = time.time() + 5
+        while not mock_api.stats.get(200) and time.time() < deadline:
+            time.sleep(.01)
+        thread.join(.2)
+        assert thread.is_alive()
+        assert query.last_id is None
+    thread.join()
+    assert query.last_id == pages[0].results[0]['id_str']
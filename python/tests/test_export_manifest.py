@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+from twicorder.exporter.controller import Exporter
+from twicorder.synthetic import TweetCorpus
+
+
+@pytest.fixture
+def corpus():
+    return TweetCorpus(seed=0)
+
+
+def write_raw(corpus, raw, compress=False):
+    return corpus.write(
+        str(raw),
+        stream_files=2,
+        accounts=['manifest'],
+        timeline_files=1,
+        tweets_per_file=50,
+        compress=compress
+    )
+
+
+def export(raw, output):
+    return Exporter(str(raw), output_path=str(output), autostart=True)
+
+
+def manifest(output, path):
+    conn = sqlite3.connect(str(output))
+    try:
+        return conn.execute(
+            'SELECT byte_offset, line_count FROM ingested_files WHERE path=?',
+            (path,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def tweet_ids(output):
+    conn = sqlite3.connect(str(output))
+    try:
+        return {r[0] for r in conn.execute('SELECT tweet_id FROM tweets')}
+    finally:
+        conn.close()
+
+
+def timeline_lines(corpus, count, start=50):
+    tweets = corpus.timeline_tweets('manifest', count, start=start)
+    return [json.dumps(t) + '\n' for t in tweets]
+
+
+def test_unchanged_files_are_skipped(corpus, tmp_path):
+    raw = tmp_path / 'raw'
+    output = tmp_path / 'tweets.db'
+    write_raw(corpus, raw)
+    first = export(raw, output)
+    assert first.stats['exported_tweets']
+    assert first.stats['skipped_files'] == 0
+
+    second = export(raw, output)
+    assert second.stats['skipped_files'] == 3
+    assert second.stats['exported_tweets'] == 0
+    assert second.stats['skipped_tweets'] == 0
+
+
+def test_appended_lines_are_exported(corpus, tmp_path):
+    raw = tmp_path / 'raw'
+    output = tmp_path / 'tweets.db'
+    path = write_raw(corpus, raw)[-1]
+    raw_file = path.replace(str(raw), '')
+    export(raw, output)
+    offset, line_count = manifest(output, raw_file)
+    assert offset == os.path.getsize(path)
+    assert line_count == 50
+
+    lines = timeline_lines(corpus, 10)
+    with open(path, 'a') as stream:
+        stream.writelines(lines)
+    exporter = export(raw, output)
+    # The other files are unchanged, and the timeline file is read from
+    # where the first export stopped.
+    assert exporter.stats['skipped_files'] == 2
+    assert exporter.stats['skipped_tweets'] == 0
+    assert manifest(output, raw_file) == (os.path.getsize(path), 60)
+    assert {json.loads(line)['id'] for line in lines} <= tweet_ids(output)
+
+
+def test_partial_trailing_line_is_left_for_next_run(corpus, tmp_path):
+    raw = tmp_path / 'raw'
+    output = tmp_path / 'tweets.db'
+    path = write_raw(corpus, raw)[-1]
+    raw_file = path.replace(str(raw), '')
+    export(raw, output)
+
+    complete, partial = timeline_lines(corpus, 2)
+    with open(path, 'a') as stream:
+        stream.write(complete + partial[:40])
+    export(raw, output)
+    offset, line_count = manifest(output, raw_file)
+    assert offset == os.path.getsize(path) - 40
+    assert line_count == 51
+    assert json.loads(partial)['id'] not in tweet_ids(output)
+
+    with open(path, 'a') as stream:
+        stream.write(partial[40:])
+    exporter = export(raw, output)
+    assert exporter.stats['skipped_tweets'] == 0
+    assert manifest(output, raw_file) == (os.path.getsize(path), 52)
+    assert json.loads(partial)['id'] in tweet_ids(output)
+
+
+def test_partial_compressed_member_is_left_for_next_run(corpus, tmp_path):
+    raw = tmp_path / 'raw'
+    output = tmp_path / 'tweets.db'
+    path = write_raw(corpus, raw, compress=True)[-1]
+    raw_file = path.replace(str(raw), '')
+    export(raw, output)
+    offset, line_count = manifest(output, raw_file)
+    assert line_count == 50
+
+    lines = timeline_lines(corpus, 5)
+    member = gzip.compress(''.join(lines).encode())
+    with open(path, 'ab') as stream:
+        stream.write(member[:len(member) // 2])
+    exporter = export(raw, output)
+    assert exporter.stats['skipped_files'] == 2
+    assert 50 <= manifest(output, raw_file)[1] < 55
+
+    with open(path, 'ab') as stream:
+        stream.write(member[len(member) // 2:])
+    exporter = export(raw, output)
+    assert exporter.stats['skipped_tweets'] == 0
+    assert manifest(output, raw_file) == (
+        offset + len(''.join(lines).encode()), 55
+    )
+    assert {json.loads(line)['id'] for line in lines} <= tweet_ids(output)
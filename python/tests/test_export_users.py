@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+import pytest
+
+from twicorder.exporter.controller import Exporter
+from twicorder.exporter.sinks import ParquetSink
+from twicorder.synthetic import TweetCorpus
+
+ACCOUNT = 'counters'
+
+
+def author_tweets(statuses_counts):
+    """
+    Timeline tweets by the same author, who has posted the given number of
+    statuses as of each tweet.
+    """
+    tweets = list(TweetCorpus(seed=0).timeline_tweets(
+        ACCOUNT, len(statuses_counts)
+    ))
+    for tweet, statuses_count in zip(tweets, statuses_counts):
+        tweet['user']['statuses_count'] = statuses_count
+    return tweets
+
+
+def export(exporter, tweets):
+    for line, tweet in enumerate(tweets, 1):
+        exporter.register_tweet(tweet, 'counters.txt', line)
+    exporter.flush()
+    exporter.sink.finish()
+
+
+def test_counters_do_not_make_profile_versions(tmp_path):
+    tweets = author_tweets([100, 101])
+    author_id = tweets[0]['user']['id']
+    output = str(tmp_path / 'tweets.db')
+    exporter = Exporter(str(tmp_path), output_path=output)
+    export(exporter, tweets)
+
+    conn = sqlite3.connect(output)
+    try:
+        users = conn.execute(
+            'SELECT statuses_count FROM users WHERE user_id = ?',
+            (author_id,)
+        ).fetchall()
+        account = conn.execute(
+            'SELECT statuses_count, version_count FROM accounts '
+            'WHERE user_id = ?',
+            (author_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    assert users == [(100,)]
+    assert account == (101, 1)
+    assert exporter.stats['unchanged_users'] >= 1
+
+
+def test_parquet_accounts_keep_latest_counters(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    pytest.importorskip('pyarrow.dataset')
+    pytest.importorskip('pyarrow.parquet')
+    tweets = author_tweets([100, 101, 102])
+    author_id = tweets[0]['user']['id']
+    root = str(tmp_path / 'parquet')
+
+    def accounts():
+        table = pyarrow.parquet.read_table(
+            str(tmp_path / 'parquet' / 'accounts' / 'accounts.parquet')
+        )
+        return {
+            row['user_id']: row['statuses_count']
+            for row in table.to_pylist()
+        }
+
+    export(Exporter(str(tmp_path), sink=ParquetSink(root)), tweets[:2])
+    assert accounts()[author_id] == 101
+
+    # Counters survive rewrites of the user dimension in later exports
+    exporter = Exporter(str(tmp_path), sink=ParquetSink(root))
+    exporter.sink.finish()
+    assert accounts()[author_id] == 101
+    export(exporter, tweets[2:])
+    assert accounts()[author_id] == 102
+    users = pyarrow.dataset.dataset(
+        str(tmp_path / 'parquet' / 'users'),
+        format='parquet',
+        partitioning='hive'
+    ).to_table(columns=['user_id']).column('user_id').to_pylist()
+    assert users.count(author_id) == 1
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pytest
+
+from twicorder.exporter.controller import Exporter
+from twicorder.exporter.sinks import ParquetSink, SQLiteSink
+from twicorder.synthetic import TweetCorpus
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+requires_pyarrow = pytest.mark.skipif(
+    pyarrow is None, reason='pyarrow is not installed'
+)
+
+
+class ScriptedWatcher(object):
+    """
+    Watcher running one step per call for changes, reporting the files the
+    step wrote, and interrupting the exporter when no steps are left.
+    """
+
+    def __init__(self, steps):
+        self._steps = list(steps)
+        self.closed = False
+
+    def changes(self, timeout):
+        if not self._steps:
+            raise KeyboardInterrupt
+        return self._steps.pop(0)()
+
+    def close(self):
+        self.closed = True
+
+
+def account_ids(root):
+    path = os.path.join(root, 'accounts', 'accounts.parquet')
+    if not os.path.isfile(path):
+        return set()
+    table = pyarrow.parquet.read_table(path, columns=['user_id'])
+    return set(table.column('user_id').to_pylist())
+
+
+@pytest.fixture
+def corpus():
+    return TweetCorpus(seed=0)
+
+
+@pytest.fixture
+def raw(corpus, tmp_path):
+    raw = tmp_path / 'raw'
+    corpus.write(str(raw), stream_files=1, tweets_per_file=20)
+    return raw
+
+
+def append_step(corpus, raw, start):
+    def step():
+        path = str(raw / 'stream' / f'follow_{start}.txt')
+        with open(path, 'w') as stream:
+            for tweet in corpus.stream_tweets(20, start=start):
+                stream.write(json.dumps(tweet) + '\n')
+        return [path]
+    return step
+
+
+def new_users(corpus, start):
+    return {
+        t['user']['id'] for t in corpus.stream_tweets(20, start=start)
+    }
+
+
+@requires_pyarrow
+def test_follow_finishes_sink(corpus, raw, tmp_path):
+    root = str(tmp_path / 'parquet')
+    watcher = ScriptedWatcher([append_step(corpus, raw, 100)])
+    exporter = Exporter(str(raw), sink=ParquetSink(root))
+    exporter.follow(watcher, commit_interval=0, refresh_interval=3600)
+    assert watcher.closed
+    assert new_users(corpus, 100) <= account_ids(root)
+
+
+@requires_pyarrow
+def test_follow_refreshes_sink(corpus, raw, tmp_path):
+    root = str(tmp_path / 'parquet')
+    seen = []
+
+    def check():
+        seen.append(account_ids(root))
+        return []
+
+    watcher = ScriptedWatcher([append_step(corpus, raw, 100), check])
+    exporter = Exporter(str(raw), sink=ParquetSink(root))
+    exporter.follow(watcher, commit_interval=0, refresh_interval=0)
+    assert new_users(corpus, 100) <= seen[0]
+
+
+def test_follow_ends_bulk_load(corpus, raw, tmp_path, monkeypatch):
+    sink = SQLiteSink(str(tmp_path / 'tweets.db'), bulk_load=True)
+    finished = []
+    monkeypatch.setattr(sink, 'finish', lambda: finished.append(True))
+    settings = []
+
+    def check():
+        settings.append({
+            pragma: sink.connection.execute(f'PRAGMA {pragma}').scalar()
+            for pragma in ('journal_mode', 'synchronous')
+        })
+        settings[-1]['indexes'] = sink.connection.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'index' "
+            "AND name LIKE 'ix_%'"
+        ).scalar()
+        return []
+
+    watcher = ScriptedWatcher([check])
+    exporter = Exporter(str(raw), sink=sink)
+    exporter.follow(watcher, commit_interval=0)
+    assert settings[0]['journal_mode'] == 'delete'
+    assert settings[0]['synchronous'] == 2  # FULL
+    assert settings[0]['indexes']
+    assert finished == [True]
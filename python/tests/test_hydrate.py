@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import pytest
+
+from twicorder.search.hydrate import Hydrator
+from twicorder.synthetic import snowflake
+from twicorder.utils import AppData
+
+
+@pytest.fixture
+def id_file(project):
+    start_ms = int((time.time() - 3600) * 1000)
+    path = os.path.join(project, 'ids.txt')
+    with open(path, 'w') as stream:
+        stream.write('tweet_id\n')
+        for idx in range(250):
+            stream.write(f'{snowflake(start_ms + idx * 1000)}\n')
+    return path
+
+
+def test_hydrates_all_batches(mock_api, id_file):
+    hydrator = Hydrator(id_file, 'hydrated')
+    hydrator.run()
+    assert hydrator.hydrated + hydrator.missing == 250
+    assert hydrator.missing > 0
+    assert AppData().get_hydration_batches(hydrator.job_hash) == {0, 1, 2}
+    assert mock_api.stats[200] == 3
+
+    # Completed batches are skipped when the job is run again
+    Hydrator(id_file, 'hydrated').run()
+    assert mock_api.stats[200] == 3
+
+
+def test_client_error_gives_up_batch(mock_api, id_file):
+    hydrator = Hydrator(id_file, 'hydrated')
+    # The mock API rejects IDs that aren't numbers
+    assert not hydrator.hydrate_batch(0, ['nan'])
+    assert mock_api.stats[400] == 1
+    assert hydrator.failed_batches == {0}
+    assert AppData().get_hydration_batches(hydrator.job_hash) == set()
+
+
+def test_failed_batch_does_not_stop_worker(mock_api, id_file):
+    hydrator = Hydrator(id_file, 'hydrated', concurrency=1)
+    hydrate_batch = hydrator.hydrate_batch
+
+    def fail_first(batch_index, batch):
+        if batch_index == 0:
+            batch = ['nan']
+        return hydrate_batch(batch_index, batch)
+
+    hydrator.hydrate_batch = fail_first
+    hydrator.run()
+    assert hydrator.failed_batches == {0}
+    assert AppData().get_hydration_batches(hydrator.job_hash) == {1, 2}
+
+    # The failed batch is retried when the job is run again
+    Hydrator(id_file, 'hydrated').run()
+    assert AppData().get_hydration_batches(hydrator.job_hash) == {0, 1, 2}
+
+
+def test_pickle_only_looks_up_page_ids(project):
+    AppData().add_query_tweets('status', [(1, 0), (2, 0), (3, 0)])
+    assert AppData().get_seen_query_tweets('status', [2, 3, 4]) == {2, 3}
+    ids = list(range(1000, 2200))
+    AppData().add_query_tweets('status', [(i, 0) for i in ids[::2]])
+    assert AppData().get_seen_query_tweets('status', ids) == set(ids[::2])
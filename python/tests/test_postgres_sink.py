@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import uuid
+
+from datetime import datetime, timezone
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+
+from twicorder.exporter.controller import Exporter
+from twicorder.exporter.sinks import PostgresSink, csv_value
+from twicorder.synthetic import TweetCorpus
+
+# PostgreSQL server to create throwaway test databases on, as a SQLAlchemy
+# URL. Tests needing a server are skipped without one.
+DATABASE_URL = os.environ.get('TC_TEST_DATABASE_URL')
+
+STRINGS = [
+    '',
+    'plain',
+    'say "hi", then leave',
+    'line\nbreak\r\nand return',
+    'back\\slash \\N',
+    '\\.',
+    'nul\x00byte',
+    '☃ \U0001F426',
+]
+
+
+def test_csv_value_quotes_strings():
+    assert csv_value(None) == ''
+    assert csv_value('') == '""'
+    assert csv_value('a,b') == '"a,b"'
+    assert csv_value('say "hi"') == '"say ""hi"""'
+    assert csv_value('a\nb') == '"a\nb"'
+    assert csv_value('nul\x00byte') == '"nulbyte"'
+
+
+def test_csv_value_formats_other_types():
+    assert csv_value(True) == 't'
+    assert csv_value(False) == 'f'
+    assert csv_value(0) == '0'
+    assert csv_value(1212161512044896256) == '1212161512044896256'
+    assert csv_value(.5) == '0.5'
+    stamp = datetime(2020, 1, 1, 12, 30, tzinfo=timezone.utc)
+    assert csv_value(stamp) == '2020-01-01 12:30:00+00:00'
+
+
+@pytest.fixture
+def database_url():
+    if not DATABASE_URL:
+        pytest.skip('TC_TEST_DATABASE_URL is not set')
+    pytest.importorskip('psycopg2')
+    name = f'twicorder_test_{uuid.uuid4().hex[:12]}'
+    server = create_engine(DATABASE_URL, isolation_level='AUTOCOMMIT')
+    with server.connect() as connection:
+        connection.execute(f'CREATE DATABASE {name}')
+    url = make_url(DATABASE_URL)
+    url.database = name
+    yield str(url)
+    with server.connect() as connection:
+        connection.execute(f'DROP DATABASE {name} WITH (FORCE)')
+    server.dispose()
+
+
+def test_copy_round_trips_values(database_url):
+    sink = PostgresSink(database_url)
+    stamp = datetime(2020, 1, 1, 12, 30, tzinfo=timezone.utc)
+    rows = [
+        {'text': text, 'flag': idx % 2 == 0, 'number': idx, 'stamp': stamp}
+        for idx, text in enumerate(STRINGS)
+    ]
+    rows.append({'text': None, 'flag': None, 'number': None, 'stamp': None})
+    with sink.connection.begin():
+        sink.connection.execute(
+            'CREATE TEMPORARY TABLE copy_test ('
+            'text TEXT, flag BOOLEAN, number BIGINT, stamp TIMESTAMPTZ)'
+        )
+        cursor = sink.connection.connection.cursor()
+        sink._copy(cursor, 'copy_test', list(rows[0]), rows)
+        cursor.close()
+    copied = sink.connection.execute(
+        'SELECT text, flag, number, stamp FROM copy_test ORDER BY number'
+    ).fetchall()
+    assert [r[0] for r in copied] == [
+        s.replace('\x00', '') for s in STRINGS
+    ] + [None]
+    assert [r[1] for r in copied] == [r['flag'] for r in rows]
+    assert copied[0][3] == stamp
+    sink.connection.close()
+
+
+def test_export_matches_sqlite(database_url, tmp_path):
+    raw = str(tmp_path / 'raw')
+    TweetCorpus(seed=0).write(
+        raw, stream_files=2, accounts=['postgres'], tweets_per_file=50
+    )
+    expected = Exporter(
+        raw, output_path=str(tmp_path / 'tweets.db'), autostart=True
+    )
+    sink = PostgresSink(database_url)
+    exporter = Exporter(raw, sink=sink, autostart=True)
+    assert exporter.stats == expected.stats
+
+    conn = sqlite3.connect(str(tmp_path / 'tweets.db'))
+    query = 'SELECT tweet_id, text FROM tweets ORDER BY tweet_id'
+    assert sink.connection.execute(query).fetchall() == (
+        conn.execute(query).fetchall()
+    )
+    conn.close()
+    sink.connection.close()
+
+    # Exporting again skips the ingested files
+    again = Exporter(raw, sink=PostgresSink(database_url), autostart=True)
+    assert again.stats['skipped_files'] == 4
+    again.sink.connection.close()
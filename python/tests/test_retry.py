@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from twicorder.search.exchange import QueryExchange
+from twicorder.search.queries.request_queries import StandardSearchQuery
+from twicorder.search.retry import (
+    CircuitBreaker,
+    CircuitBreakerCentral,
+    RequestFailed,
+    RetryPolicy,
+)
+from twicorder.utils import AppData
+
+
+class Response(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.mark.parametrize('status_code', [400, 401, 403, 404])
+def test_client_errors_are_terminal(status_code):
+    policy = RetryPolicy()
+    assert policy.is_terminal(Response(status_code))
+    assert not policy.should_retry(1, Response(status_code))
+
+
+@pytest.mark.parametrize('status_code', [429, 500, 503])
+def test_server_errors_and_rate_limits_are_retried(status_code):
+    policy = RetryPolicy(max_attempts=3)
+    assert not policy.is_terminal(Response(status_code))
+    assert policy.should_retry(2, Response(status_code))
+    assert not policy.should_retry(3, Response(status_code))
+
+
+def test_failed_connections_are_retried():
+    policy = RetryPolicy()
+    assert not policy.is_terminal(None)
+    assert policy.should_retry(1, None)
+
+
+def test_delay_honours_retry_after():
+    policy = RetryPolicy(base_delay=.5)
+    delay = policy.delay(1, Response(503, {'retry-after': '10'}))
+    assert 10 <= delay <= 10.5
+
+
+def test_delay_is_capped():
+    policy = RetryPolicy(base_delay=1., max_delay=4.)
+    assert all(0 <= policy.delay(10) <= 4. for _ in range(100))
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    time.sleep(.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_error_fails_query_at_once(mock_api):
+    # The mock API rejects searches without a search term
+    query = StandardSearchQuery('failing')
+    for _ in range(10):
+        with pytest.raises(RequestFailed) as error:
+            query.run()
+        assert error.value.status_code == 400
+    assert mock_api.stats[400] == 10
+    # Client errors don't count towards the health of the endpoint
+    breaker = CircuitBreakerCentral().get(query.endpoint)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize('mock_api_options', [{'error_rate': 1.}])
+def test_server_errors_are_retried_then_deferred(mock_api):
+    query = StandardSearchQuery('failing', q='#retry')
+    assert query.run() is None
+    assert not query.done
+    assert sum(mock_api.stats.values()) == 3
+
+
+def test_worker_abandons_failed_query(mock_api):
+    query = StandardSearchQuery('failing')
+    exchange = QueryExchange()
+    exchange.add(query)
+    assert AppData().get_query_checkpoint(query.uid) is not None
+    exchange.wait()
+    assert mock_api.stats[400] == 1
+    assert AppData().get_query_checkpoint(query.uid) is None
+
+
+def test_worker_completes_query(mock_api):
+    query = StandardSearchQuery('working', q='#working')
+    exchange = QueryExchange()
+    exchange.add(query)
+    exchange.wait()
+    assert query.done
+    assert query.new_count > 0
+    assert AppData().get_query_checkpoint(query.uid) is None
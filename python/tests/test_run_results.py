@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+
+import pytest
+import requests
+
+from twicorder.config import Config
+from twicorder.search.queries import RequestQuery
+from twicorder.search.queries.request_queries import (
+    CachedUserCentral,
+    StandardSearchQuery,
+)
+from twicorder.synthetic import make_tweet, snowflake
+from twicorder.utils import AppData, Singleton
+
+pytest.importorskip('ijson')
+
+# Status IDs of the page, newest first, every third one seen before
+TWEET_IDS = [snowflake(1577836800000 - idx * 1000) for idx in range(10)]
+SEEN_IDS = TWEET_IDS[::3]
+
+
+@pytest.fixture
+def config_overrides():
+    # Small batches, so streamed pages are saved in several batches
+    return {'stream_batch_size': 3}
+
+
+def page_body():
+    statuses = [make_tweet(i, term='#both', search=True) for i in TWEET_IDS]
+    return json.dumps({
+        'statuses': statuses,
+        'search_metadata': {'next_results': f'?max_id={TWEET_IDS[-1] - 1}'},
+    }).encode()
+
+
+def run(monkeypatch, project, streamed):
+    body = page_body()
+
+    def send(self):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(body)
+        return response
+
+    monkeypatch.setattr(StandardSearchQuery, 'send', send)
+    monkeypatch.setattr(
+        RequestQuery, 'stream_results', property(lambda self: streamed)
+    )
+    # Each mode starts from the same seen tweets, with no watermark, and
+    # looks up the mentioned users afresh
+    appdata_dir = os.path.join(project, f'appdata_streamed_{streamed}')
+    monkeypatch.setitem(Config.get(), 'appdata_dir', appdata_dir)
+    Singleton._instances.pop(CachedUserCentral, None)
+    query = StandardSearchQuery(q='#both')
+    AppData().add_query_tweets(query.name, [(i, 0) for i in SEEN_IDS])
+    results = query.run()
+    return results, query
+
+
+def test_streamed_and_decoded_pages_return_the_same(mock_api, project,
+                                                     monkeypatch):
+    decoded, decoded_query = run(monkeypatch, project, streamed=False)
+    streamed, streamed_query = run(monkeypatch, project, streamed=True)
+    assert [t['id'] for t in decoded] == [
+        i for i in TWEET_IDS if i not in SEEN_IDS
+    ]
+    assert streamed == decoded
+    assert streamed_query.results == decoded_query.results
+    assert streamed_query.new_count == decoded_query.new_count
+    assert streamed_query.more_results == decoded_query.more_results
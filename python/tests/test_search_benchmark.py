@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from twicorder.config import Config
+from twicorder.search.benchmark import SearchBenchmark
+from twicorder.search.exchange import PagePersister, QueryWorker
+from twicorder.search.mockapi import MockApi
+from twicorder.search.queries import RequestQuery
+from twicorder.search.queries.request_queries import StandardSearchQuery
+
+
+def test_base_url_override_survives_config_reload(project):
+    query = StandardSearchQuery('override', q='#override')
+    RequestQuery.override_base_url('http://127.0.0.1:1/1.1')
+    try:
+        Config._cache = None
+        assert query.base_url == 'http://127.0.0.1:1/1.1'
+    finally:
+        RequestQuery.override_base_url(None)
+    assert query.base_url == 'https://api.twitter.com/1.1'
+
+
+@pytest.mark.parametrize('config_overrides', [{'config_reload_interval': 0}])
+def test_benchmark_stays_on_mock_api(project):
+    api = MockApi(backlog=60., window=60.)
+    benchmark = SearchBenchmark(
+        api, credentials=1, search_terms=2, timelines=2
+    )
+    benchmark.run(duration=1.)
+    stats = api.stats
+    assert stats[200] > 0
+    assert sum(stats.values()) - stats['tweets'] == stats[200]
+    threads = [
+        t for t in threading.enumerate()
+        if isinstance(t, (QueryWorker, PagePersister))
+    ]
+    assert threads == []
+    assert RequestQuery._base_url_override is None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import yaml
+
+from twicorder.search.tasks import TaskManager
+
+
+def write_tasks(project, tasks):
+    path = os.path.join(project, 'tasks.yaml')
+    with open(path, 'w') as stream:
+        yaml.safe_dump(tasks, stream)
+    # Make sure the change is seen, however coarse the file system's clock
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_reload_applies_task_diff(project):
+    write_tasks(project, {
+        'free_search': [
+            {'frequency': 15, 'output': 'a', 'kwargs': {'q': '#a'}},
+            {'frequency': 15, 'output': 'b', 'kwargs': {'q': '#b'}},
+        ],
+        'user_timeline': [
+            {'frequency': 30, 'output': 'c', 'kwargs': {'screen_name': 'c'}},
+        ],
+    })
+    manager = TaskManager()
+    manager.load()
+    tasks = {t.output: t for t in manager.tasks}
+    assert len(tasks) == 3
+    assert manager.reload() is None
+
+    write_tasks(project, {
+        'free_search': [
+            {'frequency': 60, 'output': 'a', 'kwargs': {'q': '#a'}},
+            {'frequency': 15, 'output': 'd', 'kwargs': {'q': '#d'}},
+            {'frequency': 15, 'output': 'd', 'kwargs': {'q': '#d'}},
+        ],
+        'user_timeline': [
+            {'frequency': 30, 'output': 'c', 'kwargs': {'screen_name': 'c'}},
+        ],
+    })
+    diff = manager.reload()
+    assert [t.output for t in diff.added] == ['d']
+    assert [t.output for t in diff.removed] == ['b']
+    assert [(t.output, n.frequency) for t, n in diff.changed] == [('a', 60)]
+
+    reloaded = {t.output: t for t in manager.tasks}
+    assert sorted(reloaded) == ['a', 'c', 'd']
+    # Unchanged and changed tasks are kept, with their state
+    assert reloaded['a'] is tasks['a']
+    assert reloaded['a'].frequency == 60
+    assert reloaded['c'] is tasks['c']
+    # The first added task is due at once, any others are spread out
+    assert reloaded['d'].due
+
+
+def test_reload_keeps_tasks_on_invalid_file(project):
+    write_tasks(project, {'free_search': [{'kwargs': {'q': '#a'}}]})
+    manager = TaskManager()
+    manager.load()
+    with open(os.path.join(project, 'tasks.yaml'), 'w') as stream:
+        stream.write('free_search: [{kwargs: {q: "#a"}\n')
+    assert manager.reload() is None
+    assert [t.kwargs for t in manager.tasks] == [{'q': '#a'}]
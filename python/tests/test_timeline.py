@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from twicorder.search.queries.request_queries import TimelineQuery
+from twicorder.utils import AppData
+
+
+def make_query():
+    # The mock API holds two minutes of tweets, about three pages
+    return TimelineQuery('timeline', screen_name='watermark', count=50)
+
+
+def test_pagination_stops_at_page_crossing_watermark(mock_api):
+    first_run = make_query()
+    first_run.fetch()
+    watermark = int(first_run.fetch()[10]['id'])
+    AppData().set_last_query_id(first_run.uid, watermark)
+
+    query = make_query()
+    assert 'since_id' not in query.request_url
+    requests = mock_api.stats[200]
+    pages = [query.fetch()]
+    assert not query.done
+    pages.append(query.fetch())
+    # The second page reaches back past the watermark, so no further page is
+    # requested.
+    assert query.done
+    assert min(int(t['id']) for t in pages[1]) <= watermark
+    assert mock_api.stats[200] - requests == 2
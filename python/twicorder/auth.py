@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+
+from threading import Lock
+from typing import List, Optional
+
 from tweepy import OAuthHandler
 from tweepy.auth import AppAuthHandler, OAuth2Bearer
+from twicorder.config import Config
 from twicorder.utils import Singleton
 
 
@@ -42,25 +48,175 @@ def get_token_auth(consumer_key: str, consumer_secret: str) -> OAuth2Bearer:
     return bearer
 
 
+class Credential(object):
+    """
+    A set of Twitter API credentials. Consumer key and secret are enough for
+    bearer token (app) authentication, user authentication also requires an
+    access token and secret.
+    """
+
+    def __init__(self, consumer_key: str, consumer_secret: str,
+                 access_token: Optional[str] = None,
+                 access_secret: Optional[str] = None):
+        self._consumer_key = consumer_key
+        self._consumer_secret = consumer_secret
+        self._access_token = access_token
+        self._access_secret = access_secret
+        self._user_auth = None
+        self._token_auth = None
+        self._lock = Lock()
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.uid == other.uid
+
+    def __hash__(self):
+        return hash(self.uid)
+
+    def __repr__(self):
+        return f'Credential(uid={self.uid!r})'
+
+    @property
+    def uid(self) -> str:
+        """
+        Identifier for the credential, safe to use in logs and as a key for
+        rate limits.
+
+        Returns:
+            Credential identifier
+
+        """
+        keys = f'{self._consumer_key}:{self._access_token}'.encode()
+        return hashlib.blake2s(keys, digest_size=6).hexdigest()
+
+    @property
+    def has_user_auth(self) -> bool:
+        """
+        Whether the credential can be used for user authentication.
+
+        Returns:
+            True if an access token and secret are available
+
+        """
+        return bool(self._access_token and self._access_secret)
+
+    @property
+    def user_auth(self) -> OAuthHandler:
+        """
+        Authentication handler for the credential, created on first use.
+
+        Returns:
+            Authentication handler
+
+        """
+        with self._lock:
+            if not self._user_auth:
+                self._user_auth = get_auth_handler(
+                    consumer_key=self._consumer_key,
+                    consumer_secret=self._consumer_secret,
+                    access_token=self._access_token,
+                    access_secret=self._access_secret
+                )
+            return self._user_auth
+
+    @property
+    def token_auth(self) -> OAuth2Bearer:
+        """
+        Bearer token for the credential, created on first use.
+
+        Returns:
+            Bearer token
+
+        """
+        with self._lock:
+            if not self._token_auth:
+                self._token_auth = get_token_auth(
+                    consumer_key=self._consumer_key,
+                    consumer_secret=self._consumer_secret
+                )
+            return self._token_auth
+
+
+class CredentialPool(object, metaclass=Singleton):
+    """
+    Singleton holding all credentials available to the search API. Loaded from
+    the "credentials" section of the config file.
+    """
+
+    def __init__(self):
+        self._credentials = []
+        self._lock = Lock()
+
+    @property
+    def credentials(self) -> List[Credential]:
+        if not self._credentials:
+            self.load()
+        return self._credentials
+
+    def load(self):
+        """
+        Reads credentials from the config file.
+        """
+        with self._lock:
+            for raw_credential in Config.get().get('credentials') or []:
+                credential = Credential(
+                    consumer_key=raw_credential['consumer_key'],
+                    consumer_secret=raw_credential['consumer_secret'],
+                    access_token=raw_credential.get('access_token'),
+                    access_secret=raw_credential.get('access_secret')
+                )
+                if credential not in self._credentials:
+                    self._credentials.append(credential)
+
+    def add(self, credential: Credential):
+        """
+        Adds a credential to the pool.
+
+        Args:
+            credential: Credential to add
+
+        """
+        with self._lock:
+            if credential not in self._credentials:
+                self._credentials.append(credential)
+
+    def get(self, token_auth: bool = False) -> List[Credential]:
+        """
+        Lists the credentials that support the given authentication type.
+
+        Args:
+            token_auth: True for bearer token authentication, False for user
+                authentication
+
+        Returns:
+            Credentials
+
+        """
+        if token_auth:
+            return list(self.credentials)
+        return [c for c in self.credentials if c.has_user_auth]
+
+
 class Auth(object, metaclass=Singleton):
     """
-    Singleton for accessing the Auth handler
+    Singleton for accessing the Auth handler of the first credential with user
+    authentication in the pool.
     """
 
     _handler = None
 
     def __new__(cls, *args, **kwargs):
-        cls._handler = get_auth_handler()
+        cls._handler = CredentialPool().get(token_auth=False)[0].user_auth
         return cls._handler
 
 
 class TokenAuth(object, metaclass=Singleton):
     """
-    Singleton for accessing the Bearer Token
+    Singleton for accessing the Bearer Token of the first credential in the
+    pool.
     """
 
     _handler = None
 
     def __new__(cls, *args, **kwargs):
-        cls._handler = get_token_auth()
+        cls._handler = CredentialPool().get(token_auth=True)[0].token_auth
         return cls._handler
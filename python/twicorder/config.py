@@ -47,6 +47,7 @@ class Config(object):
         with open(listener_path, 'r') as stream:
             config = yaml.safe_load(stream)
         config['project_dir'] = cls._project_dir
+        config['config_dir'] = cls._config_dir
         config['appdata_dir'] = os.path.join(cls._project_dir, 'appdata')
         config['output_dir'] = os.path.join(cls._project_dir, 'output')
         config['log_dir'] = os.path.join(cls._project_dir, 'logs')
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 TW_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+ARCHIVE_TIME_FORMAT = '%Y%m%d%H%M'
 
 REGULAR_EXTENSIONS = ['txt', 'json', 'yaml', 'twc']
 COMPRESSED_EXTENSIONS = ['gzip', 'zip', 'twzip']
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from datetime import timedelta
+from typing import Optional
+
+from twicorder.exporter.controller import Exporter, TABLES
+from twicorder.exporter.sinks import ParquetSink
+from twicorder.synthetic import TweetCorpus
+
+
+class ExportBenchmark(object):
+    """
+    Times the exporter on a synthetic stream archive. Tweets are generated
+    deterministically by TweetCorpus, with a share of retweets, quotes and
+    duplicates, and written to raw files in the layout used by the stream
+    listener.
+    """
+
+    def __init__(self, files=20, tweets_per_file=1000, retweet_rate=.2,
+                 quote_rate=.1, duplicate_rate=.05, seed=0):
+        self._files = files
+        self._tweets_per_file = tweets_per_file
+        self._retweet_rate = retweet_rate
+        self._quote_rate = quote_rate
+        self._duplicate_rate = duplicate_rate
+        self._seed = seed
+
+    def make_archive(self, root):
+        """
+        Writes the synthetic archive.
+
+        Args:
+            root (str): Raw data directory
+
+        """
+        corpus = TweetCorpus(
+            retweet_rate=self._retweet_rate,
+            quote_rate=self._quote_rate,
+            duplicate_rate=self._duplicate_rate,
+            seed=self._seed
+        )
+        corpus.write(
+            root,
+            stream_files=self._files,
+            tweets_per_file=self._tweets_per_file
+        )
+
+    def run(self, work_dir=None, batch_size=50000, processes=1,
+            bulk_load=False, index_profile='full', sink='sqlite'):
+        """
+        Exports a freshly written archive to a new database.
+
+        Args:
+            work_dir (str): Directory for the archive and database. A
+                temporary directory, removed afterwards, if not given
+            batch_size (int): Rows to insert per transaction
+            processes (int): Number of worker processes parsing raw files
+            bulk_load (bool): Export in bulk load mode
+            index_profile (str): Index profile name or path
+            sink (str): Export target, "sqlite" or "parquet"
+
+        Returns:
+            str: Report
+
+        """
+        temp_dir = None
+        if not work_dir:
+            temp_dir = work_dir = tempfile.mkdtemp(prefix='twicorder_export_')
+        try:
+            raw_data_path = os.path.join(work_dir, 'raw')
+            output_path = os.path.join(work_dir, 'tweets.db')
+            if os.path.isfile(output_path):
+                os.remove(output_path)
+            parquet_path = os.path.join(work_dir, 'parquet')
+            shutil.rmtree(parquet_path, ignore_errors=True)
+            self.make_archive(raw_data_path)
+            if sink == 'parquet':
+                sink = ParquetSink(parquet_path)
+            else:
+                sink = None
+            exporter = Exporter(
+                raw_data_path=raw_data_path,
+                output_path=output_path,
+                batch_size=batch_size,
+                processes=processes,
+                bulk_load=bulk_load,
+                index_profile=index_profile,
+                sink=sink
+            )
+            t0 = time.time()
+            exporter.start()
+            elapsed = time.time() - t0
+            return self.report(exporter, elapsed)
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @staticmethod
+    def report(exporter, elapsed):
+        tweets = exporter.stats['exported_tweets']
+        rows = exporter.stats['exported_rows']
+        lines = [
+            f'Duration:       {timedelta(seconds=elapsed)}',
+            f'Tweets:         {tweets} ({tweets / elapsed:.1f} tweets/s)',
+            f'Rows:           {rows} ({rows / elapsed:.1f} rows/s)',
+            f'Duplicates:     {exporter.stats["skipped_tweets"]}',
+        ]
+        for table in TABLES:
+            count = exporter.sink.count(table)
+            lines.append(f'  {table.name + ":":<14}{count}')
+        return '\n'.join(lines)
+
+
+@click.command()
+@click.option(
+    '--work-dir',
+    required=False,
+    help='Directory for the archive and database. Defaults to a temp dir.'
+)
+@click.option(
+    '--files',
+    default=20,
+    show_default=True,
+    help='Number of raw files in the archive'
+)
+@click.option(
+    '--tweets-per-file',
+    default=1000,
+    show_default=True,
+    help='Number of tweets per raw file'
+)
+@click.option(
+    '--retweet-rate',
+    default=.2,
+    show_default=True,
+    help='Fraction of tweets that are retweets'
+)
+@click.option(
+    '--quote-rate',
+    default=.1,
+    show_default=True,
+    help='Fraction of tweets that quote another tweet'
+)
+@click.option(
+    '--duplicate-rate',
+    default=.05,
+    show_default=True,
+    help='Fraction of tweets repeating an earlier tweet'
+)
+@click.option(
+    '--batch-size',
+    default=50000,
+    show_default=True,
+    help='Number of rows to insert per transaction'
+)
+@click.option(
+    '--processes',
+    default=1,
+    show_default=True,
+    help='Number of worker processes parsing raw files'
+)
+@click.option(
+    '--bulk-load',
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help='Export in bulk load mode, building indexes at the end'
+)
+@click.option(
+    '--index-profile',
+    default='full',
+    show_default=True,
+    help='Columns to index: "full", "minimal", "none" or a yaml file path'
+)
+@click.option(
+    '--sink',
+    type=click.Choice(['sqlite', 'parquet']),
+    default='sqlite',
+    show_default=True,
+    help='Export target'
+)
+def main(work_dir: Optional[str], files: int, tweets_per_file: int,
+         retweet_rate: float, quote_rate: float, duplicate_rate: float,
+         batch_size: int, processes: int, bulk_load: bool,
+         index_profile: str, sink: str):
+    """
+    Exporter benchmark on a synthetic archive.
+    """
+    benchmark = ExportBenchmark(
+        files=files,
+        tweets_per_file=tweets_per_file,
+        retweet_rate=retweet_rate,
+        quote_rate=quote_rate,
+        duplicate_rate=duplicate_rate
+    )
+    report = benchmark.run(
+        work_dir=work_dir,
+        batch_size=batch_size,
+        processes=processes,
+        bulk_load=bulk_load,
+        index_profile=index_profile,
+        sink=sink
+    )
+    click.echo(f'\nBenchmark results:\n{report}')
+
+
+if __name__ == '__main__':
+    main(auto_envvar_prefix='TC_EXPORT_BENCHMARK')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left
+
+from sqlalchemy import select
+
+
+class TweetIdIndex(object):
+    """
+    Compact in-memory set of tweet IDs, used by the exporter to skip
+    duplicates without querying the database.
+
+    IDs are kept in a sorted array of 64 bit integers, searched by bisection,
+    at 8 bytes per ID. IDs added after loading go to a small hash set, which
+    is merged into the array once it grows past a share of the array's size.
+    """
+
+    def __init__(self, merge_ratio=.1):
+        self._ids = array('q')
+        self._added = set()
+        self._merge_ratio = merge_ratio
+
+    def __len__(self):
+        return len(self._ids) + len(self._added)
+
+    def __contains__(self, tweet_id):
+        if tweet_id in self._added:
+            return True
+        idx = bisect_left(self._ids, tweet_id)
+        return idx < len(self._ids) and self._ids[idx] == tweet_id
+
+    @classmethod
+    def from_table(cls, connection, column, chunk_size=100000):
+        """
+        Loads all IDs in the given table column. The column is read in index
+        order, so the IDs arrive sorted and are appended to the array without
+        sorting them in Python.
+
+        Args:
+            connection (Connection): SQLAlchemy connection
+            column (Column): Tweet ID column
+            chunk_size (int): Rows to fetch at a time
+
+        Returns:
+            TweetIdIndex: Index
+
+        """
+        def iter_ids():
+            result = connection.execute(select([column]).order_by(column))
+            rows = result.fetchmany(chunk_size)
+            while rows:
+                yield from (r[0] for r in rows)
+                rows = result.fetchmany(chunk_size)
+
+        index = cls()
+        index.load(iter_ids())
+        return index
+
+    def load(self, ids):
+        """
+        Replaces the contents of the index.
+
+        Args:
+            ids (iterable[int]): Unique tweet IDs, in ascending order
+
+        """
+        self._ids = array('q', ids)
+        self._added.clear()
+
+    def _merge(self):
+        """
+        Merges IDs added since the last merge into the sorted array.
+        """
+        merged = self._ids + array('q', self._added)
+        self._ids = array('q', sorted(merged))
+        self._added.clear()
+
+    def add(self, tweet_id):
+        """
+        Adds a tweet ID to the index.
+
+        Args:
+            tweet_id (int): Tweet ID
+
+        """
+        if tweet_id in self:
+            return
+        self._added.add(tweet_id)
+        if len(self._added) > max(len(self._ids) * self._merge_ratio, 100000):
+            self._merge()
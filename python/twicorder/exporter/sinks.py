@@ -0,0 +1,811 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import uuid
+
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    Float,
+    Integer,
+    SmallInteger,
+    String,
+    create_engine,
+    event,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from twicorder.exporter.dedup import TweetIdIndex
+from twicorder.exporter.tables import (
+    create_indexes,
+    create_tables,
+    drop_indexes,
+    load_index_profile,
+)
+from twicorder.exporter.tables import (
+    Account,
+    Base,
+    COUNTER_COLUMNS,
+    IngestedFile,
+    PROFILE_COLUMNS,
+    Tweet,
+    User,
+)
+
+
+# SQLite page cache during bulk loads, in KiB
+BULK_CACHE_SIZE = 1024 * 1024
+
+# Columns to partition Parquet datasets by
+PARTITIONS = ('month', 'endpoint')
+
+# Primary keys generated by the database on insert, which are left out of
+# Parquet datasets and of COPY
+SURROGATE_KEYS = {
+    'mentions': 'mention_id',
+    'hashtags': 'hashtag_id',
+    'symbols': 'symbol_id',
+    'media': 'unique_id',
+    'urls': 'url_id',
+}
+
+
+def set_bulk_pragmas(dbapi_connection, connection_record):
+    """
+    Tunes SQLite for bulk loading. Syncing to disk is left to the OS, so a
+    power loss during the load may corrupt the database, which is then
+    re-exported from the raw files.
+
+    Args:
+        dbapi_connection (sqlite3.Connection): New DB-API connection
+        connection_record (_ConnectionRecord): Pool record of the connection
+
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute(f'PRAGMA cache_size=-{BULK_CACHE_SIZE}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+def set_default_pragmas(dbapi_connection):
+    """
+    Returns SQLite to the settings it uses outside of bulk loading, with a
+    single database file, and every commit synced to disk.
+
+    Args:
+        dbapi_connection (sqlite3.Connection): DB-API connection
+
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=DELETE')
+    cursor.execute('PRAGMA synchronous=FULL')
+    cursor.execute('PRAGMA cache_size=-2000')
+    cursor.execute('PRAGMA temp_store=DEFAULT')
+    cursor.close()
+
+
+class Sink(object):
+    """
+    Base class for exporter targets. A sink stores the rows built by the
+    exporter, and the manifest of ingested raw files, which is kept in a SQL
+    database on the sink's connection.
+    """
+
+    connection = None
+
+    @property
+    def path(self):
+        """
+        File the manifest of ingested raw files is kept in.
+
+        Returns:
+            str: Path
+
+        """
+        raise NotImplementedError
+
+    @property
+    def last_modified(self):
+        """
+        Time of the last export to the sink.
+
+        Returns:
+            float: Modification time, 0.0 if nothing has been exported
+
+        """
+        if not os.path.isfile(self.path):
+            return 0.0
+        return os.path.getmtime(self.path)
+
+    def get_manifest(self):
+        """
+        Reads the manifest of ingested raw files.
+
+        Returns:
+            dict[str, dict]: Manifest entries, by raw file path
+
+        """
+        table = IngestedFile.__table__
+        return {
+            row['path']: dict(row)
+            for row in self.connection.execute(select([table]))
+        }
+
+    def write_manifest(self, entries):
+        """
+        Inserts or replaces manifest entries.
+
+        Args:
+            entries (list[dict]): Manifest entries
+
+        """
+        if not entries:
+            return
+        self.connection.execute(
+            IngestedFile.__table__.insert().prefix_with('OR REPLACE'),
+            entries
+        )
+
+    def load_tweet_index(self):
+        """
+        Loads the IDs of all exported tweets.
+
+        Returns:
+            TweetIdIndex: Index
+
+        """
+        raise NotImplementedError
+
+    def get_max_user_id(self):
+        """
+        Highest unique ID given to an exported user.
+
+        Returns:
+            int: Unique ID, 0 if no users have been exported
+
+        """
+        raise NotImplementedError
+
+    def load_accounts(self):
+        """
+        Reads the user dimension, with the latest profile version of each
+        exported user.
+
+        Returns:
+            iterable[dict]: Account rows
+
+        """
+        raise NotImplementedError
+
+    def count(self, table):
+        """
+        Number of exported rows in the given table.
+
+        Args:
+            table (Table): Table
+
+        Returns:
+            int: Row count
+
+        """
+        raise NotImplementedError
+
+    def write(self, rows, manifest_entries):
+        """
+        Stores a batch of rows, along with the manifest entries of raw files
+        that have been read to the end.
+
+        Args:
+            rows (dict[Table, list[dict]]): Rows, by table
+            manifest_entries (list[dict]): Manifest entries
+
+        """
+        raise NotImplementedError
+
+    def refresh(self):
+        """
+        Called periodically while following the raw data tree, after rows
+        have been written, to bring data derived from the written rows up to
+        date.
+        """
+
+    def end_bulk_load(self):
+        """
+        Called before following the raw data tree, after the initial export,
+        to return the sink to its settings for small incremental writes.
+        """
+
+    def finish(self):
+        """
+        Called once all rows have been written.
+        """
+
+
+class DatabaseSink(Sink):
+    """
+    Base class for sinks writing rows to a SQL database with the schema in
+    tables.py, with the manifest in the same database.
+
+    In bulk load mode, secondary indexes are dropped during the export, and
+    the indexes of the index profile are built once all rows have been
+    written.
+    """
+
+    # Whether to create foreign key constraints
+    FOREIGN_KEYS = True
+
+    def __init__(self, engine, bulk_load=False, index_profile='full'):
+        self._index_profile = load_index_profile(index_profile)
+        create_tables(engine, indexes=False, foreign_keys=self.FOREIGN_KEYS)
+        Base.metadata.bind = engine
+        self.connection = engine.connect()
+        self._bulk_load = bulk_load
+        if bulk_load:
+            drop_indexes(self.connection)
+        else:
+            create_indexes(self.connection, self._index_profile)
+
+    def load_tweet_index(self):
+        return TweetIdIndex.from_table(
+            connection=self.connection,
+            column=Tweet.__table__.c.tweet_id
+        )
+
+    def get_max_user_id(self):
+        query = select([func.max(User.__table__.c.unique_id)])
+        return self.connection.execute(query).scalar() or 0
+
+    def count(self, table):
+        query = select([func.count()]).select_from(table)
+        return self.connection.execute(query).scalar()
+
+    def _fill_accounts(self):
+        """
+        Fills the user dimension from the latest profile version of each
+        user, for databases exported before it was added.
+        """
+        users = User.__table__
+        latest = select([
+            func.max(users.c.unique_id).label('unique_id'),
+            func.count().label('version_count'),
+        ]).group_by(users.c.user_id).alias('latest')
+        query = select(
+            [users.c.user_id, users.c.unique_id, latest.c.version_count] +
+            [users.c[name] for name in PROFILE_COLUMNS]
+        ).select_from(
+            users.join(latest, users.c.unique_id == latest.c.unique_id)
+        )
+        columns = ['user_id', 'unique_id', 'version_count'] + PROFILE_COLUMNS
+        with self.connection.begin():
+            self.connection.execute(
+                Account.__table__.insert().from_select(columns, query)
+            )
+
+    def load_accounts(self):
+        if not self.count(Account.__table__) and self.get_max_user_id():
+            self._fill_accounts()
+        for row in self.connection.execute(select([Account.__table__])):
+            yield dict(row)
+
+    def build_indexes(self):
+        """
+        Builds the indexes of the index profile which do not already exist.
+        """
+        t0 = datetime.now()
+        print('\nBuilding indexes...')
+        create_indexes(self.connection, self._index_profile)
+        print(f'Index build time: {datetime.now() - t0}')
+
+    def end_bulk_load(self):
+        """
+        In bulk load mode, builds the indexes of the index profile, and leaves
+        bulk load mode.
+        """
+        if not self._bulk_load:
+            return
+        self.build_indexes()
+        self._bulk_load = False
+
+    def finish(self):
+        """
+        Leaves bulk load mode, if the sink is still in it.
+        """
+        self.end_bulk_load()
+
+
+class SQLiteSink(DatabaseSink):
+    """
+    Writes rows to a SQLite database, with one executemany per table and one
+    transaction per batch. In bulk load mode, SQLite is also tuned for
+    writing during the export.
+    """
+
+    def __init__(self, output_path, bulk_load=False, index_profile='full'):
+        self._output_path = output_path
+        engine = create_engine(f'sqlite:///{output_path}')
+        if bulk_load:
+            event.listen(engine, 'connect', set_bulk_pragmas)
+        super().__init__(engine, bulk_load, index_profile)
+
+    @property
+    def path(self):
+        return self._output_path
+
+    def write(self, rows, manifest_entries):
+        with self.connection.begin():
+            for table, table_rows in rows.items():
+                if not table_rows:
+                    continue
+                statement = table.insert()
+                if table is Account.__table__:
+                    # Replace the users' previous latest versions
+                    statement = statement.prefix_with('OR REPLACE')
+                self.connection.execute(statement, table_rows)
+            self.write_manifest(manifest_entries)
+
+    def end_bulk_load(self):
+        """
+        In bulk load mode, builds the indexes of the index profile and
+        returns the database to its default settings, leaving a single
+        database file.
+        """
+        if not self._bulk_load:
+            return
+        super().end_bulk_load()
+        engine = self.connection.engine
+        if event.contains(engine, 'connect', set_bulk_pragmas):
+            event.remove(engine, 'connect', set_bulk_pragmas)
+        set_default_pragmas(self.connection.connection)
+
+
+def csv_value(value):
+    """
+    Formats a value for COPY in CSV format. Strings are always quoted, so
+    empty strings are told apart from NULL, which is an unquoted empty field.
+
+    Args:
+        value: Value
+
+    Returns:
+        str: CSV field
+
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        # PostgreSQL text can not hold NUL characters
+        return '"' + value.replace('"', '""').replace('\x00', '') + '"'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value)
+
+
+class PostgresSink(DatabaseSink):
+    """
+    Writes rows to a PostgreSQL database. Each batch is streamed with COPY
+    into temporary staging tables, and moved into the exported tables with
+    INSERT ... ON CONFLICT DO NOTHING, all in one transaction. Tweets already
+    in the database are skipped along with their users, mentions and other
+    rows, so a batch written twice, e.g. after a crash before the manifest
+    was updated, is only exported once. Accounts are upserted.
+
+    Foreign key constraints are left out, as they are not enforced in SQLite
+    exports either. Exports to a new database run in bulk load mode, with
+    indexes built after the load.
+
+    User IDs are assigned by the exporter, so a database is written to by
+    one exporter at a time. Any number of clients may query it meanwhile.
+    """
+
+    FOREIGN_KEYS = False
+
+    def __init__(self, database_url, bulk_load=False, index_profile='full'):
+        engine = create_engine(database_url)
+        with engine.connect() as connection:
+            new = not engine.dialect.has_table(connection, 'tweets')
+        super().__init__(engine, bulk_load or new, index_profile)
+
+    @property
+    def last_modified(self):
+        """
+        Modification time of the latest ingested raw file, as the database
+        itself has no modification time.
+
+        Returns:
+            float: Modification time, 0.0 if nothing has been exported
+
+        """
+        query = select([func.max(IngestedFile.__table__.c.mtime)])
+        return self.connection.execute(query).scalar() or 0.0
+
+    def write_manifest(self, entries):
+        if not entries:
+            return
+        statement = postgresql_insert(IngestedFile.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['path'],
+            set_={
+                c.name: statement.excluded[c.name]
+                for c in IngestedFile.__table__.columns if c.name != 'path'
+            }
+        )
+        self.connection.execute(statement, entries)
+
+    def _copy(self, cursor, table_name, columns, rows):
+        """
+        Streams rows into a table with COPY.
+
+        Args:
+            cursor (cursor): DB-API cursor
+            table_name (str): Table to copy into
+            columns (list[str]): Column names
+            rows (list[dict]): Rows
+
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(csv_value(row.get(c)) for c in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table_name} ({", ".join(columns)}) '
+            f'FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+
+    def write(self, rows, manifest_entries):
+        tweets = Tweet.__table__
+        accounts = Account.__table__
+        with self.connection.begin():
+            cursor = self.connection.connection.cursor()
+            staged = {}
+            for table, table_rows in rows.items():
+                if not table_rows:
+                    continue
+                columns = [
+                    c.name for c in table.columns
+                    if c.name != SURROGATE_KEYS.get(table.name)
+                ]
+                staging = f'staging_{table.name}'
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                    f'SELECT {", ".join(columns)} FROM {table.name} '
+                    f'WITH NO DATA'
+                )
+                self._copy(cursor, staging, columns, table_rows)
+                staged[table] = (staging, ', '.join(columns))
+            staged_accounts = staged.pop(accounts, None)
+            if tweets in staged:
+                staging, columns = staged.pop(tweets)
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE staging_new_tweets ON COMMIT DROP '
+                    f'AS WITH inserted AS ('
+                    f'INSERT INTO tweets ({columns}) '
+                    f'SELECT {columns} FROM {staging} '
+                    f'ON CONFLICT (tweet_id) DO NOTHING RETURNING tweet_id'
+                    f') SELECT tweet_id FROM inserted'
+                )
+                for table, (staging, columns) in staged.items():
+                    cursor.execute(
+                        f'INSERT INTO {table.name} ({columns}) '
+                        f'SELECT {columns} FROM {staging} s '
+                        f'WHERE EXISTS (SELECT 1 FROM staging_new_tweets n '
+                        f'WHERE n.tweet_id = s.tweet_id) '
+                        f'ON CONFLICT DO NOTHING'
+                    )
+            if staged_accounts:
+                staging, columns = staged_accounts
+                updates = ', '.join(
+                    f'{c.name} = EXCLUDED.{c.name}' for c in accounts.columns
+                    if c.name != 'user_id'
+                )
+                cursor.execute(
+                    f'INSERT INTO accounts ({columns}) '
+                    f'SELECT {columns} FROM {staging} s '
+                    f'WHERE EXISTS (SELECT 1 FROM users u '
+                    f'WHERE u.unique_id = s.unique_id) '
+                    f'ON CONFLICT (user_id) DO UPDATE SET {updates}'
+                )
+            cursor.close()
+            self.write_manifest(manifest_entries)
+
+    def end_bulk_load(self):
+        """
+        In bulk load mode, builds the indexes of the index profile and
+        updates the planner statistics for the loaded tables.
+        """
+        if not self._bulk_load:
+            return
+        super().end_bulk_load()
+        self.connection.execute('ANALYZE')
+
+
+class ParquetSink(Sink):
+    """
+    Writes rows to Parquet datasets, one directory per table, partitioned
+    Hive style by the month or the endpoint of the tweet each row belongs to.
+    String columns are dictionary encoded, and each batch is added as new
+    files, so existing files are never rewritten.
+
+    The datasets can be read with pyarrow, pandas, DuckDB or Spark, reading
+    only the columns and partitions a query needs. The manifest of ingested
+    raw files is kept in a SQLite database next to the datasets, with a name
+    dataset readers ignore.
+
+    Datasets are only appended to, so the user dimension is not updated
+    with each batch, but derived from the profile versions in the users
+    dataset, with the latest counters of each user, and rewritten once all
+    rows have been written, and periodically while following the raw data
+    tree.
+    """
+
+    _ARROW_TYPES = {
+        BigInteger: 'int64',
+        Integer: 'int64',
+        SmallInteger: 'int16',
+        Boolean: 'bool_',
+        Float: 'float64',
+        String: 'string',
+    }
+
+    def __init__(self, root, partition_by='month', compression='zstd'):
+        if pyarrow is None:
+            raise ImportError(
+                'The Parquet sink requires pyarrow: pip install pyarrow'
+            )
+        if partition_by not in PARTITIONS:
+            raise ValueError(
+                f'Partition must be one of {", ".join(PARTITIONS)}, got '
+                f'{partition_by!r}.'
+            )
+        os.makedirs(root, exist_ok=True)
+        self._root = root
+        self._partition_by = partition_by
+        self._compression = compression
+        self._manifest_path = os.path.join(root, '_manifest.db')
+        engine = create_engine(f'sqlite:///{self._manifest_path}')
+        IngestedFile.__table__.create(engine, checkfirst=True)
+        self.connection = engine.connect()
+        # Accounts written since the user dimension was last rewritten
+        self._account_updates = {}
+
+    @property
+    def path(self):
+        return self._manifest_path
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def partition_by(self):
+        return self._partition_by
+
+    def _arrow_type(self, column):
+        if isinstance(column.type, DateTime):
+            return pyarrow.timestamp('us', tz='UTC')
+        return getattr(pyarrow, self._ARROW_TYPES[type(column.type)])()
+
+    def _columns(self, table):
+        surrogate_key = SURROGATE_KEYS.get(table.name)
+        return [c for c in table.columns if c.name != surrogate_key]
+
+    def _schema(self, table, partitioned=True):
+        fields = [
+            pyarrow.field(c.name, self._arrow_type(c))
+            for c in self._columns(table)
+            if not partitioned or c.name != self._partition_by
+        ]
+        if partitioned:
+            fields.append(pyarrow.field(self._partition_by, pyarrow.string()))
+        return pyarrow.schema(fields)
+
+    @staticmethod
+    def _string_columns(schema, exclude=()):
+        return [
+            f.name for f in schema
+            if f.type == pyarrow.string() and f.name not in exclude
+        ]
+
+    def _dataset(self, table):
+        path = os.path.join(self._root, table.name)
+        if not os.path.isdir(path):
+            return
+        return pyarrow.dataset.dataset(
+            path, format='parquet', partitioning='hive'
+        )
+
+    def _partition_value(self, tweet):
+        if self._partition_by == 'month':
+            return tweet['created_at'].strftime('%Y-%m')
+        return tweet['endpoint']
+
+    def load_tweet_index(self):
+        index = TweetIdIndex()
+        dataset = self._dataset(Tweet.__table__)
+        if dataset is not None:
+            ids = dataset.to_table(columns=['tweet_id']).column('tweet_id')
+            index.load(sorted(ids.to_pylist()))
+        return index
+
+    def get_max_user_id(self):
+        dataset = self._dataset(User.__table__)
+        if dataset is None:
+            return 0
+        ids = dataset.to_table(columns=['unique_id']).column('unique_id')
+        return pyarrow.compute.max(ids).as_py() or 0
+
+    def count(self, table):
+        dataset = self._dataset(table)
+        return dataset.count_rows() if dataset is not None else 0
+
+    @property
+    def _accounts_path(self):
+        return os.path.join(
+            self._root, Account.__tablename__, 'accounts.parquet'
+        )
+
+    @staticmethod
+    def _with_counters(accounts, counters):
+        """
+        Replaces the counters of accounts with those of the same profile
+        version in another accounts table.
+
+        Args:
+            accounts (pyarrow.Table): Accounts
+            counters (pyarrow.Table): Accounts with newer counters
+
+        Returns:
+            pyarrow.Table: Accounts
+
+        """
+        keys = ['user_id', 'unique_id']
+        latest_names = [f'latest_{name}' for name in COUNTER_COLUMNS]
+        counters = counters.select(keys + COUNTER_COLUMNS).rename_columns(
+            keys + latest_names
+        )
+        joined = accounts.join(counters, keys=keys, join_type='left outer')
+        for name, latest_name in zip(COUNTER_COLUMNS, latest_names):
+            joined = joined.set_column(
+                joined.column_names.index(name),
+                name,
+                pyarrow.compute.coalesce(joined[latest_name], joined[name])
+            )
+        return joined.select(accounts.column_names)
+
+    def _accounts_table(self):
+        """
+        Derives the user dimension from the latest profile version of each
+        user in the users dataset. Counters are taken from the last user
+        dimension written, and from accounts written since, where they refer
+        to the same profile version.
+
+        Returns:
+            pyarrow.Table: Accounts, None if no users have been exported
+
+        """
+        dataset = self._dataset(User.__table__)
+        if dataset is None:
+            return
+        users = dataset.to_table(
+            columns=['user_id', 'unique_id'] + PROFILE_COLUMNS
+        )
+        latest = users.group_by('user_id').aggregate([
+            ('unique_id', 'max'), ('unique_id', 'count'),
+        ])
+        accounts = users.join(
+            latest.select(['unique_id_max', 'unique_id_count']),
+            keys='unique_id',
+            right_keys='unique_id_max',
+            join_type='inner'
+        )
+        accounts = accounts.rename_columns([
+            'version_count' if name == 'unique_id_count' else name
+            for name in accounts.column_names
+        ])
+        schema = self._schema(Account.__table__, partitioned=False)
+        accounts = accounts.select(schema.names).cast(schema)
+        if os.path.isfile(self._accounts_path):
+            accounts = self._with_counters(
+                accounts, pyarrow.parquet.read_table(self._accounts_path)
+            )
+        if self._account_updates:
+            accounts = self._with_counters(
+                accounts,
+                pyarrow.Table.from_pylist(
+                    list(self._account_updates.values()), schema=schema
+                )
+            )
+        return accounts.sort_by('user_id')
+
+    def load_accounts(self):
+        accounts = self._accounts_table()
+        if accounts is None:
+            return []
+        return accounts.to_pylist()
+
+    def write(self, rows, manifest_entries):
+        """
+        Writes a batch of rows as new Parquet files. Every row refers to the
+        tweet it was built for, and all rows for a tweet are written in the
+        same batch as the tweet, so rows are partitioned by their tweet. The
+        manifest is updated once the files have been written.
+
+        Args:
+            rows (dict[Table, list[dict]]): Rows, by table
+            manifest_entries (list[dict]): Manifest entries
+
+        """
+        partitions = {
+            tweet['tweet_id']: self._partition_value(tweet)
+            for tweet in rows.get(Tweet.__table__, ())
+        }
+        for account in rows.get(Account.__table__, ()):
+            self._account_updates[account['user_id']] = account
+        basename = f'part-{uuid.uuid4().hex}-{{i}}.parquet'
+        for table, table_rows in rows.items():
+            if not table_rows or table is Account.__table__:
+                continue
+            schema = self._schema(table)
+            data = {
+                name: [row.get(name) for row in table_rows]
+                for name in schema.names
+            }
+            data[self._partition_by] = [
+                partitions[row['tweet_id']] for row in table_rows
+            ]
+            pyarrow.parquet.write_to_dataset(
+                pyarrow.table(data, schema=schema),
+                root_path=os.path.join(self._root, table.name),
+                partition_cols=[self._partition_by],
+                basename_template=basename,
+                use_dictionary=self._string_columns(
+                    schema, exclude=[self._partition_by]
+                ),
+                compression=self._compression,
+            )
+        with self.connection.begin():
+            self.write_manifest(manifest_entries)
+
+    def refresh(self):
+        """
+        Rewrites the user dimension, as a single file replacing the last.
+        """
+        accounts = self._accounts_table()
+        if accounts is None:
+            return
+        path = os.path.dirname(self._accounts_path)
+        os.makedirs(path, exist_ok=True)
+        # Hidden from dataset readers until complete
+        temp_path = os.path.join(path, '.accounts.parquet')
+        pyarrow.parquet.write_table(
+            accounts,
+            temp_path,
+            use_dictionary=self._string_columns(accounts.schema),
+            compression=self._compression,
+        )
+        os.replace(temp_path, self._accounts_path)
+        self._account_updates.clear()
+
+    def finish(self):
+        """
+        Rewrites the user dimension.
+        """
+        self.refresh()
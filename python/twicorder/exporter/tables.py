@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import yaml
+
 from sqlalchemy import (
     BigInteger,
     Boolean,
@@ -11,9 +14,12 @@ from sqlalchemy import (
     Integer,
     SmallInteger,
     String,
+    text,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import CreateTable
 
 
 Base = declarative_base()
@@ -25,6 +31,16 @@ SmallInteger: 16bit
 """
 
 
+@compiles(String, 'postgresql')
+def compile_string_postgresql(type_, compiler, **kw):
+    """
+    String lengths are not enforced by SQLite, and some of the columns below
+    hold longer values than their lengths allow. PostgreSQL enforces them, so
+    strings are stored as TEXT there, which performs the same as VARCHAR.
+    """
+    return 'TEXT'
+
+
 class Tweet(Base):
 
     __tablename__ = 'tweets'
@@ -88,6 +104,11 @@ class Tweet(Base):
     # quoted_status = relationship('Tweet', back_populates='tweets', foreign_keys=['quoted_status_id'])
 
 
+# Profile versions of users. A new version is stored when a user is first
+# seen, and whenever their profile has changed since their last version.
+# Tweets and mentions refer to the version current when they were captured.
+# Endpoint, capture date and tweet ID are those of the version's first
+# sighting.
 class User(Base):
 
     __tablename__ = 'users'
@@ -122,6 +143,38 @@ class User(Base):
     # tweet = relationship('Tweet', back_populates='users')
 
 
+# User dimension, with one row per user holding their latest profile version
+class Account(Base):
+
+    __tablename__ = 'accounts'
+
+    # Primary key
+    user_id = Column(BigInteger, primary_key=True)
+
+    # Latest profile version
+    unique_id = Column(Integer, ForeignKey('users.unique_id'), index=True)
+    version_count = Column(Integer)
+
+    name = Column(String(64), index=True)
+    screen_name = Column(String(64), index=True)
+    location = Column(String(256))
+    description = Column(String(512))
+    url = Column(String(256))
+    protected = Column(Boolean)
+    followers_count = Column(Integer)
+    friends_count = Column(Integer)
+    listed_count = Column(Integer)
+    favourites_count = Column(Integer)
+
+    created_at = Column(DateTime)
+    verified = Column(Boolean)
+    statuses_count = Column(Integer)
+    lang = Column(String(8))
+    geo_enabled = Column(Boolean)
+    contributors_enabled = Column(Boolean)
+    withheld_in_countries = Column(String(256))
+
+
 class Mention(Base):
 
     __tablename__ = 'mentions'
@@ -217,13 +270,176 @@ class Url(Base):
     # tweet = relationship('Tweet', back_populates='urls')
 
 
-def create_tables(engine):
+class IngestedFile(Base):
+
+    __tablename__ = 'ingested_files'
+
+    # Primary key
+    path = Column(String(1024), primary_key=True)
+
+    size = Column(BigInteger)
+    mtime = Column(Float)
+    content_hash = Column(String(64))
+    byte_offset = Column(BigInteger)
+    line_count = Column(Integer)
+
+
+# Profile columns, kept for every profile version and on accounts
+PROFILE_COLUMNS = [
+    c.name for c in Account.__table__.columns
+    if c.name not in ('user_id', 'unique_id', 'version_count')
+]
+
+# Profile columns changing with most tweets, which do not make a new profile
+# version. Accounts keep their latest values.
+COUNTER_COLUMNS = [
+    'favourites_count',
+    'followers_count',
+    'friends_count',
+    'listed_count',
+    'statuses_count',
+]
+
+# Profile columns compared to tell whether a user's profile has changed
+FINGERPRINT_COLUMNS = [
+    name for name in PROFILE_COLUMNS if name not in COUNTER_COLUMNS
+]
+
+
+# Columns to index, by table. The "full" profile indexes every column marked
+# for indexing in the table definitions above. The "minimal" profile indexes
+# the columns used to join tables and to look up tweets by author, date and
+# type, and the "none" profile leaves out secondary indexes altogether.
+INDEX_PROFILES = {
+    'full': {
+        table.name: sorted(
+            column.name
+            for index in table.indexes
+            for column in index.columns
+        )
+        for table in Base.metadata.tables.values()
+    },
+    'minimal': {
+        'tweets': [
+            'created_at', 'endpoint', 'lang', 'tweet_type', 'user_id',
+            'user_unique_id',
+        ],
+        'users': ['screen_name', 'user_id'],
+        'accounts': ['screen_name'],
+        'mentions': ['tweet_id', 'unique_user_id', 'user_id'],
+        'hashtags': ['text', 'tweet_id'],
+        'symbols': ['text', 'tweet_id'],
+        'media': ['media_id', 'tweet_id'],
+        'urls': ['tweet_id'],
+    },
+    'none': {},
+}
+
+
+def load_index_profile(profile):
+    """
+    Gets an index profile by name, or reads one from a yaml file mapping table
+    names to lists of column names.
+
+    Args:
+        profile (str): Profile name or path to profile file
+
+    Returns:
+        dict[str, list[str]]: Columns to index, by table
+
+    Raises:
+        ValueError: If the profile is not found, or names unknown columns
+
+    """
+    if profile in INDEX_PROFILES:
+        return INDEX_PROFILES[profile]
+    if not os.path.isfile(profile):
+        raise ValueError(
+            f'Index profile must be one of {", ".join(INDEX_PROFILES)} or a '
+            f'path to a yaml file, got {profile!r}.'
+        )
+    with open(profile, 'r') as stream:
+        columns = yaml.safe_load(stream) or {}
+    for table_name, column_names in columns.items():
+        table = Base.metadata.tables.get(table_name)
+        if table is None:
+            raise ValueError(f'Unknown table in index profile: {table_name}')
+        for column_name in column_names:
+            if column_name not in table.columns:
+                raise ValueError(
+                    f'Unknown column in index profile: '
+                    f'{table_name}.{column_name}'
+                )
+    return columns
+
+
+def create_tables(engine, indexes=True, foreign_keys=True):
     """
     Create all tables in the engine. This is equivalent to "Create Table"
     statements in raw SQL.
 
     Args:
         engine (Engine): SQLAlchemy engine
+        indexes (bool): Create secondary indexes along with the tables. If
+            False, tables are created on their own, and indexes are left to
+            create_indexes()
+        foreign_keys (bool): Create foreign key constraints. Only applies
+            when indexes is False. SQLite does not enforce them, while
+            databases that do would reject users inserted ahead of their
+            tweets
+
+    """
+    if indexes:
+        Base.metadata.create_all(engine)
+        return
+    with engine.connect() as connection:
+        for table in Base.metadata.tables.values():
+            if engine.dialect.has_table(connection, table.name):
+                continue
+            connection.execute(CreateTable(
+                table,
+                include_foreign_key_constraints=None if foreign_keys else []
+            ))
+
+
+def create_indexes(connection, profile):
+    """
+    Creates the indexes of the given profile which do not already exist.
+    Indexes are named the way SQLAlchemy names the indexes it creates for
+    the table definitions.
+
+    Args:
+        connection (Connection): SQLAlchemy connection
+        profile (dict[str, list[str]]): Columns to index, by table
+
+    """
+    for table_name, column_names in profile.items():
+        for column_name in column_names:
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS ix_{table_name}_{column_name} '
+                f'ON {table_name} ({column_name})'
+            )
+
+
+def drop_indexes(connection):
+    """
+    Drops all secondary indexes. Primary keys are left in place.
+
+    Args:
+        connection (Connection): SQLAlchemy connection
 
     """
-    Base.metadata.create_all(engine)
+    if connection.dialect.name == 'postgresql':
+        query = text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() "
+            "AND indexname LIKE :pattern ESCAPE '\\'"
+        )
+    else:
+        query = text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND name LIKE :pattern ESCAPE '\\'"
+        )
+    result = connection.execute(query, pattern='ix\\_%')
+    for name, in result.fetchall():
+        connection.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+from statistics import mean
+
+from twicorder.utils import iterlines, str_to_date
+
+# Number of bytes at the start of a raw file hashed to tell if the file has
+# been replaced since it was ingested. Raw files are only ever appended to, so
+# the start of a file does not change while it grows.
+HASH_SIZE = 65536
+
+
+def hash_file(file_path, size):
+    """
+    Hashes the start of a file.
+
+    Args:
+        file_path (str): Path to file
+        size (int): Number of bytes to hash, at most HASH_SIZE
+
+    Returns:
+        str: Hex digest
+
+    """
+    with open(file_path, 'rb') as file_object:
+        data = file_object.read(min(size, HASH_SIZE))
+    return hashlib.blake2s(data).hexdigest()
+
+
+class TweetRows(object):
+    """
+    Rows built for a tweet, ready to be inserted, along with the rows for the
+    tweets it retweets or quotes.
+
+    User rows are built without a unique ID, which is given by the exporter
+    as they are inserted. Until then, rows referring to a user hold the
+    user's row in place of its unique ID.
+    """
+
+    def __init__(self, tweet_id, author, children, rows):
+        self.tweet_id = tweet_id
+        self.author = author
+        self.children = children
+        self.rows = rows
+
+
+class FileRows(object):
+    """
+    Rows built for the tweets read from a raw file, along with the file's
+    entry for the manifest of ingested files.
+    """
+
+    def __init__(self, raw_file, tweets, manifest_entry):
+        self.raw_file = raw_file
+        self.tweets = tweets
+        self.manifest_entry = manifest_entry
+
+
+class TweetTransformer(object):
+    """
+    Normalises raw tweets and builds their rows for the export tables. Holds
+    no state, so rows can be built in worker processes.
+    """
+
+    @staticmethod
+    def _get_tweet_type(tweet_obj):
+        reply_status = tweet_obj.get('in_reply_to_status_id')
+        reply_user = tweet_obj.get('in_reply_to_user_id')
+        retweet = tweet_obj.get('retweeted_status')
+        quote = tweet_obj.get('quoted_status')
+
+        tweet_type = 'tw'
+        if reply_status or reply_user:
+            tweet_type = 're'
+        if retweet:
+            tweet_type = 'rt'
+        elif quote:
+            tweet_type = 'qt'
+        return tweet_type
+
+    @staticmethod
+    def _get_endpoint(raw_file):
+        tokens = [t for t in raw_file.split(os.sep) if t]
+        if len(tokens) == 2 and tokens[0] == 'stream':
+            return 'st'
+        elif len(tokens) == 4:
+            if tokens[2] == 'timeline':
+                return 'tl'
+            elif tokens[2] == 'mentions':
+                return 'mt'
+            elif tokens[2] == 'replies':
+                return 'rp'
+            elif tokens[1] == 'hashtags':
+                return 'ht'
+
+    @staticmethod
+    def _get_tweet_text(tweet_obj):
+        text_obj = tweet_obj.copy()
+        if tweet_obj.get('retweeted_status'):
+            text_obj = tweet_obj['retweeted_status'].copy()
+        if text_obj.get('extended_tweet'):
+            text_obj = text_obj['extended_tweet']
+        text = text_obj.get('full_text', text_obj.get('text'))
+        display_range = text_obj.get('display_text_range', (None, None))
+        return text, display_range
+
+    @staticmethod
+    def _get_coordinates(coordinates_obj):
+        if not coordinates_obj:
+            return [None, None]
+        return coordinates_obj['coordinates']
+
+    @staticmethod
+    def _get_coordinates_from_place(place_obj):
+        if not place_obj:
+            return [None, None]
+        bounding_box = place_obj['bounding_box']
+        if not bounding_box:
+            return [None, None]
+        coordinates = bounding_box['coordinates'][0]
+        latitude = mean([c[0] for c in coordinates])
+        longitude = mean([c[1] for c in coordinates])
+        return [latitude, longitude]
+
+    @classmethod
+    def _recursive_update(cls, orig, new):
+        shallow_new = {
+            k: v for k, v in new.items() if v and not isinstance(v, dict)
+        }
+        orig.update(shallow_new)
+
+        for key, value in new.items():
+            if not isinstance(value, dict):
+                continue
+            cls._recursive_update(orig[key], value)
+
+    @staticmethod
+    def _extend_entities(tweet_obj):
+        extended_entities = tweet_obj.get('extended_entities')
+        if not extended_entities:
+            return
+        tweet_obj['entities']['media'] = extended_entities['media']
+
+    def build_tweet(self, tweet_obj, raw_file, line, primary=True):
+        """
+        Builds the rows for a tweet, along with the rows for the tweets it
+        retweets or quotes.
+
+        Args:
+            tweet_obj (dict): Tweet
+            raw_file (str): Raw file path, relative to the raw data dir
+            line (int): Line number of the tweet in the raw file
+            primary (bool): Whether the tweet was captured directly, rather
+                than retweeted or quoted by a captured tweet
+
+        Returns:
+            TweetRows: Rows
+
+        """
+        tweet_id = tweet_obj['id']
+        rows = []
+        children = []
+
+        hashtags = []
+        urls = []
+        media_objects = []
+        mentions = []
+
+        # Copy retweet entities from original tweet
+        if tweet_obj.get('retweeted_status'):
+            retweeted_status = tweet_obj['retweeted_status']
+            tweet_obj['entities'] = retweeted_status['entities']
+            if retweeted_status.get('extended_entities'):
+                extended_entities = retweeted_status['extended_entities']
+                tweet_obj['extended_entities'] = extended_entities
+
+        # Extend tweet
+        if tweet_obj.get('extended_tweet'):
+            extended_tweet = tweet_obj['extended_tweet']
+            extended_entities = extended_tweet.pop('extended_entities', {})
+            if extended_entities:
+                tweet_obj['extended_entities'] = extended_entities
+            self._recursive_update(tweet_obj, tweet_obj['extended_tweet'])
+
+        # Extend entities
+        self._extend_entities(tweet_obj)
+
+        # Created date
+        created_date = str_to_date(tweet_obj['created_at'])
+
+        # Get end point
+        endpoint = self._get_endpoint(raw_file)
+
+        # Get tweet text
+        text, text_range = self._get_tweet_text(tweet_obj)
+
+        # Get location information
+        place_obj = tweet_obj['place'] or {}
+        place_id = place_obj.get('id')
+        place_type = place_obj.get('place_type')
+        place_full_name = place_obj.get('full_name')
+        country_code = place_obj.get('country_code')
+        latitude, longitude = self._get_coordinates(tweet_obj['coordinates'])
+        if latitude and longitude:
+            coordinates = True
+        else:
+            latitude, longitude = self._get_coordinates_from_place(place_obj)
+            coordinates = False
+
+        # Get withheld status
+        withheld_in_countries_str = ','.join(
+            tweet_obj.get('withheld_in_countries', [])
+        )
+
+        # Create raw file string
+        raw_file_str = f'{raw_file}:{line}'
+
+        # Register author
+        capture_date = created_date if primary else None
+        author = self.build_user(
+            user_obj=tweet_obj['user'],
+            tweet_id=tweet_id,
+            endpoint=endpoint,
+            capture_date=capture_date
+        )
+
+        # Register retweet
+        retweet = tweet_obj.get('retweeted_status')
+        if retweet:
+            children.append(
+                self.build_tweet(retweet, raw_file, line, primary=False)
+            )
+
+        # Register quoted tweet
+        quoted_status = tweet_obj.get('quoted_status')
+        if quoted_status:
+            children.append(
+                self.build_tweet(quoted_status, raw_file, line, primary=False)
+            )
+
+        # Register entities
+        # Todo: Account for extended tweets from the streaming API
+        for hashtag in tweet_obj['entities'].get('hashtags', []):
+            rows.append(('hashtags', self.build_hashtag(hashtag, tweet_id)))
+            hashtags.append(hashtag['text'])
+        for symbol in tweet_obj['entities'].get('symbols', []):
+            rows.append(('symbols', self.build_symbol(symbol, tweet_id)))
+        for url in tweet_obj['entities'].get('urls', []):
+            rows.append(('urls', self.build_url(url, tweet_id)))
+            urls.append(url)
+        # Todo: Account for extended entities
+        for media in tweet_obj['entities'].get('media', []):
+            rows.append(('media', self.build_media(media, tweet_id)))
+            media_objects.append(media)
+        for mention in tweet_obj['entities'].get('user_mentions', []):
+            user, mention_row = self.build_mention(
+                mention_obj=mention,
+                tweet_id=tweet_id,
+                author=author,
+                endpoint=endpoint,
+                capture_date=capture_date
+            )
+            if user and user is not author:
+                rows.append(('users', user))
+            rows.append(('mentions', mention_row))
+            mentions.append(mention)
+
+        # Register tweet
+        tweet = dict(
+            tweet_id=tweet_id,
+            primary_capture=primary,
+            endpoint=endpoint,
+            created_at=str_to_date(tweet_obj['created_at']),
+            tweet_type=self._get_tweet_type(tweet_obj),
+            text=text,
+            user_unique_id=author,
+            user_id=tweet_obj['user']['id'],
+            user_screen_name=tweet_obj['user']['screen_name'],
+            in_reply_to_status_id=tweet_obj['in_reply_to_status_id'],
+            in_reply_to_user_id=tweet_obj['in_reply_to_user_id'],
+            in_reply_to_screen_name=tweet_obj['in_reply_to_screen_name'],
+            hashtags_str=','.join(sorted(hashtags)),
+            hashtag_count=len(hashtags),
+            url_count=len(urls),
+            media_count=len(media_objects),
+            retweet_status_id=retweet['id'] if retweet else None,
+            is_quote_status=tweet_obj['is_quote_status'],
+            quoted_status_id=quoted_status['id'] if quoted_status else None,
+            mention_count=len(mentions),
+            retweet_count=tweet_obj['retweet_count'],
+            favorite_count=tweet_obj['favorite_count'],
+            lang=tweet_obj['lang'],
+            possibly_sensitive=tweet_obj.get('possibly_sensitive', False),
+            display_start=text_range[0],
+            display_end=text_range[1],
+            character_count=len(text),
+            coordinates=coordinates,
+            place_id=place_id,
+            place_type=place_type,
+            place_full_name=place_full_name,
+            country_code=country_code,
+            latitude=latitude,
+            longitude=longitude,
+            withheld_copyright=tweet_obj.get('withheld_copyright'),
+            withheld_in_countries_str=withheld_in_countries_str,
+            raw_file=raw_file_str,
+        )
+        rows.append(('tweets', tweet))
+        return TweetRows(tweet_id, author, children, rows)
+
+    def build_user(self, user_obj, tweet_id, endpoint, capture_date=None):
+        if 'created_at' not in user_obj:
+            return
+        user = dict(
+            unique_id=None,
+            user_id=user_obj['id'],
+            name=user_obj['name'],
+            screen_name=user_obj['screen_name'],
+            endpoint=endpoint,
+            capture_date=capture_date,
+            location=user_obj['location'],
+            description=user_obj['description'],
+            url=user_obj['url'],
+            protected=user_obj['protected'],
+            followers_count=user_obj['followers_count'],
+            friends_count=user_obj['friends_count'],
+            listed_count=user_obj['listed_count'],
+            favourites_count=user_obj['favourites_count'],
+            created_at=str_to_date(user_obj['created_at']),
+            verified=user_obj['verified'],
+            statuses_count=user_obj['statuses_count'],
+            lang=user_obj['lang'],
+            geo_enabled=user_obj['geo_enabled'],
+            contributors_enabled=user_obj['contributors_enabled'],
+            withheld_in_countries=','.join(
+                user_obj.get('withheld_in_countries', ())
+            ),
+            tweet_id=tweet_id
+        )
+        return user
+
+    def build_hashtag(self, hashtag_obj, tweet_id):
+        text = hashtag_obj['text']
+        start, end = hashtag_obj['indices']
+        hashtag = dict(
+            text=text,
+            display_start=start,
+            display_end=end,
+            tweet_id=tweet_id
+        )
+        return hashtag
+
+    def build_symbol(self, symbol_obj, tweet_id):
+        start, end = symbol_obj['indices']
+        symbol = dict(
+            text=symbol_obj['text'],
+            display_start=start,
+            display_end=end,
+            tweet_id=tweet_id
+        )
+        return symbol
+
+    def build_mention(self, mention_obj, tweet_id, endpoint, author=None,
+                      capture_date=None):
+        if author and author['user_id'] == mention_obj['id']:
+            user = author
+        else:
+            user = self.build_user(
+                user_obj=mention_obj,
+                tweet_id=tweet_id,
+                endpoint=endpoint,
+                capture_date=capture_date
+            )
+        start, end = mention_obj['indices']
+        mention = dict(
+            display_start=start,
+            display_end=end,
+            unique_user_id=user,
+            user_id=mention_obj['id'],
+            tweet_id=tweet_id,
+            name=mention_obj['name'],
+            screen_name=mention_obj['screen_name']
+        )
+        return user, mention
+
+    def build_media(self, media_obj, tweet_id):
+        start, end = media_obj['indices']
+        media = dict(
+            media_id=media_obj['id'],
+            media_url=media_obj['media_url'],
+            url=media_obj['url'],
+            expanded_url=media_obj['expanded_url'],
+            media_type=media_obj['type'],
+            display_start=start,
+            display_end=end,
+            source_status_id=media_obj.get('source_status_id'),
+            tweet_id=tweet_id
+        )
+        return media
+
+    def build_url(self, url_obj, tweet_id):
+        start, end = url_obj['indices']
+        url = dict(
+            url=url_obj['url'],
+            expanded_url=url_obj['expanded_url'],
+            display_start=start,
+            display_end=end,
+            tweet_id=tweet_id
+        )
+        return url
+
+
+def transform_file(file_path, raw_file, offset, line_count, size, mtime):
+    """
+    Reads tweets from a raw file and builds their rows. Reading starts at the
+    given byte offset, and stops before a trailing line or compressed member
+    which is still being written.
+
+    Args:
+        file_path (str): Path to raw file
+        raw_file (str): Path to raw file, relative to the raw data dir
+        offset (int): Byte offset to read from, into the decompressed data
+            for compressed files
+        line_count (int): Number of lines before the offset
+        size (int): Size of the file before reading it
+        mtime (float): Modification time of the file before reading it
+
+    Returns:
+        FileRows: Rows
+
+    """
+    transformer = TweetTransformer()
+    tweets = []
+    try:
+        for line in iterlines(file_path, offset=offset):
+            try:
+                data = json.loads(line)
+            except Exception as error:
+                if not line.endswith(b'\n'):
+                    # Line still being written, leave it for the next export.
+                    break
+                print(error)
+                data = {}
+            offset += len(line)
+            line_count += 1
+            if not data.get('id'):
+                # Don't bother with delete messages
+                continue
+            tweets.append(transformer.build_tweet(data, raw_file, line_count))
+    except EOFError:
+        # Compressed file with a member still being written. Lines read up
+        # to here are kept, and the rest is left for the next export.
+        pass
+    manifest_entry = dict(
+        path=raw_file,
+        size=size,
+        mtime=mtime,
+        content_hash=hash_file(file_path, size),
+        byte_offset=offset,
+        line_count=line_count
+    )
+    return FileRows(raw_file, tweets, manifest_entry)
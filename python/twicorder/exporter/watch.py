@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+from twicorder.constants import (
+    COMPRESSED_EXTENSIONS,
+    REGULAR_EXTENSIONS,
+)
+
+
+def is_raw_file(file_path):
+    """
+    Whether the given path has the extension of a raw file.
+
+    Args:
+        file_path (str): File path
+
+    Returns:
+        bool: True if raw file
+
+    """
+    extensions = REGULAR_EXTENSIONS + COMPRESSED_EXTENSIONS
+    return os.path.splitext(file_path)[-1].strip('.') in extensions
+
+
+def walk_raw_files(root):
+    """
+    Finds all raw files in the given directory tree.
+
+    Args:
+        root (str): Directory
+
+    Yields:
+        str: Raw file path
+
+    """
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if is_raw_file(file_name):
+                yield os.path.join(dir_path, file_name)
+
+
+class PollingWatcher(object):
+    """
+    Finds raw files that have been created or appended to, by scanning the
+    raw data tree at an interval and comparing sizes and modification times
+    with the previous scan.
+    """
+
+    def __init__(self, root, interval=5.0):
+        self._root = root
+        self._interval = interval
+        self._last_scan = time.time()
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for file_path in walk_raw_files(self._root):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            snapshot[file_path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def changes(self, timeout):
+        """
+        Waits for the next scan, or for the timeout, whichever comes first.
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            list[str]: Paths of raw files changed since the last scan
+
+        """
+        remaining = self._last_scan + self._interval - time.time()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(remaining, 0))
+        self._last_scan = time.time()
+        snapshot = self._scan()
+        changed = [
+            p for p, state in snapshot.items() if self._snapshot.get(p) != state
+        ]
+        self._snapshot = snapshot
+        return sorted(changed)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Finds raw files that have been created or appended to, from inotify
+    events on every directory in the raw data tree. Directories created
+    later are watched as they appear. If the kernel's event queue overflows,
+    every raw file in the tree is reported as changed.
+    """
+
+    # Wait for further events after the first, to report a burst of writes
+    # to a file once, in milliseconds
+    READ_DELAY = 100
+
+    def __init__(self, root):
+        if inotify_simple is None:
+            raise ImportError(
+                'The inotify watcher requires inotify_simple: '
+                'pip install inotify_simple'
+            )
+        flags = inotify_simple.flags
+        self._mask = (
+            flags.CLOSE_WRITE | flags.MODIFY | flags.MOVED_TO | flags.CREATE
+        )
+        self._root = root
+        self._inotify = inotify_simple.INotify()
+        self._dirs = {}
+        self._add_watches(root)
+
+    def _add_watches(self, root):
+        """
+        Watches the given directory and all directories below it.
+
+        Args:
+            root (str): Directory
+
+        Returns:
+            list[str]: Raw files found in the directories
+
+        """
+        found = []
+        for dir_path, _, file_names in os.walk(root):
+            try:
+                wd = self._inotify.add_watch(dir_path, self._mask)
+            except OSError:
+                continue
+            self._dirs[wd] = dir_path
+            found.extend(
+                os.path.join(dir_path, n) for n in file_names if is_raw_file(n)
+            )
+        return found
+
+    def changes(self, timeout):
+        """
+        Waits for changes, or for the timeout, whichever comes first.
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            list[str]: Paths of raw files changed since the last call
+
+        """
+        flags = inotify_simple.flags
+        events = self._inotify.read(
+            timeout=int(timeout * 1000), read_delay=self.READ_DELAY
+        )
+        changed = set()
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                return sorted(walk_raw_files(self._root))
+            if event.mask & flags.IGNORED:
+                self._dirs.pop(event.wd, None)
+                continue
+            dir_path = self._dirs.get(event.wd)
+            if dir_path is None:
+                continue
+            path = os.path.join(dir_path, event.name)
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    changed.update(self._add_watches(path))
+                continue
+            if is_raw_file(path):
+                changed.add(path)
+        return sorted(changed)
+
+    def close(self):
+        self._inotify.close()
+
+
+def make_watcher(root, interval=5.0, polling=False):
+    """
+    Creates an inotify watcher for the raw data tree, or a polling watcher if
+    polling is requested or inotify is unavailable.
+
+    Args:
+        root (str): Raw data directory
+        interval (float): Seconds between scans when polling
+        polling (bool): Poll even if inotify is available
+
+    Returns:
+        InotifyWatcher|PollingWatcher: Watcher
+
+    """
+    if not polling and inotify_simple is not None:
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            # No inotify support, e.g. on network file systems or outside
+            # Linux, or out of watches.
+            pass
+    return PollingWatcher(root, interval)
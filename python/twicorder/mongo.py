@@ -104,7 +104,7 @@ def backfill(path=None, db_name='slpng_giants', collection_name='tweets'):
         if os.path.basename(os.path.dirname(path)) != 'stream':
             continue
         try:
-            for lidx, line in enumerate(utils.readlines(path)):
+            for lidx, line in enumerate(utils.iterlines(path)):
                 try:
                     data = json.loads(line)
                 except Exception:
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import time
+
+import click
+
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from typing import Optional
+
+from twicorder.config import Config
+from twicorder.constants import ARCHIVE_TIME_FORMAT
+from twicorder.search.queries.request_queries import (
+    FullArchiveCountsQuery,
+    FullArchiveGetQuery,
+    FullArchivePostQuery,
+)
+from twicorder.search.retry import (
+    CircuitBreakerCentral,
+    RequestFailed,
+    RetryPolicy,
+)
+from twicorder.utils import AppData, TwiLogger
+
+
+def str_to_archive_date(text):
+    return datetime.strptime(text, ARCHIVE_TIME_FORMAT)
+
+
+def archive_date_to_str(date):
+    return date.strftime(ARCHIVE_TIME_FORMAT)
+
+
+class ArchiveSlice(object):
+    """
+    Time slice of a full-archive search, covering tweets from its from date up
+    to, but not including, its to date.
+    """
+
+    def __init__(self, from_date, to_date, tweet_count=0, done=False):
+        self._from_date = from_date
+        self._to_date = to_date
+        self.tweet_count = tweet_count
+        self.done = done
+
+    def __repr__(self):
+        representation = (
+            f'ArchiveSlice(from_date={self.from_str!r}, '
+            f'to_date={self.to_str!r}, tweet_count={self.tweet_count}, '
+            f'done={self.done})'
+        )
+        return representation
+
+    @property
+    def from_date(self):
+        return self._from_date
+
+    @property
+    def to_date(self):
+        return self._to_date
+
+    @property
+    def from_str(self):
+        return archive_date_to_str(self._from_date)
+
+    @property
+    def to_str(self):
+        return archive_date_to_str(self._to_date)
+
+    @property
+    def hours(self):
+        return (self._to_date - self._from_date).total_seconds() / 3600
+
+
+class ArchivePlanner(object):
+    """
+    Splits a full-archive search between two dates into time slices that can
+    be searched concurrently.
+
+    Slices are sized to hold roughly the given number of tweets. Sizes are
+    taken from day by day estimates from the counts endpoint if available.
+    Otherwise the tweet density observed in already searched slices is used,
+    starting out with evenly sized slices. Slices are planned from the newest
+    to the oldest and their progress is stored in AppData, so an interrupted
+    search can be resumed.
+    """
+
+    def __init__(self, query_type, output, from_date, to_date,
+                 slice_tweets=5000, initial_slices=8, **kwargs):
+        self._query_type = query_type
+        self._output = output
+        self._from_date = str_to_archive_date(from_date)
+        self._to_date = str_to_archive_date(to_date)
+        self._slice_tweets = slice_tweets
+        self._initial_slices = initial_slices
+        self._kwargs = kwargs
+        self._pending = deque()
+        self._completed = []
+        self._frontier = self._to_date
+        self._lock = Lock()
+
+    @property
+    def query_type(self):
+        return self._query_type
+
+    @property
+    def output(self):
+        return self._output
+
+    @property
+    def kwargs(self):
+        return self._kwargs
+
+    @property
+    def plan_hash(self):
+        """
+        Identifier for the plan, derived from query type, arguments and date
+        range.
+
+        Returns:
+            str: Plan hash
+
+        """
+        hash_str = json.dumps(
+            [
+                self.query_type.__name__,
+                self.kwargs,
+                archive_date_to_str(self._from_date),
+                archive_date_to_str(self._to_date),
+            ],
+            sort_keys=True
+        )
+        return hashlib.blake2s(hash_str.encode()).hexdigest()
+
+    @property
+    def completed(self):
+        return list(self._completed)
+
+    def load(self):
+        """
+        Restores slices stored by an earlier run of the plan.
+
+        Returns:
+            bool: True if any slices were found
+
+        """
+        stored = AppData().get_archive_slices(self.plan_hash)
+        for from_str, to_str, tweet_count, done in stored:
+            archive_slice = ArchiveSlice(
+                from_date=str_to_archive_date(from_str),
+                to_date=str_to_archive_date(to_str),
+                tweet_count=tweet_count,
+                done=done
+            )
+            if done:
+                self._completed.append(archive_slice)
+            else:
+                self._pending.append(archive_slice)
+            self._frontier = min(self._frontier, archive_slice.from_date)
+        return bool(stored)
+
+    def estimate(self):
+        """
+        Plans all slices up front from the counts endpoint's day by day
+        estimates.
+        """
+        query = FullArchiveCountsQuery(
+            None,
+            query=self.kwargs['query'],
+            fromDate=archive_date_to_str(self._from_date),
+            toDate=archive_date_to_str(self._to_date),
+            bucket='day'
+        )
+        buckets = []
+        while not query.done:
+            try:
+                results = query.run()
+            except RequestFailed as error:
+                results = None
+                TwiLogger.warning(f'Request failed: {error}')
+            TwiLogger.info(query.fetch_log())
+            if results is None:
+                TwiLogger.warning('Unable to estimate tweet counts.')
+                return
+            buckets += results
+        buckets = [
+            (str_to_archive_date(b['timePeriod']), b['count']) for b in buckets
+        ]
+        buckets.sort(reverse=True)
+        to_date = self._to_date
+        tweet_count = 0
+        for bucket_start, count in buckets:
+            tweet_count += count
+            if tweet_count >= self._slice_tweets:
+                from_date = max(bucket_start, self._from_date)
+                self.add(ArchiveSlice(from_date, to_date))
+                to_date = from_date
+                tweet_count = 0
+        if to_date > self._from_date:
+            self.add(ArchiveSlice(self._from_date, to_date))
+        self._frontier = self._from_date
+
+    def add(self, archive_slice):
+        self._pending.append(archive_slice)
+        self.record(archive_slice)
+
+    def density(self):
+        """
+        Tweet density observed in completed slices.
+
+        Returns:
+            float: Tweets per hour, None if nothing has been observed
+
+        """
+        hours = sum(s.hours for s in self._completed)
+        if not hours:
+            return
+        return sum(s.tweet_count for s in self._completed) / hours
+
+    def next_slice(self):
+        """
+        Hands out the next slice to search, planning a new slice from the
+        observed tweet density if none are pending.
+
+        Returns:
+            ArchiveSlice: Slice, None once the whole range has been planned
+
+        """
+        with self._lock:
+            if self._pending:
+                return self._pending.popleft()
+            if self._frontier <= self._from_date:
+                return
+            remaining = self._frontier - self._from_date
+            density = self.density()
+            if density is None:
+                duration = (self._to_date - self._from_date) / (
+                    self._initial_slices
+                )
+            elif not density:
+                duration = remaining
+            else:
+                duration = timedelta(hours=self._slice_tweets / density)
+            duration = min(max(duration, timedelta(hours=1)), remaining)
+            archive_slice = ArchiveSlice(
+                self._frontier - duration, self._frontier
+            )
+            self._frontier = archive_slice.from_date
+            self.record(archive_slice)
+            return archive_slice
+
+    def record(self, archive_slice):
+        """
+        Stores the progress of a slice.
+
+        Args:
+            archive_slice (ArchiveSlice): Slice
+
+        """
+        AppData().set_archive_slice(
+            plan_hash=self.plan_hash,
+            from_date=archive_slice.from_str,
+            to_date=archive_slice.to_str,
+            tweet_count=archive_slice.tweet_count,
+            done=archive_slice.done
+        )
+
+    def complete(self, archive_slice):
+        with self._lock:
+            if archive_slice.done:
+                self._completed.append(archive_slice)
+            self.record(archive_slice)
+
+
+class ArchiveSliceWorker(Thread):
+    """
+    Thread searching slices handed out by the archive search until none are
+    left or the request budget is spent.
+    """
+
+    def setup(self, archive_search):
+        self._archive_search = archive_search
+
+    def run(self):
+        while True:
+            archive_slice = self._archive_search.planner.next_slice()
+            if archive_slice is None:
+                break
+            if not self._archive_search.run_slice(archive_slice):
+                break
+
+
+class ArchiveSearch(object):
+    """
+    Concurrent, time sliced full-archive search. Each slice is searched by its
+    own query, checkpointing its pagination after every page. Pages are saved
+    to files named by their newest tweet, so the combined output of all slices
+    sorts chronologically.
+    """
+
+    def __init__(self, planner, concurrency=4, max_requests=None):
+        self._planner = planner
+        self._concurrency = concurrency
+        self._max_requests = max_requests
+        self._requests = 0
+        self._lock = Lock()
+
+    @property
+    def planner(self):
+        return self._planner
+
+    @property
+    def requests(self):
+        return self._requests
+
+    def reserve_request(self):
+        """
+        Reserves a request from the request budget.
+
+        Returns:
+            bool: False if the budget is spent
+
+        """
+        with self._lock:
+            if self._max_requests and self._requests >= self._max_requests:
+                return False
+            self._requests += 1
+            return True
+
+    def release_request(self):
+        """
+        Returns a reserved request to the request budget, when no page was
+        fetched with it.
+        """
+        with self._lock:
+            self._requests -= 1
+
+    def run_slice(self, archive_slice):
+        """
+        Searches a slice to the end, resuming from its checkpoint if it was
+        interrupted earlier. Only requests returning a page, or failing in a
+        way retrying won't fix, count against the request budget. A slice
+        whose requests keep failing is given up, and left unfinished.
+
+        Args:
+            archive_slice (ArchiveSlice): Slice
+
+        Returns:
+            bool: False if the slice could not be finished, as the request
+                budget ran out, a request failed in a way that retrying won't
+                fix, or requests kept failing
+
+        """
+        planner = self.planner
+        query = planner.query_type(
+            planner.output,
+            fromDate=archive_slice.from_str,
+            toDate=archive_slice.to_str,
+            **planner.kwargs
+        )
+        cursor = AppData().get_query_checkpoint(query.uid)
+        if cursor:
+            query.restore(cursor)
+        breaker = CircuitBreakerCentral().get(query.endpoint)
+        policy = RetryPolicy.from_config()
+        failures = 0
+        while not query.done:
+            if query.out_of_time:
+                TwiLogger.warning(f'Time budget spent for {archive_slice}.')
+                break
+            if not self.reserve_request():
+                TwiLogger.warning('Request budget spent.')
+                break
+            if breaker.cooldown:
+                time.sleep(breaker.cooldown)
+            try:
+                results = query.run()
+            except RequestFailed as error:
+                TwiLogger.info(query.fetch_log())
+                TwiLogger.warning(
+                    f'Stopping search of {archive_slice}. Request failed: '
+                    f'{error}'
+                )
+                break
+            TwiLogger.info(query.fetch_log())
+            if results is None:
+                # Retries are spent, or another worker holds the trial
+                # request of a half-open breaker. Back off before trying
+                # again.
+                self.release_request()
+                failures += 1
+                if failures >= policy.max_attempts:
+                    TwiLogger.warning(
+                        f'Giving up on {archive_slice} after {failures} '
+                        f'failed runs.'
+                    )
+                    break
+                time.sleep(policy.delay(failures))
+                continue
+            failures = 0
+            archive_slice.tweet_count += len(results)
+        archive_slice.done = query.done
+        planner.complete(archive_slice)
+        TwiLogger.info(f'Searched {archive_slice}')
+        return archive_slice.done
+
+    def run(self, estimate=True):
+        """
+        Plans the search and runs it with concurrent slice workers.
+
+        Args:
+            estimate (bool): Size slices from the counts endpoint's estimates
+                when starting a new plan
+
+        """
+        t0 = time.time()
+        if not self.planner.load() and estimate:
+            self.planner.estimate()
+        workers = []
+        for idx in range(self._concurrency):
+            worker = ArchiveSliceWorker(name=f'archive-{idx}')
+            worker.setup(self)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        tweet_count = sum(s.tweet_count for s in self.planner.completed)
+        TwiLogger.info(
+            f'Full-archive search: {len(self.planner.completed)} slices, '
+            f'{tweet_count} tweets, {self.requests} requests in '
+            f'{timedelta(seconds=int(time.time() - t0))}.'
+        )
+
+
+@click.command()
+@click.option(
+    '--project-dir',
+    required=True,
+    help='Project files directory'
+)
+@click.option(
+    '--config-dir',
+    required=False,
+    help='Config file dir override. Defaults to project dir.'
+)
+@click.option('--query', required=True, help='Full-archive search query')
+@click.option('--from-date', required=True, help='Start date, YYYYMMDDHHmm')
+@click.option('--to-date', required=True, help='End date, YYYYMMDDHHmm')
+@click.option('--output', required=True, help='Output dir for tweets')
+@click.option(
+    '--max-results',
+    default=100,
+    show_default=True,
+    help='Tweets per request'
+)
+@click.option(
+    '--post',
+    is_flag=True,
+    default=False,
+    help='Use the POST endpoint with bearer token authentication'
+)
+@click.option(
+    '--concurrency',
+    default=4,
+    show_default=True,
+    help='Number of slices searched concurrently'
+)
+@click.option(
+    '--slice-tweets',
+    default=5000,
+    show_default=True,
+    help='Approximate number of tweets per slice'
+)
+@click.option(
+    '--max-requests',
+    default=0,
+    show_default=True,
+    help='Max number of search requests, 0 for no limit'
+)
+@click.option(
+    '--estimate/--no-estimate',
+    default=True,
+    show_default=True,
+    help='Size slices from counts endpoint estimates'
+)
+def main(project_dir: str, config_dir: Optional[str], query: str,
+         from_date: str, to_date: str, output: str, max_results: int,
+         post: bool, concurrency: int, slice_tweets: int, max_requests: int,
+         estimate: bool):
+    """
+    Time sliced, concurrent full-archive search.
+    """
+    Config.setup(project_dir=project_dir, config_dir=config_dir)
+    query_type = FullArchivePostQuery if post else FullArchiveGetQuery
+    planner = ArchivePlanner(
+        query_type=query_type,
+        output=output,
+        from_date=from_date,
+        to_date=to_date,
+        slice_tweets=slice_tweets,
+        initial_slices=concurrency * 2,
+        query=query,
+        maxResults=max_results
+    )
+    archive_search = ArchiveSearch(
+        planner=planner,
+        concurrency=concurrency,
+        max_requests=max_requests or None
+    )
+    archive_search.run(estimate=estimate)
+
+
+if __name__ == '__main__':
+    main(auto_envvar_prefix='TC_ARCHIVE')
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import click
+
+from datetime import timedelta
+from typing import Optional
+
+from twicorder.auth import Credential, CredentialPool
+from twicorder.config import Config
+from twicorder.search.exchange import QueryExchange
+from twicorder.search.mockapi import MockApi, MockApiServer
+from twicorder.search.queries import RequestQuery
+from twicorder.search.queries.request_queries import (
+    StandardSearchQuery,
+    TimelineQuery,
+)
+from twicorder.utils import TwiLogger
+
+
+class SearchBenchmark(object):
+    """
+    Load tests the search subsystem against a mock API server. Search and
+    timeline queries are dispatched through the query exchange in rounds, the
+    way the scheduler would, until the benchmark duration has passed.
+    """
+
+    def __init__(self, api, credentials=2, search_terms=20, timelines=10):
+        self._api = api
+        self._server = MockApiServer(api)
+        self._credentials = credentials
+        self._search_terms = search_terms
+        self._timelines = timelines
+        self._new_tweets = 0
+        self._rounds = 0
+
+    def setup(self):
+        """
+        Starts the mock API server, points queries at it and adds a synthetic
+        credential per requested credential to the pool.
+        """
+        self._server.start()
+        RequestQuery.override_base_url(self._server.base_url)
+        for idx in range(self._credentials):
+            CredentialPool().add(
+                Credential(
+                    consumer_key=f'benchmark-consumer-{idx}',
+                    consumer_secret='benchmark',
+                    access_token=f'benchmark-token-{idx}',
+                    access_secret='benchmark'
+                )
+            )
+
+    def make_queries(self):
+        queries = []
+        for idx in range(self._search_terms):
+            term = f'#benchmark{idx}'
+            queries.append(
+                StandardSearchQuery(f'benchmark/search/{idx}', q=term)
+            )
+        for idx in range(self._timelines):
+            screen_name = f'benchmark_user_{idx}'
+            queries.append(
+                TimelineQuery(
+                    f'benchmark/timeline/{idx}', screen_name=screen_name
+                )
+            )
+        return queries
+
+    def run_round(self):
+        """
+        Dispatches every query once and waits for them all to finish.
+        """
+        query_exchange = QueryExchange()
+        queries = self.make_queries()
+        try:
+            for query in queries:
+                query_exchange.add(query)
+        finally:
+            query_exchange.wait()
+        self._new_tweets += sum(q.new_count for q in queries)
+        self._rounds += 1
+
+    def run(self, duration):
+        """
+        Runs rounds of queries for the given duration.
+
+        Args:
+            duration (float): Benchmark duration in seconds
+
+        Returns:
+            str: Report
+
+        """
+        self.setup()
+        t0 = time.time()
+        try:
+            while time.time() - t0 < duration:
+                self.run_round()
+        finally:
+            RequestQuery.override_base_url(None)
+            self._server.shutdown()
+            self._server.server_close()
+        return self.report(time.time() - t0)
+
+    def report(self, elapsed):
+        stats = self._api.stats
+        requests = sum(v for k, v in stats.items() if isinstance(k, int))
+        errors = sum(
+            v for k, v in stats.items() if isinstance(k, int) and k >= 500
+        )
+        lines = [
+            f'Duration:       {timedelta(seconds=int(elapsed))}',
+            f'Rounds:         {self._rounds}',
+            f'Requests:       {requests} ({requests / elapsed:.2f} req/s)',
+            f'Successful:     {stats.get(200, 0)}',
+            f'Rate limited:   {stats.get(429, 0)}',
+            f'Server errors:  {errors}',
+            f'Tweets served:  {stats.get("tweets", 0)} '
+            f'({stats.get("tweets", 0) / elapsed:.1f} tweets/s)',
+            f'New tweets:     {self._new_tweets} '
+            f'({self._new_tweets / elapsed:.1f} tweets/s)',
+        ]
+        return '\n'.join(lines)
+
+
+@click.command()
+@click.option(
+    '--project-dir',
+    required=True,
+    help='Project files directory, for app data and output of the benchmark'
+)
+@click.option(
+    '--config-dir',
+    required=False,
+    help='Config file dir override. Defaults to project dir.'
+)
+@click.option(
+    '--duration',
+    default=60.,
+    show_default=True,
+    help='Benchmark duration in seconds'
+)
+@click.option(
+    '--credentials',
+    default=2,
+    show_default=True,
+    help='Number of synthetic credentials'
+)
+@click.option(
+    '--search-terms',
+    default=20,
+    show_default=True,
+    help='Number of search queries per round'
+)
+@click.option(
+    '--timelines',
+    default=10,
+    show_default=True,
+    help='Number of timeline queries per round'
+)
+@click.option(
+    '--rate',
+    default=1.,
+    show_default=True,
+    help='Tweets per second arriving for each search term and timeline'
+)
+@click.option(
+    '--backlog',
+    default=600.,
+    show_default=True,
+    help='Seconds of tweets available when the benchmark starts'
+)
+@click.option(
+    '--window',
+    default=60.,
+    show_default=True,
+    help='Length of rate limit windows in seconds'
+)
+@click.option(
+    '--latency',
+    default=0.05,
+    show_default=True,
+    help='Mean response latency in seconds'
+)
+@click.option(
+    '--jitter',
+    default=0.02,
+    show_default=True,
+    help='Standard deviation of response latency in seconds'
+)
+@click.option(
+    '--error-rate',
+    default=0.,
+    show_default=True,
+    help='Fraction of requests failing with a 5xx error'
+)
+@click.option(
+    '--throttle-rate',
+    default=0.,
+    show_default=True,
+    help='Fraction of requests failing with a 429, regardless of limits'
+)
+def main(project_dir: str, config_dir: Optional[str], duration: float,
+         credentials: int, search_terms: int, timelines: int, rate: float,
+         backlog: float, window: float, latency: float, jitter: float,
+         error_rate: float, throttle_rate: float):
+    """
+    Search subsystem benchmark against a mock API server.
+    """
+    Config.setup(project_dir=project_dir, config_dir=config_dir)
+    api = MockApi(
+        rate=rate,
+        backlog=backlog,
+        window=window,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate
+    )
+    benchmark = SearchBenchmark(
+        api=api,
+        credentials=credentials,
+        search_terms=search_terms,
+        timelines=timelines
+    )
+    report = benchmark.run(duration)
+    TwiLogger.info(f'Benchmark results:\n{report}')
+
+
+if __name__ == '__main__':
+    main(auto_envvar_prefix='TC_BENCHMARK')
@@ -0,0 +1,823 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import os
+import socket
+import sqlite3
+import time
+import traceback
+
+from threading import Lock, Thread
+
+from twicorder.auth import CredentialPool
+from twicorder.config import Config
+from twicorder.search.exchange import RateLimitCentral
+from twicorder.search.queries.request_queries import CoalescedSearchQuery
+from twicorder.search.retry import RequestFailed
+from twicorder.utils import TwiLogger
+
+
+class WorkQueue(object):
+    """
+    Shared queue of search queries, kept in an SQLite database that all
+    workers can reach, such as on a shared volume.
+
+    Queries are leased by one worker at a time. A lease lasts for the lease
+    time and is renewed by the worker's heartbeat, so the queries of a worker
+    that dies become available to other workers once its leases expire.
+    Queries are keyed by their hash, so a query can't be queued twice, and the
+    pagination cursor of a leased query is stored after each page, so another
+    worker can resume it where it was left off.
+
+    Writes take the database lock up front (BEGIN IMMEDIATE), so leasing is
+    atomic across processes. This relies on working file locks, which some
+    network file systems don't provide.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+        self._make_tables()
+
+    def __del__(self):
+        self._conn.close()
+
+    def _make_tables(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS work_queue (
+                query_hash TEXT PRIMARY KEY,
+                query_name TEXT NOT NULL,
+                output TEXT,
+                kwargs TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                task_hash TEXT,
+                cursor TEXT,
+                queued_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE INDEX IF NOT EXISTS work_queue_endpoint
+            ON work_queue (endpoint, queued_at)
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS task_runs (
+                task_hash TEXT PRIMARY KEY,
+                last_run REAL NOT NULL
+            )
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS watermarks (
+                query_hash TEXT PRIMARY KEY,
+                tweet_id INTEGER NOT NULL
+            )
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                credential TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                worker_id TEXT NOT NULL,
+                cap INTEGER NOT NULL,
+                remaining INTEGER NOT NULL,
+                reset REAL NOT NULL,
+                PRIMARY KEY (credential, endpoint)
+            )
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat REAL NOT NULL
+            )
+            '''
+        )
+
+    def transaction(self):
+        """
+        Starts a write transaction, taking the database lock immediately.
+
+        Returns:
+            sqlite3.Cursor: Cursor
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        return cursor
+
+    def enqueue(self, query_hash, query_name, output, kwargs, endpoint,
+                task_hash=None):
+        """
+        Adds a query to the queue, unless it is already queued or leased.
+
+        Args:
+            query_hash (str): Query UID
+            query_name (str): Query name, used to look up the query type
+            output (str): Query output directory
+            kwargs (dict): Keyword arguments the query was created with
+            endpoint (str): API endpoint of the query
+            task_hash (str): Hash of the task the query was cast from
+
+        Returns:
+            bool: True if the query was added
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO work_queue (
+                query_hash, query_name, output, kwargs, endpoint, task_hash,
+                queued_at
+            ) VALUES (
+                ?, ?, ?, ?, ?, ?, ?
+            )
+            ''',
+            (
+                query_hash,
+                query_name,
+                output,
+                json.dumps(kwargs),
+                endpoint,
+                task_hash,
+                time.time()
+            )
+        )
+        return cursor.rowcount == 1
+
+    def lease(self, worker_id, endpoints, lease_time):
+        """
+        Leases the longest queued query for one of the given endpoints that
+        isn't leased by another worker.
+
+        Args:
+            worker_id (str): Worker taking the lease
+            endpoints (list[str]): Endpoints the worker can serve
+            lease_time (float): Seconds until the lease expires
+
+        Returns:
+            tuple: Query hash, query name, output, kwargs, task hash and
+                cursor, None if no query is available
+
+        """
+        if not endpoints:
+            return
+        now = time.time()
+        placeholders = ', '.join('?' * len(endpoints))
+        cursor = self.transaction()
+        try:
+            cursor.execute(
+                f'''
+                SELECT
+                    query_hash, query_name, output, kwargs, task_hash, cursor
+                FROM
+                    work_queue
+                WHERE
+                    endpoint IN ({placeholders})
+                    AND (lease_owner IS NULL OR lease_expires < ?)
+                ORDER BY
+                    queued_at
+                LIMIT 1
+                ''',
+                (*endpoints, now)
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute(
+                    '''
+                    UPDATE
+                        work_queue
+                    SET
+                        lease_owner=?,
+                        lease_expires=?,
+                        attempts=attempts + 1
+                    WHERE
+                        query_hash=?
+                    ''',
+                    (worker_id, now + lease_time, row[0])
+                )
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        if not row:
+            return
+        query_hash, query_name, output, kwargs, task_hash, query_cursor = row
+        return (
+            query_hash,
+            query_name,
+            output,
+            json.loads(kwargs),
+            task_hash,
+            json.loads(query_cursor) if query_cursor else None
+        )
+
+    def heartbeat(self, worker_id, lease_time):
+        """
+        Renews all leases held by the given worker, and records that the
+        worker is alive.
+
+        Args:
+            worker_id (str): Worker
+            lease_time (float): Seconds until the leases expire
+
+        Returns:
+            int: Number of leases renewed
+
+        """
+        now = time.time()
+        cursor = self.transaction()
+        cursor.execute(
+            '''
+            UPDATE
+                work_queue
+            SET
+                lease_expires=?
+            WHERE
+                lease_owner=? AND lease_expires >= ?
+            ''',
+            (now + lease_time, worker_id, now)
+        )
+        renewed = cursor.rowcount
+        cursor.execute(
+            'INSERT OR REPLACE INTO workers VALUES (?, ?)', (worker_id, now)
+        )
+        cursor.execute('COMMIT')
+        return renewed
+
+    def update_cursor(self, worker_id, query_hash, query_cursor):
+        """
+        Stores the pagination cursor of a leased query.
+
+        Args:
+            worker_id (str): Worker holding the lease
+            query_hash (str): Query UID
+            query_cursor (dict): Pagination state
+
+        Returns:
+            bool: False if the worker no longer holds the lease
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE
+                work_queue
+            SET
+                cursor=?
+            WHERE
+                query_hash=? AND lease_owner=? AND lease_expires >= ?
+            ''',
+            (json.dumps(query_cursor), query_hash, worker_id, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, worker_id, query_hash):
+        """
+        Removes a completed query from the queue.
+
+        Args:
+            worker_id (str): Worker holding the lease
+            query_hash (str): Query UID
+
+        Returns:
+            bool: False if the worker no longer held the lease
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute(
+            'DELETE FROM work_queue WHERE query_hash=? AND lease_owner=?',
+            (query_hash, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, worker_id, query_hash):
+        """
+        Gives up the lease of a query, leaving it for another worker.
+
+        Args:
+            worker_id (str): Worker holding the lease
+            query_hash (str): Query UID
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE
+                work_queue
+            SET
+                lease_owner=NULL,
+                lease_expires=NULL
+            WHERE
+                query_hash=? AND lease_owner=?
+            ''',
+            (query_hash, worker_id)
+        )
+
+    def claim_task_runs(self, task_intervals, slack=60.):
+        """
+        Claims the right to run tasks that are due, so a task scheduled by
+        several schedulers is only run once per interval.
+
+        Args:
+            task_intervals (dict): Seconds between runs, by task hash
+            slack (float): Seconds a run may be claimed early, to allow for
+                schedulers ticking at different times
+
+        Returns:
+            list[str]: Hashes of claimed tasks
+
+        """
+        now = time.time()
+        claimed = []
+        cursor = self.transaction()
+        try:
+            for task_hash, interval in task_intervals.items():
+                cursor.execute(
+                    'INSERT OR IGNORE INTO task_runs VALUES (?, ?)',
+                    (task_hash, now)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(task_hash)
+                    continue
+                cursor.execute(
+                    '''
+                    UPDATE
+                        task_runs
+                    SET
+                        last_run=?
+                    WHERE
+                        task_hash=? AND last_run <= ?
+                    ''',
+                    (now, task_hash, now - interval + slack)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(task_hash)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        return claimed
+
+    def set_watermark(self, query_hash, tweet_id):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            INSERT INTO watermarks VALUES (?, ?)
+            ON CONFLICT (query_hash) DO UPDATE SET
+                tweet_id=MAX(tweet_id, excluded.tweet_id)
+            ''',
+            (query_hash, int(tweet_id))
+        )
+
+    def get_watermark(self, query_hash):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            'SELECT tweet_id FROM watermarks WHERE query_hash=?',
+            (query_hash,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def report_rate_limits(self, worker_id, limits):
+        """
+        Stores the rate limit state of a worker's credentials.
+
+        Args:
+            worker_id (str): Worker
+            limits (list[tuple]): Credential, endpoint, cap, remaining and
+                reset time
+
+        """
+        cursor = self.transaction()
+        cursor.executemany(
+            'INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?, ?)',
+            [(c, e, worker_id, *state) for c, e, *state in limits]
+        )
+        cursor.execute('COMMIT')
+
+    def get_rate_limits(self):
+        """
+        Reads the rate limit state reported by all workers.
+
+        Returns:
+            list[tuple]: Credential, endpoint, worker, cap, remaining and reset
+                time
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute('SELECT * FROM rate_limits ORDER BY endpoint')
+        return cursor.fetchall()
+
+    def stats(self):
+        """
+        Counts queued and leased queries per endpoint.
+
+        Returns:
+            dict: Queued and leased query counts by endpoint
+
+        """
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                endpoint,
+                SUM(lease_owner IS NULL OR lease_expires < ?),
+                SUM(lease_owner IS NOT NULL AND lease_expires >= ?)
+            FROM
+                work_queue
+            GROUP BY
+                endpoint
+            ''',
+            (time.time(), time.time())
+        )
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def describe_query(query):
+    """
+    Describes a query in a form that can be queued and used to recreate it.
+
+    Args:
+        query (RequestQuery): Query
+
+    Returns:
+        tuple: Query name, output and keyword arguments
+
+    """
+    if isinstance(query, CoalescedSearchQuery):
+        members = [
+            [q.name, q.output, q._orig_kwargs, q.task.uid if q.task else None]
+            for q in query.queries
+        ]
+        return query.name, None, {'queries': members}
+    return query.name, query.output, query._orig_kwargs
+
+
+def apply_watermark(query, tweet_id):
+    """
+    Makes a query stop at a tweet found by an earlier run elsewhere, if that
+    tweet is newer than the query's own watermark.
+
+    Args:
+        query (RequestQuery): Query
+        tweet_id (int): Tweet ID
+
+    """
+    if not tweet_id or (query.watermark and query.watermark >= tweet_id):
+        return
+    kwargs = copy.deepcopy(query.kwargs)
+    if query.last_return_token:
+        kwargs[query.last_return_token] = str(tweet_id)
+    query.restore({'watermark': int(tweet_id), 'kwargs': kwargs})
+
+
+class Coordinator(object):
+    """
+    Spreads search queries over workers in several processes, on one or more
+    machines, through a shared work queue. It stands in for the query exchange
+    of the scheduler: due tasks are claimed through the queue, so each is run
+    once per interval however many schedulers are running, and queries are
+    queued rather than run locally. Lease workers in every process then lease
+    queries for the endpoints their credentials have budget for, running each
+    on exactly one worker at a time.
+    """
+
+    def __init__(self, query_types):
+        settings = self.settings()
+        self._query_types = query_types
+        self._path = settings.get('path') or os.path.join(
+            Config.get()['appdata_dir'], 'coordination.sql'
+        )
+        self._worker_id = settings.get('worker_id') or (
+            f'{socket.gethostname()}-{os.getpid()}'
+        )
+        self._lease_time = settings.get('lease_time') or 300
+        self._worker_count = (
+            settings.get('workers') or len(CredentialPool().get()) or 1
+        )
+        self._tasks = {}
+        self._workers = []
+        self._heartbeat = None
+        self._running = False
+        self._lock = Lock()
+
+    @staticmethod
+    def settings():
+        return Config.get().get('coordination') or {}
+
+    @classmethod
+    def enabled(cls):
+        """
+        Whether distributed search is switched on in the config file.
+
+        Returns:
+            bool: True if enabled
+
+        """
+        return bool(cls.settings().get('enabled'))
+
+    @property
+    def worker_id(self):
+        return self._worker_id
+
+    @property
+    def lease_time(self):
+        return self._lease_time
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def query_types(self):
+        return self._query_types
+
+    def queue(self):
+        """
+        Connection to the shared work queue. SQLite connections can't be
+        shared between threads, so each call opens its own.
+
+        Returns:
+            WorkQueue: Work queue
+
+        """
+        return WorkQueue(self._path)
+
+    def claim(self, tasks):
+        """
+        Claims due tasks through the shared queue, filtering out tasks already
+        run by another scheduler within their interval.
+
+        Args:
+            tasks (list[Task]): Locally due tasks
+
+        Returns:
+            list[Task]: Tasks to run
+
+        """
+        if not tasks:
+            return []
+        with self._lock:
+            for task in tasks:
+                self._tasks[task.uid] = task
+        intervals = {task.uid: task.frequency * 60 for task in tasks}
+        claimed = set(self.queue().claim_task_runs(intervals))
+        return [task for task in tasks if task.uid in claimed]
+
+    def add(self, query):
+        """
+        Queues a query in the shared work queue.
+
+        Args:
+            query (RequestQuery): Query
+
+        """
+        query_name, output, kwargs = describe_query(query)
+        task_hash = query.task.uid if query.task else None
+        added = self.queue().enqueue(
+            query_hash=query.uid,
+            query_name=query_name,
+            output=output,
+            kwargs=kwargs,
+            endpoint=query.endpoint,
+            task_hash=task_hash
+        )
+        if added:
+            TwiLogger.info(query)
+        else:
+            TwiLogger.info(f'Query with ID {query.uid} is already queued.')
+
+    def build(self, query_name, output, kwargs, task_hash=None):
+        """
+        Recreates a queued query, stopping at the newest tweet any worker has
+        found for it.
+
+        Args:
+            query_name (str): Query name
+            output (str): Query output directory
+            kwargs (dict): Keyword arguments the query was created with
+            task_hash (str): Hash of the task the query was cast from
+
+        Returns:
+            RequestQuery: Query, None if the query type is unknown
+
+        """
+        if query_name == CoalescedSearchQuery._name:
+            queries = [
+                self.build(*member) for member in kwargs['queries']
+            ]
+            if None in queries:
+                return
+            return CoalescedSearchQuery(queries)
+        query_type = self.query_types.get(query_name)
+        if not query_type:
+            return
+        query = query_type(output, **kwargs)
+        query.task = self._tasks.get(task_hash)
+        apply_watermark(query, self.queue().get_watermark(query.uid))
+        return query
+
+    def endpoints(self):
+        """
+        Endpoints that the local credentials have rate limit budget for.
+
+        Returns:
+            list[str]: Endpoints
+
+        """
+        endpoints = set()
+        for query_type in self.query_types.values():
+            credentials = CredentialPool().get(query_type._token_auth)
+            for credential in credentials:
+                limit = RateLimitCentral().get(
+                    query_type._endpoint, credential.uid
+                )
+                if not limit or limit.expired or limit.remaining > 0:
+                    endpoints.add(query_type._endpoint)
+                    break
+        return sorted(endpoints)
+
+    def report(self):
+        """
+        Renews this process's leases and shares the rate limit state of its
+        credentials with other workers.
+        """
+        queue = self.queue()
+        queue.heartbeat(self.worker_id, self.lease_time)
+        limits = [
+            (credential or '', endpoint, limit.cap, limit.remaining,
+             limit.reset)
+            for (credential, endpoint), limit in
+            RateLimitCentral().limits().items()
+        ]
+        if limits:
+            queue.report_rate_limits(self.worker_id, limits)
+
+    def start(self):
+        """
+        Starts the heartbeat and lease worker threads.
+        """
+        self._running = True
+        self._heartbeat = HeartbeatThread(name='coordination-heartbeat')
+        self._heartbeat.setup(self)
+        self._heartbeat.start()
+        for idx in range(self._worker_count):
+            worker = LeaseWorker(name=f'lease-worker-{idx}')
+            worker.setup(self)
+            worker.start()
+            self._workers.append(worker)
+        TwiLogger.info(
+            f'Coordinating through "{self._path}" as "{self.worker_id}" with '
+            f'{self._worker_count} lease workers.'
+        )
+
+    def restore(self, query_types):
+        """
+        Queries left by a previous session stay in the shared queue, and are
+        picked up again once their leases expire, so there is nothing to
+        restore.
+        """
+        return
+
+    def wait(self):
+        """
+        Stops leasing new queries and waits for running queries to finish.
+        """
+        self._running = False
+        for worker in self._workers:
+            worker.join()
+
+
+class HeartbeatThread(Thread):
+    """
+    Thread renewing the leases of a coordinator's workers, a few times per
+    lease time.
+    """
+
+    def setup(self, coordinator):
+        self._coordinator = coordinator
+        self.daemon = True
+
+    def run(self):
+        while True:
+            try:
+                self._coordinator.report()
+            except Exception:
+                TwiLogger.exception(traceback.format_exc())
+            time.sleep(self._coordinator.lease_time / 3)
+
+
+class LeaseWorker(Thread):
+    """
+    Thread leasing queries from the shared work queue and running them.
+    """
+
+    def setup(self, coordinator):
+        self._coordinator = coordinator
+
+    def run(self):
+        coordinator = self._coordinator
+        queue = coordinator.queue()
+        while coordinator.running:
+            try:
+                lease = queue.lease(
+                    coordinator.worker_id,
+                    coordinator.endpoints(),
+                    coordinator.lease_time
+                )
+            except sqlite3.Error:
+                TwiLogger.exception('Unable to lease query: ')
+                lease = None
+            if not lease:
+                time.sleep(5)
+                continue
+            query_hash, query_name, output, kwargs, task_hash, cursor = lease
+            query = coordinator.build(query_name, output, kwargs, task_hash)
+            if query is None:
+                TwiLogger.warning(f'Unknown query type "{query_name}".')
+                queue.complete(coordinator.worker_id, query_hash)
+                continue
+            if cursor:
+                query.restore(cursor)
+            self.run_query(queue, query_hash, query)
+
+    def run_query(self, queue, query_hash, query):
+        """
+        Runs a leased query page by page, storing its cursor after each page
+        so another worker can take over should this one die.
+
+        Args:
+            queue (WorkQueue): Work queue
+            query_hash (str): Query UID the query was queued with
+            query (RequestQuery): Query
+
+        """
+        worker_id = self._coordinator.worker_id
+        while not query.done:
+            if query.out_of_time:
+                TwiLogger.warning(
+                    f'Abandoning query with ID {query_hash}. Time budget '
+                    f'spent.'
+                )
+                queue.complete(worker_id, query_hash)
+                return
+            try:
+                query.run()
+            except RequestFailed as error:
+                TwiLogger.info(query.fetch_log())
+                TwiLogger.warning(
+                    f'Abandoning query with ID {query_hash}. Request failed: '
+                    f'{error}'
+                )
+                queue.complete(worker_id, query_hash)
+                return
+            except Exception:
+                TwiLogger.exception(traceback.format_exc())
+                queue.release(worker_id, query_hash)
+                return
+            TwiLogger.info(query.fetch_log())
+            if query.done:
+                break
+            if not queue.update_cursor(worker_id, query_hash, query.cursor):
+                TwiLogger.warning(
+                    f'Lost lease of query with ID {query_hash}. Stopping.'
+                )
+                return
+            time.sleep(.2)
+        for member in getattr(query, 'queries', [query]):
+            if member.last_id:
+                queue.set_watermark(member.uid, member.last_id)
+        if not queue.complete(worker_id, query_hash):
+            TwiLogger.warning(
+                f'Lease of query with ID {query_hash} expired before it '
+                f'completed.'
+            )
+
+
+if __name__ == '__main__':
+    import sys
+    Config.setup(*sys.argv[1:3])
+    settings = Coordinator.settings()
+    path = settings.get('path') or os.path.join(
+        Config.get()['appdata_dir'], 'coordination.sql'
+    )
+    work_queue = WorkQueue(path)
+    for endpoint, (queued, leased) in sorted(work_queue.stats().items()):
+        print(f'{endpoint:<40} queued: {queued:>6} leased: {leased:>6}')
+    for row in work_queue.get_rate_limits():
+        print(*row)
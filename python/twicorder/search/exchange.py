@@ -5,17 +5,29 @@ import time
 
 from datetime import datetime
 from queue import Queue
-from threading import Thread
+from threading import Lock, Thread
 
-from twicorder.utils import Singleton, TwiLogger
+from twicorder.auth import CredentialPool
+from twicorder.config import Config
+from twicorder.search import metrics
+from twicorder.search.retry import (
+    CircuitBreaker,
+    CircuitBreakerCentral,
+    RequestFailed,
+)
+from twicorder.utils import AppData, Singleton, TwiLogger
 
 
 class RateLimitCentral(object, metaclass=Singleton):
+    """
+    Keeps track of rate limits per credential and endpoint.
+    """
 
     def __init__(self):
         self._limits = {}
+        self._lock = Lock()
 
-    def update(self, endpoint, header):
+    def update(self, endpoint, header, credential=None):
         limit_keys = {
             'x-rate-limit-limit',
             'x-rate-limit-remaining',
@@ -23,29 +35,78 @@ class RateLimitCentral(object, metaclass=Singleton):
         }
         if not limit_keys.issubset(header.keys()):
             return
-        self._limits[endpoint] = RateLimit(header)
+        with self._lock:
+            limit = RateLimit(header)
+            self._limits[(credential, endpoint)] = limit
+        labels = {'endpoint': endpoint, 'credential': credential or ''}
+        metrics.RATE_LIMIT_REMAINING.set(limit.remaining, **labels)
+        metrics.RATE_LIMIT_CAP.set(limit.cap, **labels)
 
-    def get(self, endpoint):
-        return self._limits.get(endpoint)
+    def get(self, endpoint, credential=None):
+        return self._limits.get((credential, endpoint))
+
+    def limits(self):
+        """
+        Copies the known rate limits.
 
-    def get_cap(self, endpoint):
-        limit = self.get(endpoint)
+        Returns:
+            dict: Rate limits by credential and endpoint
+
+        """
+        with self._lock:
+            return dict(self._limits)
+
+    def get_cap(self, endpoint, credential=None):
+        limit = self.get(endpoint, credential)
         if not limit:
             return
         return limit.cap
 
-    def get_remaining(self, endpoint):
-        limit = self.get(endpoint)
+    def get_remaining(self, endpoint, credential=None):
+        limit = self.get(endpoint, credential)
         if not limit:
             return
         return limit.remaining
 
-    def get_reset(self, endpoint):
-        limit = self.get(endpoint)
+    def get_reset(self, endpoint, credential=None):
+        limit = self.get(endpoint, credential)
         if not limit:
             return
         return limit.reset
 
+    def select(self, endpoint, credentials):
+        """
+        Picks the credential with the most remaining budget for the given
+        endpoint and reserves one request from its budget. Credentials with no
+        known limits, or whose window has been reset, are considered to have a
+        full budget. If all credentials are exhausted, the one resetting first
+        is picked.
+
+        Args:
+            endpoint (str): API endpoint
+            credentials (list[Credential]): Credentials to pick from
+
+        Returns:
+            Credential: Selected credential
+
+        """
+        if not credentials:
+            raise ValueError(f'No credentials available for "{endpoint}".')
+        with self._lock:
+            def budget(credential):
+                limit = self.get(endpoint, credential.uid)
+                if not limit or limit.expired:
+                    return float('inf'), 0
+                return limit.remaining, -limit.reset
+            credential = max(credentials, key=budget)
+            limit = self.get(endpoint, credential.uid)
+            if limit and not limit.expired:
+                limit.consume()
+        metrics.CREDENTIAL_SELECTIONS.inc(
+            endpoint=endpoint, credential=credential.uid
+        )
+        return credential
+
 
 class RateLimit(object):
     """
@@ -53,7 +114,7 @@ class RateLimit(object):
     """
 
     def __init__(self, headers):
-        self._cap = headers.get('x-rate-limit-limit')
+        self._cap = int(headers.get('x-rate-limit-limit'))
         self._remaining = int(headers.get('x-rate-limit-remaining'))
         self._reset = float(headers.get('x-rate-limit-reset'))
 
@@ -98,6 +159,89 @@ class RateLimit(object):
         """
         return self._reset
 
+    @property
+    def expired(self):
+        """
+        Whether the 15 minute window these limits describe has passed.
+
+        Returns:
+            bool: True if the window has been reset
+
+        """
+        return time.time() > self._reset
+
+    def consume(self):
+        """
+        Reserves a query from the remaining budget until the next response
+        reports the actual limits.
+        """
+        self._remaining = max(self._remaining - 1, 0)
+
+
+class PagePersister(Thread):
+    """
+    Persister thread, used to save pages fetched by a QueryWorker while the
+    worker goes on to fetch the next page.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PagePersister, self).__init__(*args, **kwargs)
+        self.daemon = True
+        pages_in_flight = Config.get().get('pages_in_flight') or 2
+        self._pages = Queue(maxsize=pages_in_flight)
+
+    @property
+    def pages(self):
+        return self._pages
+
+    def put(self, query, page):
+        """
+        Queues a fetched page for saving. Blocks while the maximum number of
+        pages are already in flight.
+
+        Args:
+            query (RequestQuery): Query the page was fetched for
+            page (Page): Crawled tweets and the pagination state captured
+                when they were fetched
+
+        """
+        self.pages.put((query, page))
+
+    def join_pages(self):
+        """
+        Blocks until all queued pages have been saved.
+        """
+        self.pages.join()
+
+    def stop(self):
+        """
+        Stops the thread once all queued pages have been saved.
+        """
+        self.pages.put(None)
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        """
+        Fetches pages from the queue and saves them, until a None sentinel is
+        received.
+        """
+        while True:
+            page = self.pages.get()
+            if page is None:
+                self.pages.task_done()
+                break
+            query, page = page
+            try:
+                query.persist(
+                    page.results, final=page.final, cursor=page.cursor
+                )
+            except Exception:
+                import traceback
+                TwiLogger.exception(traceback.format_exc())
+            finally:
+                self.pages.task_done()
+
 
 class QueryWorker(Thread):
     """
@@ -107,6 +251,7 @@ class QueryWorker(Thread):
     def __init__(self, *args, **kwargs):
         super(QueryWorker, self).__init__(*args, **kwargs)
         self._query = None
+        self._persister = PagePersister(name=f'{self.name}-persister')
 
     def setup(self, queue):
         self._queue = queue
@@ -119,27 +264,130 @@ class QueryWorker(Thread):
     def query(self):
         return self._query
 
+    @property
+    def persister(self):
+        return self._persister
+
     def run(self):
         """
         Fetches query from queue and executes it.
         """
+        self.persister.start()
         while True:
             self._query = self.queue.get()
             if self.query is None:
                 TwiLogger.info(f'Terminating thread "{self.name}"')
+                self.persister.stop()
                 break
-            while not self.query.done:
-                try:
-                    self.query.run()
-                except Exception:
-                    import traceback
-                    TwiLogger.exception(traceback.format_exc())
-                    break
-                TwiLogger.info(self.query.fetch_log())
-                time.sleep(.2)
+            endpoint = self.query.endpoint
+            metrics.QUEUE_DEPTH.dec(endpoint=endpoint)
+            started = time.time()
+            if self.query.queued_at:
+                metrics.QUEUE_WAIT.observe(
+                    started - self.query.queued_at, endpoint=endpoint
+                )
+            if self.query.paginated:
+                self.run_pipelined()
+            else:
+                self.run_sequential()
+            metrics.QUERY_DURATION.observe(
+                time.time() - started, endpoint=endpoint
+            )
+            metrics.QUERY_PAGES.observe(self.query.pages, endpoint=endpoint)
             time.sleep(.5)
             self.queue.task_done()
 
+    def wait_for_dispatch(self):
+        """
+        Holds dispatch of the current query while the circuit breaker for its
+        endpoint is open, and abandons the query once its time budget is
+        spent.
+
+        Returns:
+            bool: True if the query may be dispatched, False if abandoned
+
+        """
+        breaker = CircuitBreakerCentral().get(self.query.endpoint)
+        while True:
+            if self.query.out_of_time:
+                TwiLogger.warning(
+                    f'Abandoning query with ID {self.query.uid}. Time budget '
+                    f'spent.'
+                )
+                return False
+            if breaker.state == CircuitBreaker.CLOSED:
+                return True
+            if breaker.state == CircuitBreaker.OPEN and not breaker.cooldown:
+                return True
+            time.sleep(min(breaker.cooldown, 5) or 1)
+
+    def abandon(self, error):
+        """
+        Gives up on the current query after a request failed in a way that
+        retrying won't fix, removing its checkpoint so it isn't resumed.
+
+        Args:
+            error (RequestFailed): Failure
+
+        """
+        TwiLogger.info(self.query.fetch_log())
+        TwiLogger.warning(
+            f'Abandoning query with ID {self.query.uid}. Request failed: '
+            f'{error}'
+        )
+        self.query.release()
+
+    def run_sequential(self):
+        """
+        Runs the query one page at a time, saving each page before fetching
+        the next.
+        """
+        while not self.query.done:
+            if not self.wait_for_dispatch():
+                break
+            try:
+                self.query.run()
+            except RequestFailed as error:
+                self.abandon(error)
+                return
+            except Exception:
+                import traceback
+                TwiLogger.exception(traceback.format_exc())
+                break
+            TwiLogger.info(self.query.fetch_log())
+            time.sleep(.2)
+
+    def run_pipelined(self):
+        """
+        Prefetches the next page of the query while the persister thread saves
+        the current one. The number of pages in flight is bounded by the
+        persister queue.
+        """
+        failure = None
+        while not self.query.done:
+            if not self.wait_for_dispatch():
+                break
+            try:
+                page = self.query.fetch_page()
+            except RequestFailed as error:
+                failure = error
+                break
+            except Exception:
+                import traceback
+                TwiLogger.exception(traceback.format_exc())
+                break
+            if page is not None:
+                self.persister.put(self.query, page)
+            TwiLogger.info(self.query.fetch_log())
+            time.sleep(.2)
+        self.persister.join_pages()
+        if failure:
+            # Saving earlier pages checkpoints the query, so it is released
+            # only once they have all been saved.
+            self.abandon(failure)
+            return
+        TwiLogger.info(self.query.fetch_log())
+
 
 class QueryExchange(object):
     """
@@ -160,7 +408,9 @@ class QueryExchange(object):
     def get_queue(self, endpoint):
         """
         Retrieves the queue for the given endpoint if it exists, otherwise
-        creates a queue.
+        creates a queue. Each queue is served by one worker per credential in
+        the credential pool, so that throughput scales with the number of
+        credentials.
 
         Args:
             endpoint (str): API endpoint
@@ -172,10 +422,13 @@ class QueryExchange(object):
         if not self._queues.get(endpoint):
             queue = Queue()
             self._queues[endpoint] = queue
-            thread = QueryWorker(name=endpoint)
-            thread.setup(queue=queue)
-            thread.start()
-            self._threads[endpoint] = thread
+            self._threads[endpoint] = []
+            worker_count = max(len(CredentialPool().credentials), 1)
+            for idx in range(worker_count):
+                thread = QueryWorker(name=f'{endpoint}-{idx}')
+                thread.setup(queue=queue)
+                thread.start()
+                self._threads[endpoint].append(thread)
         return self._queues[endpoint]
 
     def add(self, query):
@@ -190,30 +443,94 @@ class QueryExchange(object):
         if query in queue.queue:
             TwiLogger.info(f'Query with ID {query.uid} is already in the queue.')
             return
-        thread = self.threads.get(query.endpoint)
-        if thread and thread.query == query:
-            TwiLogger.info(f'Query with ID {query.uid} is already running.')
-            return
+        for thread in self.threads.get(query.endpoint, []):
+            if thread.query == query:
+                TwiLogger.info(f'Query with ID {query.uid} is already running.')
+                return
+        # Pick up where an earlier, interrupted run of the query left off, so
+        # no pages between it and the watermark are skipped.
+        cursor = AppData().get_query_checkpoint(query.uid)
+        if cursor and cursor.get('more_results') and not query.more_results:
+            TwiLogger.info(f'Resuming query with ID {query.uid}.')
+            query.restore(cursor)
+        query.checkpoint()
+        query.queued_at = time.time()
+        metrics.QUEUE_DEPTH.inc(endpoint=query.endpoint)
         queue.put(query)
         TwiLogger.info(query)
 
+    def restore(self, query_types):
+        """
+        Queues the queries checkpointed by a previous session, resuming any
+        half-finished pagination from its stored cursor.
+
+        Args:
+            query_types (dict): Query classes by query name
+
+        """
+        for checkpoint in AppData().get_query_checkpoints():
+            query_hash, query_name, output, kwargs, cursor = checkpoint
+            query = self.build(query_types, query_name, output, kwargs)
+            if query is None:
+                AppData().remove_query_checkpoint(query_hash)
+                continue
+            if query.uid != query_hash:
+                # Checkpointed under an older hash, it is checkpointed afresh
+                # when added.
+                AppData().remove_query_checkpoint(query_hash)
+            if cursor:
+                query.restore(cursor)
+            TwiLogger.info(f'Restoring query with ID {query.uid}.')
+            self.add(query)
+
+    @classmethod
+    def build(cls, query_types, query_name, output, kwargs):
+        """
+        Recreates a checkpointed query, including coalesced searches from the
+        queries they combine.
+
+        Args:
+            query_types (dict): Query classes by query name
+            query_name (str): Query name
+            output (str): Query output directory
+            kwargs (dict): Keyword arguments the query was created with
+
+        Returns:
+            RequestQuery: Query, None if the query type is unknown
+
+        """
+        from twicorder.search.queries.request_queries import (
+            CoalescedSearchQuery,
+        )
+        if query_name == CoalescedSearchQuery._name:
+            queries = [
+                cls.build(query_types, *member) for member in kwargs['queries']
+            ]
+            if None in queries:
+                return
+            return CoalescedSearchQuery(queries)
+        query_type = query_types.get(query_name)
+        if not query_type:
+            return
+        return query_type(output, **kwargs)
+
     def wait(self):
         """
         Sends shutdown signal to threads and waits for all threads and queues to
         terminate.
         """
-        for queue in self.queues.values():
-            queue.put(None)
+        for endpoint, queue in self.queues.items():
+            for _ in self.threads[endpoint]:
+                queue.put(None)
         # for queue in self.queues.values():
         #     queue.join()
-        for thread in self.threads.values():
-            thread.join()
+        for threads in self.threads.values():
+            for thread in threads:
+                thread.join()
 
 
 if __name__ == '__main__':
-    from twicorder.auth import get_auth_handler
     from twicorder.search.queries.request_queries import TimelineQuery
-    auth = get_auth_handler()
     accounts = [
         'slpng_giants',
         'slpng_giants_no',
@@ -221,9 +538,7 @@ if __name__ == '__main__':
         'slpng_giants_eu',
         'slpng_giants_nz'
     ]
-    queries = TimelineQuery(auth)
-
     qe = QueryExchange()
     for account in accounts:
-        qe.add(TimelineQuery(auth, screen_name=account))
+        qe.add(TimelineQuery(screen_name=account))
     qe.wait()
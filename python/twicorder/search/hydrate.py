@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import click
+
+from datetime import timedelta
+from itertools import islice
+from threading import Lock, Thread
+from typing import Optional
+
+from twicorder.auth import CredentialPool
+from twicorder.config import Config
+from twicorder.search.queries.request_queries import StatusQuery
+from twicorder.search.retry import (
+    CircuitBreakerCentral,
+    RequestFailed,
+    RetryPolicy,
+)
+from twicorder.utils import AppData, TwiLogger
+
+# Maximum number of IDs accepted by the statuses/lookup endpoint per request
+LOOKUP_BATCH_SIZE = 100
+
+
+def iter_file_ids(path):
+    """
+    Streams tweet IDs from a text file holding one ID per line. Only the first
+    comma separated column is read, so CSV files with the ID up front work as
+    well. Lines that don't start with an ID, such as headers, are skipped.
+
+    Args:
+        path (str): Path to ID file
+
+    Yields:
+        int: Tweet ID
+
+    """
+    with open(path) as stream:
+        for line in stream:
+            token = line.split(',', 1)[0].strip()
+            if token.isdigit():
+                yield int(token)
+
+
+def iter_db_ids(path):
+    """
+    Streams tweet IDs from a database written by the exporter.
+
+    Args:
+        path (str): Path to exported tweets.db
+
+    Yields:
+        int: Tweet ID
+
+    """
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.execute('SELECT tweet_id FROM tweets ORDER BY tweet_id')
+        for row in cursor:
+            yield row[0]
+    finally:
+        conn.close()
+
+
+class Hydrator(object):
+    """
+    Bulk hydrates tweet IDs with the statuses/lookup endpoint, 100 IDs per
+    request. Batches are fanned out over one worker per available credential,
+    each staying within the rate limit of the credentials it is handed by the
+    rate limit central. Found tweets go through the status query's regular
+    pickle and save path, while IDs of deleted or protected tweets are
+    recorded in AppData. Completed batches are stored as well, so an
+    interrupted job picks up where it left off when run again, and batches
+    that failed are retried.
+    """
+
+    def __init__(self, source, output, concurrency=None, report_interval=60.):
+        self._source = source
+        self._output = output
+        self._concurrency = concurrency or len(CredentialPool().get()) or 1
+        self._report_interval = report_interval
+        self._batches = None
+        self._done_batches = set()
+        self._failed_batches = set()
+        self._hydrated = 0
+        self._missing = 0
+        self._ids = 0
+        self._requests = 0
+        self._t0 = None
+        self._last_report = None
+        self._lock = Lock()
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def output(self):
+        return self._output
+
+    @property
+    def job_hash(self):
+        """
+        Identifier for the hydration job, derived from ID source and output.
+
+        Returns:
+            str: Job hash
+
+        """
+        hash_str = json.dumps(
+            [os.path.abspath(self.source), self.output], sort_keys=True
+        )
+        return hashlib.blake2s(hash_str.encode()).hexdigest()
+
+    @property
+    def hydrated(self):
+        return self._hydrated
+
+    @property
+    def missing(self):
+        return self._missing
+
+    @property
+    def failed_batches(self):
+        """
+        Batches that could not be looked up in this run of the job.
+
+        Returns:
+            set[int]: Batch indices
+
+        """
+        return self._failed_batches
+
+    @property
+    def ids_per_second(self):
+        if not self._t0:
+            return 0.
+        return self._ids / max(time.time() - self._t0, 1e-6)
+
+    def iter_ids(self):
+        """
+        Streams IDs from the job's source, either an exported tweet database
+        or an ID file.
+
+        Returns:
+            generator: Tweet IDs
+
+        """
+        if self.source.endswith('.db'):
+            return iter_db_ids(self.source)
+        return iter_file_ids(self.source)
+
+    def iter_batches(self):
+        """
+        Splits the ID stream into numbered lookup batches, skipping batches
+        completed by an earlier run of the job.
+
+        Yields:
+            tuple[int, list[int]]: Batch index and tweet IDs
+
+        """
+        ids = self.iter_ids()
+        batch_index = 0
+        while True:
+            batch = list(islice(ids, LOOKUP_BATCH_SIZE))
+            if not batch:
+                break
+            if batch_index not in self._done_batches:
+                yield batch_index, batch
+            batch_index += 1
+
+    def next_batch(self):
+        """
+        Hands out the next batch to look up.
+
+        Returns:
+            tuple[int, list[int]]: Batch index and tweet IDs, None when all
+                batches have been handed out
+
+        """
+        with self._lock:
+            return next(self._batches, None)
+
+    def hydrate_batch(self, batch_index, batch):
+        """
+        Looks up a batch of tweet IDs, saving the tweets found and recording
+        the IDs that weren't. Batches that can't be looked up are recorded as
+        failed.
+
+        Args:
+            batch_index (int): Index of the batch within the job
+            batch (list[int]): Tweet IDs
+
+        Returns:
+            bool: False if the batch could not be looked up
+
+        """
+        query = StatusQuery(
+            self.output,
+            id=','.join(str(i) for i in batch)
+        )
+        breaker = CircuitBreakerCentral().get(query.endpoint)
+        policy = RetryPolicy.from_config()
+        failures = 0
+        results = None
+        while results is None:
+            if query.out_of_time:
+                TwiLogger.warning(
+                    f'Time budget spent for batch {batch_index}.'
+                )
+                self.fail_batch(batch_index)
+                return False
+            if failures:
+                # Retries are spent, or another worker holds the trial
+                # request of a half-open breaker.
+                time.sleep(policy.delay(failures))
+            if breaker.cooldown:
+                time.sleep(breaker.cooldown)
+            try:
+                results = query.fetch()
+            except RequestFailed as error:
+                TwiLogger.info(query.fetch_log())
+                TwiLogger.warning(
+                    f'Unable to look up batch {batch_index}: {error}'
+                )
+                self.fail_batch(batch_index)
+                return False
+            finally:
+                with self._lock:
+                    self._requests += 1
+            failures += 1
+        query.persist(results)
+        found = {r['id'] for r in results}
+        missing = [i for i in batch if i not in found]
+        AppData().add_hydration_batch(
+            self.job_hash, batch_index, len(found), missing
+        )
+        TwiLogger.info(query.fetch_log())
+        with self._lock:
+            self._hydrated += len(found)
+            self._missing += len(missing)
+            self._ids += len(batch)
+        self.report()
+        return True
+
+    def fail_batch(self, batch_index):
+        """
+        Records a batch that could not be looked up. Failed batches are not
+        stored as completed, so they are retried when the job is run again.
+
+        Args:
+            batch_index (int): Index of the batch within the job
+
+        """
+        with self._lock:
+            self._failed_batches.add(batch_index)
+
+    def report(self, force=False):
+        """
+        Logs job progress and throughput, at most once per report interval
+        unless forced.
+
+        Args:
+            force (bool): Log regardless of report interval
+
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_report < self._report_interval:
+                return
+            self._last_report = now
+        TwiLogger.info(
+            f'Hydration: {self._ids} IDs looked up, {self.hydrated} found, '
+            f'{self.missing} missing, {self._requests} requests, '
+            f'{self.ids_per_second:.1f} IDs/sec.'
+        )
+
+    def run(self):
+        """
+        Runs the job with concurrent lookup workers.
+        """
+        self._done_batches = AppData().get_hydration_batches(self.job_hash)
+        if self._done_batches:
+            TwiLogger.info(
+                f'Resuming hydration, skipping {len(self._done_batches)} '
+                f'completed batches.'
+            )
+        self._batches = self.iter_batches()
+        self._t0 = self._last_report = time.time()
+        workers = []
+        for idx in range(self._concurrency):
+            worker = HydrationWorker(name=f'hydrate-{idx}')
+            worker.setup(self)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        self.report(force=True)
+        TwiLogger.info(
+            f'Hydration finished in '
+            f'{timedelta(seconds=int(time.time() - self._t0))}.'
+        )
+        if self.failed_batches:
+            TwiLogger.warning(
+                f'Unable to look up {len(self.failed_batches)} batches. Run '
+                f'the job again to retry them.'
+            )
+
+
+class HydrationWorker(Thread):
+    """
+    Thread looking up batches handed out by the hydrator until none are left.
+    A failed batch is recorded by the hydrator, and the thread moves on to the
+    next one.
+    """
+
+    def setup(self, hydrator):
+        self._hydrator = hydrator
+
+    def run(self):
+        while True:
+            batch = self._hydrator.next_batch()
+            if batch is None:
+                break
+            self._hydrator.hydrate_batch(*batch)
+
+
+@click.command()
+@click.option(
+    '--project-dir',
+    required=True,
+    help='Project files directory'
+)
+@click.option(
+    '--config-dir',
+    required=False,
+    help='Config file dir override. Defaults to project dir.'
+)
+@click.option(
+    '--source',
+    required=True,
+    help='File with one tweet ID per line, or tweets.db from the exporter'
+)
+@click.option('--output', required=True, help='Output dir for tweets')
+@click.option(
+    '--concurrency',
+    default=0,
+    show_default=True,
+    help='Number of concurrent lookups, 0 for one per credential'
+)
+@click.option(
+    '--report-interval',
+    default=60.,
+    show_default=True,
+    help='Seconds between progress reports'
+)
+@click.option(
+    '--list-missing',
+    is_flag=True,
+    default=False,
+    help='Print IDs of tweets not found by an earlier run and exit'
+)
+def main(project_dir: str, config_dir: Optional[str], source: str,
+         output: str, concurrency: int, report_interval: float,
+         list_missing: bool):
+    """
+    Bulk hydration of tweet IDs.
+    """
+    Config.setup(project_dir=project_dir, config_dir=config_dir)
+    hydrator = Hydrator(
+        source=source,
+        output=output,
+        concurrency=concurrency or None,
+        report_interval=report_interval
+    )
+    if list_missing:
+        for tweet_id in AppData().get_hydration_missing(hydrator.job_hash):
+            click.echo(tweet_id)
+        return
+    hydrator.run()
+
+
+if __name__ == '__main__':
+    main(auto_envvar_prefix='TC_HYDRATE')
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from twicorder.config import Config
+from twicorder.utils import Singleton, TwiLogger
+
+# Buckets for durations in seconds
+TIME_BUCKETS = (
+    .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60., 120., 300., 900.
+)
+
+# Buckets for pages fetched per query
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(object):
+    """
+    Base class for metrics, keeping a value per combination of label values.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self._name = name
+        self._documentation = documentation
+        self._labels = tuple(labels)
+        self._values = {}
+        self._lock = Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    def key(self, labels):
+        if set(labels) != set(self._labels):
+            raise ValueError(
+                f'Metric "{self.name}" expects labels {self._labels}, got '
+                f'{tuple(labels)}.'
+            )
+        return tuple((k, labels[k]) for k in self._labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Renders the metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Metric text
+
+        """
+        lines = [
+            f'# HELP {self.name} {self._documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for name, labels, value in self.samples():
+            lines.append(
+                f'{name}{format_labels(labels)} {format_value(value)}'
+            )
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+
+    kind = 'counter'
+
+    def inc(self, amount=1., **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, key, value
+
+
+class Gauge(Metric):
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1., **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.) + amount
+
+    def dec(self, amount=1., **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, key, value
+
+
+class Histogram(Metric):
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self._buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self._buckets) + 1), 0.)
+            )
+            counts[bisect.bisect_left(self._buckets, value)] += 1
+            self._values[key] = counts, total + value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (k, (list(c), s)) for k, (c, s) in self._values.items()
+            )
+        bounds = self._buckets + (math.inf,)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = key + (('le', format_value(bound)),)
+                yield f'{self.name}_bucket', labels, cumulative
+            yield f'{self.name}_sum', key, total
+            yield f'{self.name}_count', key, cumulative
+
+
+class MetricsRegistry(object, metaclass=Singleton):
+    """
+    Singleton holding all metrics of the search subsystem. Metrics are
+    created on first use and rendered together for scraping.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._server = None
+        self._lock = Lock()
+
+    def _get(self, metric_type, name, documentation, labels, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_type(
+                    name, documentation, labels, **kwargs
+                )
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        return self._get(
+            Histogram, name, documentation, labels, buckets=buckets
+        )
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics text
+
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+    def serve(self):
+        """
+        Starts serving metrics over HTTP, at "/metrics" on the host and port
+        given in the "metrics" section of the config file. Does nothing if
+        metrics are disabled or already being served.
+        """
+        settings = Config.get().get('metrics') or {}
+        if not settings.get('enabled') or self._server:
+            return
+        host = settings.get('host') or '127.0.0.1'
+        port = settings.get('port') or 9464
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        thread = Thread(
+            target=self._server.serve_forever, name='metrics', daemon=True
+        )
+        thread.start()
+        TwiLogger.info(f'Serving metrics at http://{host}:{port}/metrics')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        data = MetricsRegistry().render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        return
+
+
+def task_label(query):
+    """
+    Label identifying the task a query was cast for.
+
+    Args:
+        query (BaseQuery): Query
+
+    Returns:
+        str: Task output, or query name for queries without one
+
+    """
+    return query.output or query.name
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram(
+    'twicorder_request_duration_seconds',
+    'Latency of search API requests.',
+    labels=('endpoint',)
+)
+REQUESTS = registry.counter(
+    'twicorder_requests_total',
+    'Search API requests, by response status.',
+    labels=('endpoint', 'status')
+)
+RATE_LIMIT_SLEEP = registry.counter(
+    'twicorder_rate_limit_sleep_seconds_total',
+    'Time spent waiting for rate limit windows to reset.',
+    labels=('endpoint',)
+)
+RATE_LIMIT_REMAINING = registry.gauge(
+    'twicorder_rate_limit_remaining',
+    'Requests left in the current rate limit window.',
+    labels=('endpoint', 'credential')
+)
+RATE_LIMIT_CAP = registry.gauge(
+    'twicorder_rate_limit_cap',
+    'Requests allowed per rate limit window.',
+    labels=('endpoint', 'credential')
+)
+CREDENTIAL_SELECTIONS = registry.counter(
+    'twicorder_credential_selections_total',
+    'Requests routed to each credential.',
+    labels=('endpoint', 'credential')
+)
+PAGE_DURATION = registry.histogram(
+    'twicorder_page_duration_seconds',
+    'Time taken to fetch a page of query results, including retries and rate '
+    'limit waits.',
+    labels=('endpoint', 'task')
+)
+QUEUE_WAIT = registry.histogram(
+    'twicorder_queue_wait_seconds',
+    'Time queries spend queued in the query exchange before being run.',
+    labels=('endpoint',)
+)
+QUEUE_DEPTH = registry.gauge(
+    'twicorder_queue_depth',
+    'Queries waiting in the query exchange.',
+    labels=('endpoint',)
+)
+QUERY_DURATION = registry.histogram(
+    'twicorder_query_duration_seconds',
+    'Time taken to run a query, across all its pages.',
+    labels=('endpoint',)
+)
+QUERY_PAGES = registry.histogram(
+    'twicorder_query_pages',
+    'Pages fetched per query.',
+    labels=('endpoint',),
+    buckets=PAGE_BUCKETS
+)
+NEW_TWEETS = registry.counter(
+    'twicorder_new_tweets_total',
+    'Tweets not seen before, found by queries.',
+    labels=('endpoint', 'task')
+)
+QUERIES = registry.counter(
+    'twicorder_queries_total',
+    'Completed queries.',
+    labels=('endpoint', 'task')
+)
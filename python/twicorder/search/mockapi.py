@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import json
+import random
+import re
+import time
+import urllib.parse
+
+import click
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from twicorder.synthetic import (
+    TweetStream,
+    make_tweet,
+    make_user,
+    snowflake_to_ms,
+    stable_int,
+)
+
+# Requests allowed per rate limit window, per credential
+RATE_LIMITS = {
+    '/search/tweets': 180,
+    '/statuses/user_timeline': 900,
+    '/users/lookup': 900,
+    '/statuses/lookup': 900,
+    '/application/rate_limit_status': 180,
+}
+
+MAX_COUNTS = {
+    '/search/tweets': 100,
+    '/statuses/user_timeline': 200,
+}
+
+AUTH_TOKEN = re.compile(r'oauth_token="([^"]+)"')
+
+
+class MockApi(object):
+    """
+    Stand-in for the Twitter REST API, serving synthetic tweets for offline
+    load testing of the search subsystem.
+
+    Tweets for each search term and user timeline arrive at a steady rate,
+    with a backlog reaching back from when the server started, so repeated
+    queries keep finding new tweets. Rate limits are kept per credential and
+    endpoint, with the same "x-rate-limit-*" headers as the real API. Latency
+    and faults can be injected to exercise pacing and retries.
+    """
+
+    def __init__(self, rate=1., backlog=3600., window=900., latency=0.,
+                 jitter=0., error_rate=0., throttle_rate=0., missing_rate=0.05,
+                 seed=None):
+        self._rate = rate
+        self._start_ms = int((time.time() - backlog) * 1000)
+        self._window = window
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._throttle_rate = throttle_rate
+        self._missing_rate = missing_rate
+        self._random = random.Random(seed)
+        self._windows = {}
+        self._streams = {}
+        self._stats = Counter()
+        self._lock = Lock()
+
+    @property
+    def stats(self):
+        """
+        Counts of requests served, by status code, and of tweets served.
+
+        Returns:
+            dict: Stats
+
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def stream(self, key):
+        with self._lock:
+            if key not in self._streams:
+                self._streams[key] = TweetStream(
+                    key, self._start_ms, self._rate
+                )
+            return self._streams[key]
+
+    @staticmethod
+    def auth_key(headers):
+        """
+        Identifies the credential a request was made with.
+
+        Args:
+            headers (dict): Request headers
+
+        Returns:
+            str: Access token or bearer token
+
+        """
+        authorization = headers.get('Authorization') or ''
+        match = AUTH_TOKEN.search(authorization)
+        if match:
+            return urllib.parse.unquote(match.group(1))
+        return authorization or 'anonymous'
+
+    def consume(self, auth_key, endpoint):
+        """
+        Spends a request from the rate limit window of the given credential
+        and endpoint, starting a new window if the last one has ended.
+
+        Args:
+            auth_key (str): Credential
+            endpoint (str): API endpoint
+
+        Returns:
+            tuple[bool, dict]: Whether the request is allowed, and the rate
+                limit headers to respond with
+
+        """
+        cap = RATE_LIMITS[endpoint]
+        now = time.time()
+        with self._lock:
+            reset, remaining = self._windows.get(
+                (auth_key, endpoint), (0, cap)
+            )
+            if now >= reset:
+                reset, remaining = now + self._window, cap
+            allowed = remaining > 0
+            if allowed:
+                remaining -= 1
+            self._windows[(auth_key, endpoint)] = (reset, remaining)
+        headers = {
+            'x-rate-limit-limit': str(cap),
+            'x-rate-limit-remaining': str(remaining),
+            'x-rate-limit-reset': str(int(reset)),
+        }
+        return allowed, headers
+
+    def handle(self, endpoint, params, headers):
+        """
+        Serves a request.
+
+        Args:
+            endpoint (str): API endpoint, such as "/search/tweets"
+            params (dict): Query arguments
+            headers (dict): Request headers
+
+        Returns:
+            tuple[int, dict, object]: Status code, response headers and body
+
+        """
+        if endpoint not in RATE_LIMITS:
+            message = 'Sorry, that page does not exist.'
+            return self.respond(404, {}, 34, message)
+
+        delay = self._random.gauss(self._latency, self._jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self._random.random() < self._error_rate:
+            status = self._random.choice([500, 502, 503, 504])
+            return self.respond(status, {}, 131, 'Internal error.')
+        auth_key = self.auth_key(headers)
+        allowed, limit_headers = self.consume(auth_key, endpoint)
+        if not allowed or self._random.random() < self._throttle_rate:
+            return self.respond(429, limit_headers, 88, 'Rate limit exceeded.')
+
+        handler = {
+            '/search/tweets': self.search,
+            '/statuses/user_timeline': self.user_timeline,
+            '/users/lookup': self.users_lookup,
+            '/statuses/lookup': self.statuses_lookup,
+            '/application/rate_limit_status': self.rate_limit_status,
+        }[endpoint]
+        try:
+            body = handler(params, auth_key)
+        except (KeyError, ValueError) as error:
+            message = f'Bad request: {error}'
+            return self.respond(400, limit_headers, 44, message)
+        with self._lock:
+            self._stats[200] += 1
+            if isinstance(body, dict):
+                self._stats['tweets'] += len(body.get('statuses', []))
+            elif endpoint != '/users/lookup':
+                self._stats['tweets'] += len(body)
+        return 200, limit_headers, body
+
+    def respond(self, status, headers, code, message):
+        with self._lock:
+            self._stats[status] += 1
+        body = {'errors': [{'code': code, 'message': message}]}
+        return status, headers, body
+
+    @staticmethod
+    def count(endpoint, params, default):
+        return min(int(params.get('count', default)), MAX_COUNTS[endpoint])
+
+    @staticmethod
+    def optional_id(params, key):
+        value = params.get(key)
+        return int(value) if value else None
+
+    def page(self, terms, count, since_id=None, max_id=None):
+        """
+        Merges the newest tweets from the streams of the given terms.
+
+        Returns:
+            list[tuple[int, str]]: Tweet IDs and the terms they were found for,
+                newest first
+
+        """
+        now_ms = int(time.time() * 1000)
+        pages = [
+            [
+                (tweet_id, term) for tweet_id in
+                self.stream(term).page(now_ms, count, since_id, max_id)
+            ]
+            for term in terms
+        ]
+        merged = heapq.merge(*pages, key=lambda p: p[0], reverse=True)
+        return list(merged)[:count]
+
+    def search(self, params, auth_key):
+        query = params['q']
+        terms = [t.strip().lower() for t in query.split(' OR ') if t.strip()]
+        count = self.count('/search/tweets', params, 15)
+        since_id = self.optional_id(params, 'since_id')
+        max_id = self.optional_id(params, 'max_id')
+        page = self.page(terms, count, since_id, max_id)
+        statuses = [make_tweet(i, term, search=True) for i, term in page]
+        metadata = {
+            'completed_in': 0.01,
+            'max_id': page[0][0] if page else 0,
+            'max_id_str': str(page[0][0]) if page else '0',
+            'query': urllib.parse.quote_plus(query),
+            'count': count,
+            'since_id': since_id or 0,
+            'since_id_str': str(since_id or 0),
+        }
+        if len(page) == count:
+            next_args = {
+                'max_id': page[-1][0] - 1,
+                'q': query,
+                'count': count,
+                'include_entities': 1,
+                'result_type': params.get('result_type', 'mixed'),
+            }
+            metadata['next_results'] = (
+                f'?{urllib.parse.urlencode(next_args)}'
+            )
+        return {'statuses': statuses, 'search_metadata': metadata}
+
+    def user_timeline(self, params, auth_key):
+        if params.get('screen_name'):
+            user = make_user(screen_name=params['screen_name'])
+        else:
+            user = make_user(user_id=params['user_id'])
+        term = f'from:{user["screen_name"].lower()}'
+        count = self.count('/statuses/user_timeline', params, 20)
+        since_id = self.optional_id(params, 'since_id')
+        max_id = self.optional_id(params, 'max_id')
+        page = self.page([term], count, since_id, max_id)
+        tweets = []
+        for tweet_id, _ in page:
+            tweet = make_tweet(tweet_id, term)
+            tweet['user'] = user
+            tweets.append(tweet)
+        return tweets
+
+    @staticmethod
+    def users_lookup(params, auth_key):
+        if params.get('screen_name'):
+            names = params['screen_name'].split(',')[:100]
+            return [make_user(screen_name=n) for n in names]
+        user_ids = params['user_id'].split(',')[:100]
+        return [make_user(user_id=int(i)) for i in user_ids]
+
+    def statuses_lookup(self, params, auth_key):
+        now_ms = int(time.time() * 1000)
+        tweets = []
+        for tweet_id in params['id'].split(',')[:100]:
+            tweet_id = int(tweet_id)
+            # Tweets are deleted or protected at the configured rate
+            deleted = stable_int(str(tweet_id)) / 2 ** 32 < self._missing_rate
+            if deleted or snowflake_to_ms(tweet_id) > now_ms:
+                continue
+            tweets.append(make_tweet(tweet_id))
+        return tweets
+
+    def rate_limit_status(self, params, auth_key):
+        now = time.time()
+        resources = {}
+        with self._lock:
+            for endpoint, cap in RATE_LIMITS.items():
+                reset, remaining = self._windows.get(
+                    (auth_key, endpoint), (0, cap)
+                )
+                if now >= reset:
+                    reset, remaining = now + self._window, cap
+                family = endpoint.split('/')[1]
+                resources.setdefault(family, {})[endpoint] = {
+                    'limit': cap,
+                    'remaining': remaining,
+                    'reset': int(reset),
+                }
+        return {'rate_limit_context': {}, 'resources': resources}
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """
+    Request handler routing requests to the server's mock API. Endpoints are
+    served under the same "/1.1/<endpoint>.json" paths as the real API.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        self.dispatch(url.path, params)
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        if body.startswith('{'):
+            params.update(json.loads(body))
+        else:
+            params.update(urllib.parse.parse_qsl(body))
+        self.dispatch(url.path, params)
+
+    def dispatch(self, path, params):
+        endpoint = re.sub(r'^/1\.1', '', path)
+        endpoint = re.sub(r'\.json$', '', endpoint)
+        status, headers, body = self.server.api.handle(
+            endpoint, params, dict(self.headers)
+        )
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        return
+
+
+class MockApiServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, api, host='127.0.0.1', port=0):
+        super(MockApiServer, self).__init__((host, port), MockApiHandler)
+        self.api = api
+
+    @property
+    def base_url(self):
+        """
+        Base URL to set as "api_base_url" in the config to query the server.
+
+        Returns:
+            str: Base URL
+
+        """
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/1.1'
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        """
+        thread = Thread(target=self.serve_forever, name='mockapi', daemon=True)
+        thread.start()
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8765, show_default=True)
+@click.option(
+    '--rate',
+    default=1.,
+    show_default=True,
+    help='Tweets per second arriving for each search term and timeline'
+)
+@click.option(
+    '--backlog',
+    default=3600.,
+    show_default=True,
+    help='Seconds of tweets available when the server starts'
+)
+@click.option(
+    '--window',
+    default=900.,
+    show_default=True,
+    help='Length of rate limit windows in seconds'
+)
+@click.option(
+    '--latency',
+    default=0.,
+    show_default=True,
+    help='Mean response latency in seconds'
+)
+@click.option(
+    '--jitter',
+    default=0.,
+    show_default=True,
+    help='Standard deviation of response latency in seconds'
+)
+@click.option(
+    '--error-rate',
+    default=0.,
+    show_default=True,
+    help='Fraction of requests failing with a 5xx error'
+)
+@click.option(
+    '--throttle-rate',
+    default=0.,
+    show_default=True,
+    help='Fraction of requests failing with a 429, regardless of limits'
+)
+def main(host: str, port: int, rate: float, backlog: float, window: float,
+         latency: float, jitter: float, error_rate: float,
+         throttle_rate: float):
+    """
+    Mock Twitter REST API server.
+    """
+    api = MockApi(
+        rate=rate,
+        backlog=backlog,
+        window=window,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate
+    )
+    server = MockApiServer(api, host=host, port=port)
+    click.echo(f'Serving mock API at {server.base_url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        click.echo(json.dumps(api.stats, default=str))
+
+
+if __name__ == '__main__':
+    main(auto_envvar_prefix='TC_MOCKAPI')
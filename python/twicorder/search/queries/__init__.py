@@ -11,12 +11,24 @@ import traceback
 import urllib
 
 from datetime import datetime
+from threading import RLock
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 from twicorder import mongo
-from twicorder.auth import Auth, TokenAuth
+from twicorder.auth import CredentialPool
 from twicorder.config import Config
 from twicorder.constants import TW_TIME_FORMAT
+from twicorder.search import metrics
 from twicorder.search.exchange import RateLimitCentral
+from twicorder.search.retry import (
+    CircuitBreakerCentral,
+    RequestFailed,
+    RetryPolicy,
+)
 from twicorder.utils import write, AppData, timestamp_to_datetime
 
 
@@ -40,9 +52,15 @@ class BaseQuery(object):
         self._kwargs = kwargs
         self._orig_kwargs = copy.deepcopy(kwargs)
         self._log = []
+        self._task = None
+        self._new_count = 0
+        self._saved_last_id = None
+        self._pages = 0
+        self._queued_at = None
 
         last_return = AppData().get_last_query_id(self.uid)
-        if last_return:
+        self._watermark = int(last_return) if last_return else None
+        if last_return and self.last_return_token:
             self.kwargs[self.last_return_token] = last_return
 
     def __eq__(self, other):
@@ -95,6 +113,59 @@ class BaseQuery(object):
     def done(self, value):
         self._done = value
 
+    @property
+    def task(self):
+        """
+        Scheduler task the query was cast from, if any.
+
+        Returns:
+            Task: Task
+
+        """
+        return self._task
+
+    @task.setter
+    def task(self, value):
+        self._task = value
+
+    @property
+    def queued_at(self):
+        """
+        Time the query was queued in the query exchange, if any.
+
+        Returns:
+            float: Timestamp
+
+        """
+        return self._queued_at
+
+    @queued_at.setter
+    def queued_at(self, value):
+        self._queued_at = value
+
+    @property
+    def pages(self):
+        """
+        Number of pages fetched by the query so far.
+
+        Returns:
+            int: Number of pages
+
+        """
+        return self._pages
+
+    @property
+    def new_count(self):
+        """
+        Number of new tweets found by the query so far, after duplicates have
+        been removed.
+
+        Returns:
+            int: Number of tweets
+
+        """
+        return self._new_count
+
     @property
     def more_results(self):
         return self._more_results
@@ -111,6 +182,89 @@ class BaseQuery(object):
     def results(self):
         return self._results
 
+    @property
+    def watermark(self):
+        """
+        ID of the newest tweet found by a previous run of the query. Pagination
+        stops once a page reaches this tweet.
+
+        Returns:
+            int: Tweet ID, None if the query hasn't found any tweets before
+
+        """
+        return self._watermark
+
+    def reached_watermark(self, results):
+        """
+        Checks if a page of results reaches back to tweets already captured by
+        a previous run of the query.
+
+        Args:
+            results (list[dict]): Crawled tweets
+
+        Returns:
+            bool: True if the page reaches the watermark
+
+        """
+        if not self.watermark or not results:
+            return False
+        return min(int(r['id']) for r in results) <= self.watermark
+
+    @property
+    def cursor(self):
+        """
+        Pagination state of the query, as needed to resume it in a later
+        session.
+
+        Returns:
+            dict: Pagination state
+
+        """
+        cursor = {
+            'more_results': self._more_results,
+            'last_id': self._last_id,
+            'watermark': self._watermark,
+            'kwargs': copy.deepcopy(self._kwargs),
+        }
+        return cursor
+
+    def restore(self, cursor):
+        """
+        Restores the pagination state of a query checkpointed in a previous
+        session.
+
+        Args:
+            cursor (dict): Pagination state
+
+        """
+        self._more_results = cursor.get('more_results')
+        self._last_id = cursor.get('last_id')
+        self._watermark = cursor.get('watermark', self._watermark)
+        self._kwargs = cursor.get('kwargs') or self._kwargs
+
+    def checkpoint(self, cursor=None):
+        """
+        Stores the query and its pagination state to disk, so it can be resumed
+        if the session ends before the query completes.
+
+        Args:
+            cursor (dict): Pagination state. Defaults to the current state.
+
+        """
+        AppData().set_query_checkpoint(
+            query_hash=self.uid,
+            query_name=self.name,
+            output=self.output,
+            kwargs=self._orig_kwargs,
+            cursor=cursor or self.cursor
+        )
+
+    def release(self):
+        """
+        Removes the query's checkpoint from disk.
+        """
+        AppData().remove_query_checkpoint(self.uid)
+
     @property
     def mongo_collection(self):
         if not self._mongo_collection or not mongo.is_connected(self._mongo_collection):
@@ -123,9 +277,21 @@ class BaseQuery(object):
     def log(self, line):
         self._log.append(line)
 
+    @property
+    def paginated(self):
+        """
+        Whether the query fetches its results over several pages.
+
+        Returns:
+            bool: True if the query is paginated
+
+        """
+        return bool(self.fetch_more_path)
+
     def fetch_log(self):
+        lines, self._log = self._log, []
         log_data = '\n' + f' {self.endpoint} '.center(80, '=') + '\n'
-        log_data += '\n'.join(self._log)
+        log_data += '\n'.join(lines)
         log_data += '\n' + '=' * 80
         return log_data
 
@@ -146,7 +312,7 @@ class BaseQuery(object):
         self.log(f'Wrote {len(self.results)} tweets to "{file_path}"')
 
         # Write to Mongo
-        if not self.mongo_collection:
+        if not config.get('use_mongo', True) or not self.mongo_collection:
             return
         try:
             for result in self._results:
@@ -167,25 +333,18 @@ class BaseQuery(object):
         Saves a cache of tweet IDs from query result to disk. In storing the IDs
         between sessions, we make sure we don't save already found tweets.
 
-        To prevent the disk cache growing too large, we purge IDs for tweets
-        older than 14 days. Twitter's base search only goes back 7 days, so we
-        shouldn't encounter tweets older than 14 days very often.
+        Only the IDs of the tweets in the result are looked up in the cache,
+        so the cost of a page doesn't grow with the number of tweets found
+        before.
         """
 
-        # Loading picked tweet IDs
-        tweets = dict(AppData().get_query_tweets(self._name)) or {}
-
-        # # Purging tweet IDs older than 14 days
-        # now = datetime.now()
-        # old_tweets = tweets.copy()
-        # tweets = {}
-        # for tweet_id, timestamp in old_tweets.items():
-        #     dt = datetime.fromtimestamp(timestamp)
-        #     if not now - dt > timedelta(days=14):
-        #         tweets[tweet_id] = timestamp
+        # Looking up picked tweet IDs
+        seen = AppData().get_seen_query_tweets(
+            self._name, [t['id'] for t in self.results]
+        )
 
         # Stores tweet IDs from result
-        self._results = [t for t in self.results if t['id'] not in tweets]
+        self._results = [t for t in self.results if t['id'] not in seen]
         new_tweets = []
         for result in self.results:
             created_at = result['created_at']
@@ -207,9 +366,23 @@ class TweepyQuery(BaseQuery):
         return self._api
 
 
+class Page(object):
+    """
+    Page of results fetched by a query, along with the pagination state of
+    the query right after the page was fetched. Captured at fetch time, so
+    the page can be persisted while the query goes on to fetch the next one.
+    """
+
+    def __init__(self, results, final, cursor):
+        self.results = results
+        self.final = final
+        self.cursor = cursor
+
+
 class RequestQuery(BaseQuery):
 
     _base_url = 'https://api.twitter.com/1.1'
+    _base_url_override = None
     _request_type = 'get'
     _token_auth = False
 
@@ -223,13 +396,51 @@ class RequestQuery(BaseQuery):
 
     def __init__(self, output=None, **kwargs):
         super(RequestQuery, self).__init__(output, **kwargs)
+        self._started = None
+        # Guards the query state shared by the worker fetching pages and the
+        # persister saving them.
+        self._lock = RLock()
 
     def __eq__(self, other):
         return type(self) == type(other) and self.uid == other.uid
 
+    def log(self, line):
+        with self._lock:
+            super(RequestQuery, self).log(line)
+
+    def fetch_log(self):
+        with self._lock:
+            return super(RequestQuery, self).fetch_log()
+
+    @classmethod
+    def override_base_url(cls, base_url):
+        """
+        Points all request queries at the given API root. Unlike the
+        "api_base_url" config setting, the override isn't lost when the config
+        is reloaded from disk, so load tests stay pinned to a mock API server.
+
+        Args:
+            base_url (str): Base URL, None to remove the override
+
+        """
+        RequestQuery._base_url_override = base_url
+
     @property
     def base_url(self):
-        return self._base_url
+        """
+        Root URL of the API, which an override or the "api_base_url" config
+        setting may replace, for instance to point queries at a mock API
+        server.
+
+        Returns:
+            str: Base URL
+
+        """
+        return (
+            self._base_url_override or
+            Config.get().get('api_base_url') or
+            self._base_url
+        )
 
     @property
     def request_type(self):
@@ -239,6 +450,65 @@ class RequestQuery(BaseQuery):
     def token_auth(self):
         return self._token_auth
 
+    @property
+    def time_budget(self):
+        """
+        Max time the query, including all pages, may run before it is
+        abandoned. Set in config file.
+
+        Returns:
+            float: Seconds, None if the query may run indefinitely
+
+        """
+        return Config.get().get('query_time_budget')
+
+    @property
+    def remaining_time(self):
+        """
+        Time left of the query's time budget.
+
+        Returns:
+            float: Seconds, None if the query may run indefinitely
+
+        """
+        if not self.time_budget or self._started is None:
+            return
+        return max(self.time_budget - (time.time() - self._started), 0.)
+
+    @property
+    def out_of_time(self):
+        """
+        Whether the query has spent its time budget.
+
+        Returns:
+            bool: True if the time budget is spent
+
+        """
+        return self.remaining_time == 0
+
+    @property
+    def stream_results(self):
+        """
+        Whether to decode responses incrementally as they arrive. Requires the
+        optional ijson module and the "stream_results" config setting.
+
+        Returns:
+            bool: True if responses should be streamed
+
+        """
+        return bool(ijson and Config.get().get('stream_results'))
+
+    @property
+    def stream_batch_size(self):
+        """
+        Number of streamed statuses to pickle and save at a time.
+
+        Returns:
+            int: Batch size
+
+        """
+        return Config.get().get('stream_batch_size') or 100
+
     @property
     def request_url(self):
         url = f'{self.base_url}{self.endpoint}.json'
@@ -252,103 +522,439 @@ class RequestQuery(BaseQuery):
         hash_str = str([getattr(self, k) for k in self._hash_keys]).encode()
         return hashlib.blake2s(hash_str).hexdigest()
 
-    def run(self):
-        # Purging logs
-        self._log = []
+    def request(self):
+        """
+        Performs the request for the next page of the query. Failed requests
+        are retried according to the retry policy, as long as the circuit
+        breaker for the endpoint is closed and the query's time budget allows.
 
-        # Check rate limit for query. Sleep if limits are in effect.
-        limit = RateLimitCentral().get(self.endpoint)
+        Returns:
+            requests.Response: Successful response, None if the request may
+                succeed later
+
+        Raises:
+            RequestFailed: If the request can't succeed as it stands
+
+        """
+        if self._started is None:
+            self._started = time.time()
+        t0 = time.time()
+        response = self._request()
+        metrics.PAGE_DURATION.observe(
+            time.time() - t0,
+            endpoint=self.endpoint,
+            task=metrics.task_label(self)
+        )
+        if response is not None:
+            self._pages += 1
+        return response
+
+    def _request(self):
+        policy = RetryPolicy.from_config()
+        breaker = CircuitBreakerCentral().get(self.endpoint)
         self.log(f'URL: {self.request_url}')
-        self.log(f'{limit}')
-        if limit and limit.remaining == 0:
-            sleep_time = max(limit.reset - time.time(), 0) + 2
-            msg = (
-                f'Sleeping for {sleep_time:.02f} seconds for endpoint '
-                f'"{self.endpoint}".'
-            )
-            self.log(msg)
-            time.sleep(sleep_time)
 
         # Perform query
         attempts = 0
         while True:
+            if not breaker.allow():
+                self.log(
+                    f'Circuit breaker open for endpoint "{self.endpoint}". '
+                    f'Retrying in {breaker.cooldown:.02f} seconds.'
+                )
+                return
+            response = None
             try:
-                if self._token_auth:
-                    request = getattr(requests, self.request_type)
-                    response = request(
-                        self.request_url,
-                        data=json.dumps(self.kwargs),
-                        auth=TokenAuth()
-                    )
-                else:
-                    request = getattr(Auth().oauth, self.request_type)
-                    response = request(self.request_url)
+                response = self.send()
             except Exception:
-                attempts += 1
                 self.log(traceback.format_exc())
-                time.sleep(2**attempts)
-                if attempts >= 5:
-                    break
-            else:
-                break
-
-        # Check query response code. Return with error message if not a
-        # successful 200 code.
-        if response.status_code != 200:
-            if response.status_code == 429:
-                self.log(f'Rate Limit in effect: {response.reason}')
-                self.log(f'Message: {response.json().get("message")}')
+                metrics.REQUESTS.inc(endpoint=self.endpoint, status='error')
+                breaker.record_failure()
             else:
+                # Client errors say nothing about the health of the endpoint,
+                # as they are specific to the query or credential.
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                elif not policy.is_terminal(response):
+                    breaker.record_success()
+                if response.status_code == 200:
+                    break
+                self.log_error(response)
+                if policy.is_terminal(response):
+                    raise RequestFailed(
+                        f'<{response.status_code}> {response.reason}',
+                        status_code=response.status_code
+                    )
+            attempts += 1
+            if not policy.should_retry(attempts, response):
+                return
+            delay = policy.delay(attempts, response)
+            remaining = self.remaining_time
+            if remaining is not None and delay >= remaining:
                 self.log(
-                    '<{r.status_code}> {r.reason}: {r.content}'
-                    .format(r=response)
+                    f'Time budget exhausted. Not retrying in {delay:.02f} '
+                    f'seconds.'
                 )
-            return
+                return
+            self.log(f'Retrying in {delay:.02f} seconds (attempt {attempts}).')
+            time.sleep(delay)
+
         self.log('Successful return!')
+        return response
+
+    def send(self):
+        """
+        Sends the request for the next page of the query, routed to the
+        credential with the most remaining budget for the endpoint. Sleeps if
+        limits are in effect for all credentials.
+
+        Returns:
+            requests.Response: Response
+
+        """
+        credentials = CredentialPool().get(token_auth=self.token_auth)
+        credential = RateLimitCentral().select(self.endpoint, credentials)
+        limit = RateLimitCentral().get(self.endpoint, credential.uid)
+        self.log(f'{credential}: {limit}')
+        if limit and limit.remaining == 0:
+            sleep_time = max(limit.reset - time.time(), 0) + 2
+            msg = (
+                f'Sleeping for {sleep_time:.02f} seconds for endpoint '
+                f'"{self.endpoint}".'
+            )
+            self.log(msg)
+            time.sleep(sleep_time)
+            metrics.RATE_LIMIT_SLEEP.inc(sleep_time, endpoint=self.endpoint)
+
+        t0 = time.time()
+        if self._token_auth:
+            request = getattr(requests, self.request_type)
+            response = request(
+                self.request_url,
+                data=json.dumps(self.kwargs),
+                auth=credential.token_auth,
+                stream=self.stream_results
+            )
+        else:
+            oauth = credential.user_auth.oauth
+            request = getattr(oauth, self.request_type)
+            response = request(
+                self.request_url,
+                stream=self.stream_results
+            )
+        metrics.REQUEST_DURATION.observe(
+            time.time() - t0, endpoint=self.endpoint
+        )
+        metrics.REQUESTS.inc(
+            endpoint=self.endpoint, status=str(response.status_code)
+        )
 
         # Update rate limit for query
-        RateLimitCentral().update(self.endpoint, response.headers)
-
-        # Search query response for additional paged results. Pronounce the
-        # query done if no more pages are found.
-        pagination = response.json()
-        if self.fetch_more_path:
-            for token in self.fetch_more_path.split('.'):
-                pagination = pagination.get(token, {})
-            if pagination:
-                self._more_results = pagination
-                self.log('More pages found!')
+        RateLimitCentral().update(
+            self.endpoint, response.headers, credential.uid
+        )
+        return response
+
+    def log_error(self, response):
+        """
+        Logs the reason a request was unsuccessful.
+
+        Args:
+            response (requests.Response): Unsuccessful response
+
+        """
+        if response.status_code == 429:
+            self.log(f'Rate Limit in effect: {response.reason}')
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.content
+            self.log(f'Message: {message}')
+        else:
+            self.log(
+                '<{r.status_code}> {r.reason}: {r.content}'
+                .format(r=response)
+            )
+
+    def parse(self, response):
+        """
+        Decodes the response once, extracting both the crawled tweets and the
+        pagination token from the same object.
+
+        Args:
+            response (requests.Response): Successful response
+
+        Returns:
+            list[dict]: Crawled tweets
+
+        """
+        data = response.json()
+        results = self.extract(data, self.results_path, [])
+        self.track_last_id(results)
+        self.paginate(self.extract(data, self.fetch_more_path, {}), results)
+        self.log(f'Result count: {len(results)}')
+        return results
+
+    def track_last_id(self, results):
+        """
+        Records the ID of the newest tweet found by the query, which is the
+        first tweet of its first page. Recorded as soon as the page has been
+        fetched, so that the pagination cursor holds it from the first page
+        on.
+
+        Args:
+            results (list[dict]): Crawled tweets
+
+        """
+        if self.last_id is None and results:
+            self.last_id = results[0].get('id_str')
+
+    def fetch(self):
+        """
+        Fetches the next page of the query without persisting it, leaving the
+        query ready to fetch the following page.
+
+        Returns:
+            list[dict]: Crawled tweets, None if the request may succeed later
+
+        Raises:
+            RequestFailed: If the request can't succeed as it stands
+
+        """
+        page = self.fetch_page()
+        if page is None:
+            return
+        return page.results
+
+    def fetch_page(self):
+        """
+        Fetches the next page of the query without persisting it, along with
+        the pagination state after the page. Used to pipeline pagination, with
+        the page persisted by another thread while the query fetches the next
+        one. The response is read outside the query's lock, and the query
+        state is updated and captured under it.
+
+        Returns:
+            Page: Fetched page, None if the request may succeed later
+
+        Raises:
+            RequestFailed: If the request can't succeed as it stands
+
+        """
+        response = self.request()
+        if response is None:
+            return
+        streamed = self.stream_results
+        if streamed:
+            results = list(self.iter_stream(response))
+        with self._lock:
+            if streamed:
+                self.track_last_id(results)
+                self.paginate(self._stream_pagination, results)
+                self.log(f'Result count: {len(results)}')
             else:
-                self._more_results = None
-                self._done = True
-                self.log('No more pages!')
+                results = self.parse(response)
+            return Page(results, final=self.done, cursor=self.cursor)
+
+    def persist(self, results, final=True, cursor=None):
+        """
+        Saves a page of crawled tweets fetched by the query, under the query's
+        lock.
+
+        Args:
+            results (list[dict]): Crawled tweets
+            final (bool): True if this is the last page of the query
+            cursor (dict): Pagination state after the page was fetched
+
+        Returns:
+            list[dict]: Crawled tweets that had not been seen before
+
+        """
+        with self._lock:
+            results = self.process_results(results)
+            self.complete_page(final, cursor)
+            return results
+
+    def complete_page(self, final, cursor=None):
+        """
+        Checkpoints the pagination state once a page has been saved, or clears
+        the checkpoint if the query completed.
+
+        Args:
+            final (bool): True if this was the last page of the query
+            cursor (dict): Pagination state after the page was fetched
+
+        """
+        self.finalise()
+        if final:
+            self.release()
+            labels = {
+                'endpoint': self.endpoint,
+                'task': metrics.task_label(self),
+            }
+            metrics.NEW_TWEETS.inc(self.new_count, **labels)
+            metrics.QUERIES.inc(**labels)
+            if self.task:
+                self.task.record_yield(self.new_count)
         else:
+            self.checkpoint(cursor)
+
+    def run(self):
+        response = self.request()
+        if response is None:
+            return
+
+        # Extract crawled tweets and pagination token from the query response,
+        # either by decoding the whole page at once or by streaming statuses
+        # as they arrive.
+        if self.stream_results:
+            return self._run_streamed(response)
+        results = self.parse(response)
+
+        # Returning the crawled results that had not been seen before, as
+        # streamed pages do
+        return self.persist(results, final=self.done, cursor=self.cursor)
+
+    @staticmethod
+    def extract(data, path, default):
+        """
+        Walks the dot separated path through the decoded response data.
+
+        Args:
+            data (dict|list): Decoded response data
+            path (str): Dot separated path, such as "search_metadata.next"
+            default (object): Value to use for missing path tokens
+
+        Returns:
+            object: Value found at the end of the path
+
+        """
+        if not path:
+            return data
+        for token in path.split('.'):
+            data = data.get(token, default)
+        return data
+
+    def paginate(self, pagination, results):
+        """
+        Search query response for additional paged results. Pronounce the
+        query done if no more pages are found.
+
+        Args:
+            pagination (str): Pagination token extracted from the response
+            results (list[dict]): Crawled tweets for the page, before any
+                duplicates have been filtered out. Only holds the last tweet of
+                the page when results are streamed.
+
+        """
+        if not self.fetch_more_path:
+            self._done = True
+            return
+        if self.reached_watermark(results):
+            self._more_results = None
+            self._done = True
+            self.log('Reached last seen tweet. No more pages needed!')
+        elif pagination:
+            self._more_results = pagination
+            self.log('More pages found!')
+        else:
+            self._more_results = None
             self._done = True
+            self.log('No more pages!')
 
-        # Extract crawled tweets from query response.
-        results = response.json()
-        if self.results_path:
-            for token in self.results_path.split('.'):
-                results = results.get(token, [])
-        self._results = results
-        self.log(f'Result count: {len(results)}')
+    def process_results(self, results):
+        """
+        Saves and stores IDs for crawled tweets found in the query result.
+        Also records the last tweet ID found.
+
+        Args:
+            results (list[dict]): Crawled tweets
 
-        # Saves and stores IDs for crawled tweets found in the query result.
-        # Also records the last tweet ID found.
+        Returns:
+            list[dict]: Crawled tweets that had not been seen before
+
+        """
+        self._results = results
         if results:
             self.pickle()
+            self._new_count += len(self._results)
             self.log(f'Cached Tweet IDs to disk!')
             self.save()
-            if self.last_id is None:
-                self.last_id = results[0].get('id_str')
-
-        # Caches last tweet ID found to disk if the query, including all pages
-        # completed successfully. This saves us from searching all the way back
-        # to the beginning on next crawl. Instead we can stop when we encounter
-        # this tweet.
-        if self._done and self.last_id:
+            self.track_last_id(results)
+        return self._results
+
+    def finalise(self):
+        """
+        Caches last tweet ID found to disk as soon as the page it was found in
+        has been saved. This saves us from searching all the way back to the
+        beginning on next crawl. Instead we can stop when we encounter this
+        tweet. Should the query be interrupted, its checkpoint holds the older
+        watermark needed to finish the remaining pages.
+        """
+        if self.last_id and self.last_id != self._saved_last_id:
             self.log(f'Cached ID of last tweet returned by query to disk.')
             AppData().set_last_query_id(self.uid, self.last_id)
+            self._saved_last_id = self.last_id
+
+    def iter_stream(self, response):
+        """
+        Incrementally decodes the response body, yielding each status as soon
+        as it has been read off the wire. The pagination token is picked up
+        along the way and stored in self._stream_pagination.
+
+        Args:
+            response (requests.Response): Streamed response
+
+        Yields:
+            dict: Status
+
+        """
+        item_prefix = 'item'
+        if self.results_path:
+            item_prefix = f'{self.results_path}.item'
+        builder = None
+        self._stream_pagination = None
+        response.raw.decode_content = True
+        events = ijson.parse(response.raw, use_float=True)
+        for prefix, event, value in events:
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == item_prefix and event == 'end_map':
+                    yield builder.value
+                    builder = None
+            elif prefix == item_prefix and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif prefix == self.fetch_more_path and value is not None:
+                self._stream_pagination = value
+
+    def _run_streamed(self, response):
+        """
+        Processes the statuses of a streamed response in batches, allowing
+        pickling and saving to start before the whole page has been decoded.
+
+        Args:
+            response (requests.Response): Streamed response
 
-        # Returning crawled results
+        Returns:
+            list[dict]: Crawled tweets that had not been seen before
+
+        """
+        count = 0
+        last_status = None
+        results = []
+        batch = []
+        for status in self.iter_stream(response):
+            batch.append(status)
+            count += 1
+            last_status = status
+            if len(batch) >= self.stream_batch_size:
+                results += self.process_results(batch)
+                batch = []
+        results += self.process_results(batch)
+        self._results = results
+        self.log(f'Result count: {count}')
+        tail = [last_status] if last_status else []
+        self.paginate(self._stream_pagination, tail)
+        self.complete_page(self.done)
         return results
@@ -2,13 +2,25 @@
 # -*- coding: utf-8 -*-
 
 import copy
+import json
+import re
 import urllib
 
 from datetime import datetime, timedelta
 from threading import Lock
 
-from twicorder.utils import collect_key_values, Singleton
+from twicorder.utils import (
+    collect_key_values,
+    AppData,
+    Singleton,
+    TwiLogger,
+)
 from twicorder.search.queries import RequestQuery
+from twicorder.search.retry import RequestFailed
+
+
+# Single search term, such as "@handle", "to:handle", "#hashtag" or "word".
+SEARCH_TERM = re.compile(r'^(to:|from:)?[@#$]?\w+$')
 
 
 class CachedUser(object):
@@ -98,7 +110,12 @@ class CachedUserCentral(object, metaclass=Singleton):
                 missing_users[i:i + n] for i in range(0, len(missing_users), n)
             ]
             for chunk in chunks:
-                UserQuery(user_id=','.join([str(u) for u in chunk])).run()
+                query = UserQuery(user_id=','.join([str(u) for u in chunk]))
+                try:
+                    query.run()
+                except RequestFailed as error:
+                    # Mentions are expanded on a best effort basis
+                    TwiLogger.warning(f'Unable to look up users: {error}')
             for tweet in tweets:
                 mention_sections = collect_key_values('user_mentions', tweet)
                 for mention_section in mention_sections:
@@ -141,16 +158,23 @@ class StatusQuery(RequestQuery):
         self._kwargs['trim_user'] = 'false'
         self._kwargs.update(kwargs)
 
-    def save(self):
-        for status in self.results:
-            pass
+    def finalise(self):
+        """
+        Status lookups fetch tweets by ID, so there is no last seen tweet to
+        pick up from on the next crawl.
+        """
+        return
 
 
 class TimelineQuery(RequestQuery):
+    """
+    User timeline, paginated with max_id. No since_id is sent, so the page
+    reaching back to the last seen tweet comes back from the API, and
+    pagination stops there without asking for an empty page.
+    """
 
     _name = 'user_timeline'
     _endpoint = '/statuses/user_timeline'
-    _last_return_token = 'since_id'
 
     def __init__(self, output=None, **kwargs):
         super(TimelineQuery, self).__init__(output, **kwargs)
@@ -171,16 +195,31 @@ class TimelineQuery(RequestQuery):
             url += f'?{urllib.parse.urlencode(self.kwargs)}'
         return url
 
-    def run(self):
-        super(TimelineQuery, self).run()
+    @property
+    def paginated(self):
+        return True
+
+    def paginate(self, pagination, results):
         self.done = False
-        if not self.results:
+        if not results:
+            self.done = True
+            self.log('No more pages!')
+            return
+
+        # Ask for tweets older than the oldest one in this page only, so pages
+        # don't overlap.
+        oldest = min(int(r['id']) for r in results)
+        self._more_results = str(oldest - 1)
+        if self.watermark and oldest - 1 <= self.watermark:
             self.done = True
+            self.log('Reached last seen tweet. No more pages needed!')
             return
-        self._more_results = self.results[-1]['id_str']
         last_return = self.kwargs.get('max_id')
         if last_return and int(self._more_results) >= int(last_return):
             self.done = True
+            self.log('No more pages!')
+            return
+        self.log('More pages found!')
 
     def save(self):
         self.log('Expanding user mentions!')
@@ -224,22 +263,167 @@ class StandardSearchQuery(RequestQuery):
         super(StandardSearchQuery, self).save()
 
 
-class FullArchiveGetQuery(RequestQuery):
+class CoalescedSearchQuery(StandardSearchQuery):
+    """
+    Standard search combining the terms of several compatible search queries
+    into a single OR query. Results are demultiplexed back to the queries they
+    match, and saved to each query's output.
+
+    The combined query is checkpointed with its pagination cursor, and the
+    queries it combines, so it can be recreated and resumed in a later
+    session. The last seen tweet of the original queries is only moved on
+    once the final page has been saved, so an interrupted search doesn't skip
+    the pages it didn't get to.
+    """
+
+    _name = 'coalesced_search'
+
+    def __init__(self, queries, **kwargs):
+        self._queries = queries
+        search_kwargs = copy.deepcopy(queries[0].kwargs)
+        search_kwargs.pop('since_id', None)
+        search_kwargs['q'] = ' OR '.join(q.kwargs['q'] for q in queries)
+        search_kwargs.update(kwargs)
+        super(CoalescedSearchQuery, self).__init__(None, **search_kwargs)
+
+        # Only search back as far as the query that was last run the longest
+        # time ago.
+        self.kwargs.pop('since_id', None)
+        self._watermark = None
+        since_ids = [q.kwargs.get('since_id') for q in queries]
+        if all(since_ids):
+            self.kwargs['since_id'] = min(since_ids, key=int)
+        watermarks = [q.watermark for q in queries]
+        if all(watermarks):
+            self._watermark = min(watermarks)
+
+    def __repr__(self):
+        return (
+            f'Query({repr(self.name)}, queries={len(self.queries)}, '
+            f'kwargs={str(self.kwargs)})'
+        )
+
+    @property
+    def queries(self):
+        return self._queries
+
+    def checkpoint(self, cursor=None):
+        # Store the original queries rather than the combined arguments, so
+        # the combined query can be recreated from them in a later session.
+        members = [[q.name, q.output, q._orig_kwargs] for q in self.queries]
+        AppData().set_query_checkpoint(
+            query_hash=self.uid,
+            query_name=self.name,
+            output=None,
+            kwargs={'queries': members},
+            cursor=cursor or self.cursor
+        )
+
+    def release(self):
+        super(CoalescedSearchQuery, self).release()
+        for query in self.queries:
+            query.release()
+
+    def process_results(self, results):
+        self._results = results
+        if not results:
+            return self._results
+        self.track_last_id(results)
+
+        # Seen tweet IDs are shared by all free search queries, so pickling
+        # through any of the original queries filters the whole page.
+        lead = self.queries[0]
+        lead._results = list(results)
+        lead.pickle()
+        new_results = lead.results
+        self._new_count += len(new_results)
+        self.log('Cached Tweet IDs to disk!')
+
+        matches = {id(q): [] for q in self.queries}
+        for tweet in new_results:
+            matched = [
+                q for q in self.queries
+                if matches_search_term(q.kwargs['q'], tweet)
+            ]
+            if not matched:
+                # Twitter matched the tweet on something we can't see, such as
+                # an expanded URL. Keep it with all queries rather than lose it.
+                self.log(f'Unable to attribute tweet {tweet["id"]}.')
+                matched = self.queries
+            for query in matched:
+                matches[id(query)].append(tweet)
+
+        for query in self.queries:
+            query._results = matches[id(query)]
+            query._new_count += len(query.results)
+            if query.results:
+                query.save()
+            self._log += query._log
+            query._log = []
+        self._results = new_results
+        return self._results
+
+    def complete_page(self, final, cursor=None):
+        if not final:
+            self.checkpoint(cursor)
+            return
+        try:
+            for query in self.queries:
+                query.last_id = self.last_id
+                query.complete_page(final=True)
+        finally:
+            for query in self.queries:
+                self._log += query._log
+                query._log = []
+        super(CoalescedSearchQuery, self).release()
+
+
+class FullArchiveMixin(object):
+    """
+    Pagination for the premium full-archive endpoints, which expect the "next"
+    token of the previous page to be passed back with the query arguments.
+    """
+
+    def paginate(self, pagination, results):
+        super(FullArchiveMixin, self).paginate(pagination, results)
+        if self.more_results:
+            self.kwargs['next'] = self.more_results
+        else:
+            self.kwargs.pop('next', None)
+
+
+class FullArchiveGetQuery(FullArchiveMixin, RequestQuery):
 
     _name = 'fullarchive_get'
     _endpoint = '/tweets/search/fullarchive/production'
+    _results_path = 'results'
     _fetch_more_path = 'next'
 
 
-class FullArchivePostQuery(RequestQuery):
+class FullArchivePostQuery(FullArchiveMixin, RequestQuery):
 
     _name = 'fullarchive_post'
     _endpoint = '/tweets/search/fullarchive/production'
+    _results_path = 'results'
     _fetch_more_path = 'next'
     _request_type = 'post'
     _token_auth = True
 
 
+class FullArchiveCountsQuery(FullArchiveMixin, RequestQuery):
+
+    _name = 'fullarchive_counts'
+    _endpoint = '/tweets/search/fullarchive/production/counts'
+    _results_path = 'results'
+    _fetch_more_path = 'next'
+
+    def pickle(self):
+        return
+
+    def save(self):
+        return
+
+
 class FriendsList(RequestQuery):
 
     _name = 'friends_list'
@@ -252,6 +436,100 @@ class RateLimitStatusQuery(RequestQuery):
     _endpoint = '/application/rate_limit_status'
 
 
+def matches_search_term(term, tweet):
+    """
+    Checks if a tweet matches a single term search, such as "@handle",
+    "to:handle", "from:handle", "#hashtag", "$symbol" or a plain word. Retweeted
+    and quoted statuses are checked too.
+
+    Args:
+        term (str): Search term
+        tweet (dict): Tweet
+
+    Returns:
+        bool: True if the tweet matches the term
+
+    """
+    term = term.lower()
+    statuses = [tweet]
+    for key in ('retweeted_status', 'quoted_status'):
+        if tweet.get(key):
+            statuses.append(tweet[key])
+    for status in statuses:
+        entities = status.get('entities') or {}
+        reply_to = (status.get('in_reply_to_screen_name') or '').lower()
+        if term.startswith('to:'):
+            matched = reply_to == term[3:]
+        elif term.startswith('from:'):
+            author = status.get('user', {}).get('screen_name', '')
+            matched = author.lower() == term[5:]
+        elif term.startswith('@'):
+            mentions = entities.get('user_mentions', [])
+            screen_names = {m['screen_name'].lower() for m in mentions}
+            matched = term[1:] in screen_names or reply_to == term[1:]
+        elif term.startswith('#'):
+            hashtags = entities.get('hashtags', [])
+            matched = term[1:] in {h['text'].lower() for h in hashtags}
+        elif term.startswith('$'):
+            symbols = entities.get('symbols', [])
+            matched = term[1:] in {s['text'].lower() for s in symbols}
+        else:
+            text = status.get('full_text') or status.get('text') or ''
+            matched = term in text.lower()
+        if matched:
+            return True
+    return False
+
+
+def coalesce_queries(queries, max_length=500):
+    """
+    Merges compatible standard search queries into combined OR queries, no
+    longer than the given max query length. Queries are compatible if they
+    search for a single term with otherwise identical arguments.
+
+    Args:
+        queries (list[RequestQuery]): Queries
+        max_length (int): Max length of combined search query
+
+    Returns:
+        list[RequestQuery]: Queries, with compatible queries combined
+
+    """
+    coalesced = []
+    groups = {}
+    for query in queries:
+        term = query.kwargs.get('q') or ''
+        if type(query) != StandardSearchQuery or not SEARCH_TERM.match(term):
+            coalesced.append(query)
+            continue
+        other_kwargs = {
+            k: v for k, v in query.kwargs.items() if k not in ('q', 'since_id')
+        }
+        key = json.dumps(other_kwargs, sort_keys=True, default=str)
+        groups.setdefault(key, []).append(query)
+
+    for group in groups.values():
+        batch = []
+        length = 0
+        for query in sorted(group, key=lambda q: q.kwargs['q']):
+            term_length = len(query.kwargs['q']) + len(' OR ')
+            if batch and length + term_length > max_length + len(' OR '):
+                coalesced.append(_combine(batch))
+                batch = []
+                length = 0
+            batch.append(query)
+            length += term_length
+        if batch:
+            coalesced.append(_combine(batch))
+    return coalesced
+
+
+def _combine(queries):
+    if len(queries) == 1:
+        return queries[0]
+    return CoalescedSearchQuery(queries)
+
+
 if __name__ == '__main__':
     query = StandardSearchQuery(
         q='@slpng_giants',
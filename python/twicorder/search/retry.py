@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+from twicorder.config import Config
+from twicorder.utils import Singleton
+
+
+class RequestFailed(Exception):
+    """
+    Raised when a request fails in a way that retrying won't fix, such as a
+    client error other than a rate limit. The query should be abandoned.
+    """
+
+    def __init__(self, message, status_code=None):
+        super(RequestFailed, self).__init__(message)
+        self.status_code = status_code
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when failed requests are retried. Uses exponential
+    backoff with full jitter, and honours "Retry-After" and rate limit reset
+    headers when the API provides them.
+    """
+
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_attempts=5, base_delay=1., max_delay=120.):
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    def __repr__(self):
+        representation = (
+            f'RetryPolicy(max_attempts={self.max_attempts}, '
+            f'base_delay={self.base_delay}, max_delay={self.max_delay})'
+        )
+        return representation
+
+    @classmethod
+    def from_config(cls):
+        """
+        Creates a retry policy from the "retry" section of the config file.
+
+        Returns:
+            RetryPolicy: Retry policy
+
+        """
+        return cls(**(Config.get().get('retry') or {}))
+
+    @property
+    def max_attempts(self):
+        return self._max_attempts
+
+    @property
+    def base_delay(self):
+        return self._base_delay
+
+    @property
+    def max_delay(self):
+        return self._max_delay
+
+    def should_retry(self, attempts, response=None):
+        """
+        Checks if a failed request should be retried.
+
+        Args:
+            attempts (int): Number of attempts made so far
+            response (requests.Response): Response, None if the request raised
+
+        Returns:
+            bool: True if the request should be retried
+
+        """
+        if attempts >= self.max_attempts:
+            return False
+        if response is None:
+            return True
+        return response.status_code in self.retry_statuses
+
+    def is_terminal(self, response):
+        """
+        Checks if a failed request can never succeed as it stands, such as
+        when the API rejects the query or the credential.
+
+        Args:
+            response (requests.Response): Response, None if the request raised
+
+        Returns:
+            bool: True for client errors other than rate limits
+
+        """
+        if response is None:
+            return False
+        status_code = response.status_code
+        if status_code in self.retry_statuses:
+            return False
+        return 400 <= status_code < 500
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Reads the time the API asks us to wait before retrying, either from the
+        "Retry-After" header or, for rate limited responses, from the rate
+        limit reset time.
+
+        Args:
+            response (requests.Response): Response
+
+        Returns:
+            float: Seconds to wait, None if the API gave no indication
+
+        """
+        if response is None:
+            return
+        headers = response.headers
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.)
+            except ValueError:
+                pass
+            try:
+                retry_date = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                pass
+            else:
+                return max(retry_date.timestamp() - time.time(), 0.)
+        reset = headers.get('x-rate-limit-reset')
+        if response.status_code == 429 and reset:
+            return max(float(reset) - time.time(), 0.) + 2
+        return
+
+    def delay(self, attempts, response=None):
+        """
+        Time to wait before the next attempt.
+
+        Args:
+            attempts (int): Number of attempts made so far
+            response (requests.Response): Response, None if the request raised
+
+        Returns:
+            float: Seconds to wait
+
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempts)
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for an API endpoint. Opens after a number of consecutive
+    failures, stopping dispatch to the endpoint. Once the recovery timeout has
+    passed a single trial request is let through, closing the breaker again if
+    it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=300.):
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f'CircuitBreaker(state={self.state}, failures={self._failures})'
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def cooldown(self):
+        """
+        Time until the breaker lets a trial request through.
+
+        Returns:
+            float: Seconds, 0 if requests are allowed
+
+        """
+        if self._state == self.CLOSED:
+            return 0.
+        elapsed = time.time() - self._opened_at
+        return max(self._recovery_timeout - elapsed, 0.)
+
+    def allow(self):
+        """
+        Checks if a request may be dispatched to the endpoint.
+
+        Returns:
+            bool: True if the request may be dispatched
+
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and not self.cooldown:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._state == self.HALF_OPEN or
+                    self._failures >= self._failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.time()
+
+
+class CircuitBreakerCentral(object, metaclass=Singleton):
+    """
+    Keeps a circuit breaker per endpoint.
+    """
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = Lock()
+
+    def get(self, endpoint):
+        """
+        Retrieves the circuit breaker for the given endpoint, creating it from
+        the "circuit_breaker" section of the config file if needed.
+
+        Args:
+            endpoint (str): API endpoint
+
+        Returns:
+            CircuitBreaker: Circuit breaker
+
+        """
+        with self._lock:
+            if endpoint not in self._breakers:
+                settings = Config.get().get('circuit_breaker') or {}
+                self._breakers[endpoint] = CircuitBreaker(**settings)
+            return self._breakers[endpoint]
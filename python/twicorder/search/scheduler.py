@@ -6,30 +6,78 @@ import time
 
 from threading import Thread
 
+from twicorder.config import Config
+from twicorder.search.coordination import Coordinator
 from twicorder.search.exchange import QueryExchange
+from twicorder.search.metrics import MetricsRegistry
 from twicorder.search.tasks import TaskManager
 from twicorder.search.queries import RequestQuery
 from twicorder.search.queries import request_queries
+from twicorder.search.tuning import FrequencyTuner
+from twicorder.utils import TwiLogger
 
 
 class WorkerThread(Thread):
 
-    def setup(self, func, tasks, query_exchange):
+    def setup(self, func, task_manager, query_exchange, tuner=None,
+              coordinator=None):
         self._running = False
+        self._coordinator = coordinator
         self._func = func
-        self._tasks = tasks
+        self._task_manager = task_manager
+        self._tasks = task_manager.tasks
         self._query_exchange = query_exchange
+        self._tuner = tuner
+        self._last_report = None
 
     def stop(self):
         self._running = False
 
+    def retune(self):
+        """
+        Retunes task frequencies from their observed yield, logging the budget
+        allocation report once an hour.
+        """
+        if not self._tuner or not self._tuner.enabled:
+            return
+        self._tuner.retune(self._tasks)
+        now = time.time()
+        if self._last_report is None or now - self._last_report >= 3600:
+            TwiLogger.info(self._tuner.report(self._tasks))
+            self._last_report = now
+
+    def reload_tasks(self):
+        """
+        Applies changes made to tasks.yaml since it was last read, if watching
+        the file is enabled in the config file.
+        """
+        if not Config.get().get('watch_tasks', True):
+            return
+        diff = self._task_manager.reload()
+        if not diff:
+            return
+        if self._tuner and diff.added:
+            self._tuner.load(diff.added)
+        TwiLogger.info(f'Reloaded tasks: {diff}')
+
     def run(self):
         self._running = True
         while self._running:
-            for task in self._tasks:
-                if not task.due:
-                    continue
-                self._query_exchange.add(self._func(task))
+            try:
+                self.reload_tasks()
+            except Exception:
+                TwiLogger.exception('Unable to reload tasks: ')
+            try:
+                self.retune()
+            except Exception:
+                TwiLogger.exception('Unable to retune task frequencies: ')
+            due_tasks = [task for task in self._tasks if task.due]
+            if self._coordinator:
+                # Leave tasks already run by another scheduler within their
+                # interval.
+                due_tasks = self._coordinator.claim(due_tasks)
+            for query in self._func(due_tasks):
+                self._query_exchange.add(query)
             # Sleep 1 minute, then wake up and check if any queries are due to
             # run.
             time.sleep(60)
@@ -41,6 +89,8 @@ class Scheduler(object):
         self._task_manager = TaskManager()
         self._query_exchange = QueryExchange()
         self._worker_thread = WorkerThread()
+        self._tuner = FrequencyTuner()
+        self._coordinator = None
         self._query_types = {}
 
     @property
@@ -53,14 +103,30 @@ class Scheduler(object):
 
     @property
     def query_exchange(self):
-        return self._query_exchange
+        """
+        Where queries are sent to be run. The coordinator's shared work queue
+        if distributed search is enabled, otherwise the local query exchange.
+
+        Returns:
+            QueryExchange|Coordinator: Query exchange
+
+        """
+        return self._coordinator or self._query_exchange
+
+    @property
+    def coordinator(self):
+        return self._coordinator
+
+    @property
+    def tuner(self):
+        return self._tuner
 
     @property
     def query_types(self):
         if self._query_types:
             return self._query_types
         for name, item in inspect.getmembers(request_queries, inspect.isclass):
-            if item == RequestQuery:
+            if item in (RequestQuery, request_queries.CoalescedSearchQuery):
                 continue
             elif issubclass(item, RequestQuery):
                 self._query_types[item._name] = item
@@ -70,16 +136,45 @@ class Scheduler(object):
         self._worker_thread.stop()
 
     def run(self):
+        MetricsRegistry().serve()
+        if Coordinator.enabled():
+            self._coordinator = Coordinator(self.query_types)
+            self._coordinator.start()
+        self.query_exchange.restore(self.query_types)
         self._worker_thread.setup(
-            func=self.cast_query,
-            tasks=self.tasks,
-            query_exchange=self.query_exchange
+            func=self.cast_queries,
+            task_manager=self.task_manager,
+            query_exchange=self.query_exchange,
+            tuner=self.tuner,
+            coordinator=self.coordinator
         )
         self._worker_thread.start()
 
+    def cast_queries(self, tasks):
+        """
+        Casts queries for the given tasks, coalescing compatible search
+        queries into combined queries if enabled in the config file.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        Returns:
+            list[RequestQuery]: Queries
+
+        """
+        queries = [self.cast_query(task) for task in tasks]
+        settings = Config.get().get('coalesce_search') or {}
+        if not settings.get('enabled'):
+            return queries
+        return request_queries.coalesce_queries(
+            queries,
+            max_length=settings.get('max_query_length') or 500
+        )
+
     def cast_query(self, task):
         query_object = self.query_types[task.name]
         query = query_object(task.output, **task.kwargs)
+        query.task = task
         return query
 
 
@@ -1,22 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
 import os
 import time
 import yaml
 
-from twicorder.constants import CONFIG_DIR
+from twicorder.config import Config
+from twicorder.utils import TwiLogger
 
 
 class Task(object):
 
-    def __init__(self, name, frequency=15, output=None, **kwargs):
+    def __init__(self, name, frequency=15, output=None, min_frequency=None,
+                 max_frequency=None, **kwargs):
         self._name = name
         self._frequency = frequency
         self._output = output
+        self._min_frequency = min_frequency
+        self._max_frequency = max_frequency
         self._kwargs = kwargs
 
         self._last_run = None
+        self._tuned_frequency = None
+        self._yield_rate = None
+        self._last_yield = None
+        self._runs = 0
 
     def __eq__(self, other):
         return type(self) == type(other) and self.__dict__ == other.__dict__
@@ -26,20 +36,83 @@ class Task(object):
             f'Task('
             f'name={repr(self.name)}, '
             f'frequency={repr(self.frequency)}, '
-            f'multipart={self.multipart}, '
             f'kwargs={str(self.kwargs)}'
             f')'
         )
         return string
 
+    @property
+    def uid(self):
+        """
+        Stable identifier for the task, derived from its name, output and
+        query keyword arguments.
+
+        Returns:
+            str: Task hash
+
+        """
+        hash_str = json.dumps(
+            [self.name, self.output, self.kwargs],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.blake2s(hash_str.encode()).hexdigest()
+
     @property
     def name(self):
         return self._name
 
     @property
     def frequency(self):
+        """
+        Minutes between each run of the task. Tuned frequency if the task has
+        been tuned by the scheduler, otherwise the configured frequency.
+
+        Returns:
+            float: Minutes
+
+        """
+        return self._tuned_frequency or self._frequency
+
+    @property
+    def base_frequency(self):
+        """
+        Frequency configured for the task in tasks.yaml.
+
+        Returns:
+            float: Minutes
+
+        """
         return self._frequency
 
+    @property
+    def min_frequency(self):
+        """
+        Shortest interval the frequency may be tuned to.
+
+        Returns:
+            float: Minutes
+
+        """
+        if self._min_frequency:
+            return self._min_frequency
+        settings = Config.get().get('adaptive_frequency') or {}
+        return min(settings.get('min_frequency') or 15, self._frequency)
+
+    @property
+    def max_frequency(self):
+        """
+        Longest interval the frequency may be tuned to.
+
+        Returns:
+            float: Minutes
+
+        """
+        if self._max_frequency:
+            return self._max_frequency
+        settings = Config.get().get('adaptive_frequency') or {}
+        return max(settings.get('max_frequency') or 1440, self._frequency)
+
     @property
     def output(self):
         return self._output
@@ -48,6 +121,21 @@ class Task(object):
     def kwargs(self):
         return self._kwargs
 
+    @property
+    def yield_rate(self):
+        """
+        Observed rate of new tweets for the task.
+
+        Returns:
+            float: New tweets per minute, None until measured
+
+        """
+        return self._yield_rate
+
+    @property
+    def runs(self):
+        return self._runs
+
     @property
     def due(self):
         if self._last_run is None:
@@ -58,39 +146,269 @@ class Task(object):
             return True
         return False
 
+    @property
+    def settings(self):
+        """
+        Scheduling settings of the task, which may change without changing
+        the task's identity.
+
+        Returns:
+            tuple: Frequency, min frequency and max frequency
+
+        """
+        return self._frequency, self._min_frequency, self._max_frequency
+
+    def update(self, other):
+        """
+        Takes on the scheduling settings of another definition of the same
+        task, keeping the task's timing and tuning state.
+
+        Args:
+            other (Task): Task with updated settings
+
+        """
+        self._frequency, self._min_frequency, self._max_frequency = (
+            other.settings
+        )
+        if self._tuned_frequency:
+            self.tune(self._tuned_frequency)
+
+    def delay_first_run(self, seconds):
+        """
+        Postpones the first run of the task, which otherwise is due
+        immediately.
+
+        Args:
+            seconds (float): Delay in seconds
+
+        """
+        if self._last_run is None:
+            self._last_run = time.time() - self.frequency * 60 + seconds
+
+    def tune(self, frequency):
+        """
+        Sets the frequency of the task, kept within its min/max bounds.
+
+        Args:
+            frequency (float): Minutes between each run
+
+        """
+        frequency = max(frequency, self.min_frequency)
+        frequency = min(frequency, self.max_frequency)
+        self._tuned_frequency = frequency
+
+    def record_yield(self, count, smoothing=.3):
+        """
+        Records the number of new tweets found by a completed run of the task,
+        updating the exponentially weighted average arrival rate.
+
+        Args:
+            count (int): Number of new tweets, after duplicates are removed
+            smoothing (float): Weight of the latest observation
+
+        """
+        now = time.time()
+        if self._last_yield is not None:
+            minutes = max((now - self._last_yield) / 60, 1.)
+            observed = count / minutes
+            if self._yield_rate is None:
+                self._yield_rate = observed
+            else:
+                self._yield_rate = (
+                    smoothing * observed + (1 - smoothing) * self._yield_rate
+                )
+        self._last_yield = now
+        self._runs += 1
+
+    def get_stats(self):
+        """
+        Tuning state of the task, for storing between sessions.
+
+        Returns:
+            tuple: Yield rate, tuned frequency, time of last yield and runs
+
+        """
+        stats = (
+            self._yield_rate,
+            self._tuned_frequency,
+            self._last_yield,
+            self._runs
+        )
+        return stats
+
+    def set_stats(self, yield_rate, frequency, last_yield, runs):
+        """
+        Restores the tuning state of the task from a previous session.
+
+        Args:
+            yield_rate (float): New tweets per minute
+            frequency (float): Tuned frequency
+            last_yield (float): Time of last yield
+            runs (int): Number of completed runs
+
+        """
+        self._yield_rate = yield_rate
+        self._last_yield = last_yield
+        self._runs = runs
+        if frequency:
+            self.tune(frequency)
+
+
+class TaskDiff(object):
+    """
+    Differences between two task lists, with tasks matched by their hash.
+    """
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        representation = (
+            f'TaskDiff(added={len(self.added)}, removed={len(self.removed)}, '
+            f'changed={len(self.changed)})'
+        )
+        return representation
+
 
 class TaskManager(object):
+    """
+    Reads tasks from tasks.yaml and keeps them in sync with the file, applying
+    changes to the file to the live task list.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._loaded = False
+        self._stamp = None
+
+    @property
+    def path(self):
+        return os.path.join(Config.get()['config_dir'], 'tasks.yaml')
+
+    def stamp(self):
+        """
+        Modification time and size of tasks.yaml, used to detect changes.
 
-    _tasks = []
+        Returns:
+            tuple: Stamp, None if the file is missing
 
-    @classmethod
-    def load(cls):
         """
-        Reading tasks from yaml file and parsing to a dictionary.
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self):
+        """
+        Reading tasks from yaml file and parsing to a list of tasks. Tasks
+        defined more than once are only included once.
+
+        Returns:
+            list[Task]: Tasks
+
         """
-        cls._tasks = []
-        tasks_list = os.path.join(CONFIG_DIR, 'tasks.yaml')
-        with open(tasks_list, 'r') as stream:
-            raw_tasks = yaml.load(stream)
-        for query, tasks in raw_tasks.items():
-            for raw_task in tasks or []:
+        # The C loader, if available, parses large task lists several times
+        # faster.
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        with open(self.path, 'r') as stream:
+            raw_tasks = yaml.load(stream, Loader=loader) or {}
+        tasks = {}
+        for query, raw_task_list in raw_tasks.items():
+            for raw_task in raw_task_list or []:
                 task = Task(
                     name=query,
                     frequency=raw_task.get('frequency') or 15,
                     output=raw_task.get('output'),
+                    min_frequency=raw_task.get('min_frequency'),
+                    max_frequency=raw_task.get('max_frequency'),
                     **raw_task.get('kwargs') or {}
                 )
-                cls._tasks.append(task)
+                tasks.setdefault(task.uid, task)
+        return list(tasks.values())
+
+    def load(self):
+        """
+        Loads tasks from the yaml file, replacing any loaded tasks.
+        """
+        self._stamp = self.stamp()
+        self._tasks[:] = self.read()
+        self._loaded = True
+
+    def diff(self, tasks):
+        """
+        Compares the loaded tasks with the given tasks.
+
+        Args:
+            tasks (list[Task]): New task list
+
+        Returns:
+            TaskDiff: Tasks added and removed, and loaded tasks whose
+                scheduling settings changed, paired with their new definition
+
+        """
+        current = {t.uid: t for t in self._tasks}
+        new = {t.uid: t for t in tasks}
+        diff = TaskDiff(
+            added=[t for uid, t in new.items() if uid not in current],
+            removed=[t for uid, t in current.items() if uid not in new],
+            changed=[
+                (t, new[uid]) for uid, t in current.items()
+                if uid in new and t.settings != new[uid].settings
+            ]
+        )
+        return diff
+
+    def reload(self, spread=60.):
+        """
+        Re-reads the yaml file if it has changed since it was last read, and
+        applies the differences to the live task list. Unchanged tasks are
+        kept as they are, along with their timing and tuning state, and the
+        first runs of added tasks are spread out so a large deployment does
+        not flood the query exchange.
+
+        Args:
+            spread (float): Seconds to spread the first runs of added tasks
+                over
+
+        Returns:
+            TaskDiff: Applied differences, None if the file has not changed
+
+        """
+        stamp = self.stamp()
+        if not self._loaded or stamp is None or stamp == self._stamp:
+            return
+        try:
+            tasks = self.read()
+        except (OSError, yaml.YAMLError, AttributeError, TypeError):
+            TwiLogger.exception(f'Unable to reload tasks from "{self.path}": ')
+            return
+        self._stamp = stamp
+        diff = self.diff(tasks)
+        if not diff:
+            return diff
+        for task, new_task in diff.changed:
+            task.update(new_task)
+        for idx, task in enumerate(diff.added):
+            task.delay_first_run(spread * idx / len(diff.added))
+        removed = {t.uid for t in diff.removed}
+        kept = [t for t in self._tasks if t.uid not in removed]
+        self._tasks[:] = kept + diff.added
+        return diff
 
     @property
     def tasks(self):
-        if not self._tasks:
+        if not self._loaded:
             self.load()
         return self._tasks
 
 
 if __name__ == '__main__':
-    import json
     task_collector = TaskManager()
     for task in task_collector.tasks:
         print(task)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+
+from collections import defaultdict
+from threading import Lock
+
+from twicorder.config import Config
+from twicorder.utils import AppData
+
+
+class FrequencyTuner(object):
+    """
+    Retunes task frequencies from the observed rate of new tweets per task.
+
+    Tasks sharing a query type share that endpoint's rate limit budget. The
+    budget is taken to be the number of runs per minute the configured
+    frequencies add up to, and is redistributed so that each task is polled in
+    proportion to the square root of its arrival rate. This keeps busy tasks
+    from falling behind without starving quiet ones, while the total number of
+    runs, and so the budget spent, stays the same. Tuned frequencies are kept
+    within each task's min/max bounds.
+    """
+
+    # Arrival rate assumed for tasks that have yielded nothing, one tweet a
+    # week, so quiet tasks keep a small share of the budget.
+    _min_rate = 1 / (7 * 24 * 60)
+
+    def __init__(self):
+        self._loaded = False
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        """
+        Whether adaptive frequencies are switched on in the config file.
+
+        Returns:
+            bool: True if enabled
+
+        """
+        settings = Config.get().get('adaptive_frequency') or {}
+        return bool(settings.get('enabled'))
+
+    def load(self, tasks):
+        """
+        Restores the tuning state of tasks from a previous session.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        """
+        stats = AppData().get_task_stats()
+        for task in tasks:
+            if task.uid in stats:
+                task.set_stats(*stats[task.uid])
+        self._loaded = True
+
+    def save(self, tasks):
+        """
+        Stores the tuning state of tasks.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        """
+        AppData().set_task_stats([(t.uid, *t.get_stats()) for t in tasks])
+
+    @staticmethod
+    def group(tasks):
+        """
+        Groups tasks by query type.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        Returns:
+            dict: Tasks by query name
+
+        """
+        groups = defaultdict(list)
+        for task in tasks:
+            groups[task.name].append(task)
+        return groups
+
+    def retune(self, tasks):
+        """
+        Retunes the frequency of all tasks with a measured arrival rate.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load(tasks)
+            for group in self.group(tasks).values():
+                measured = [t for t in group if t.yield_rate is not None]
+                if not measured:
+                    continue
+                budget = sum(1 / t.base_frequency for t in measured)
+                weights = {
+                    t.uid: math.sqrt(max(t.yield_rate, self._min_rate))
+                    for t in measured
+                }
+                total_weight = sum(weights.values())
+                for task in measured:
+                    runs_per_minute = budget * weights[task.uid] / total_weight
+                    task.tune(1 / runs_per_minute)
+            self.save(tasks)
+
+    def report(self, tasks):
+        """
+        Builds a report of how the rate limit budget is allocated between
+        tasks.
+
+        Args:
+            tasks (list[Task]): Tasks
+
+        Returns:
+            str: Report
+
+        """
+        lines = []
+        header = (
+            f'{"Task":<40} {"Base":>8} {"Tuned":>8} {"Tweets/h":>9} '
+            f'{"Runs":>5} {"Budget":>7}'
+        )
+        for name, group in sorted(self.group(tasks).items()):
+            runs_per_minute = sum(1 / t.frequency for t in group)
+            lines.append('')
+            lines.append(f' {name} '.center(len(header), '='))
+            lines.append(header)
+            for task in sorted(group, key=lambda t: t.frequency):
+                label = task.output or str(task.kwargs)
+                rate = task.yield_rate
+                rate_str = f'{rate * 60:.2f}' if rate is not None else '-'
+                share = (1 / task.frequency) / runs_per_minute
+                lines.append(
+                    f'{label[:40]:<40} {task.base_frequency:>8.1f} '
+                    f'{task.frequency:>8.1f} {rate_str:>9} {task.runs:>5} '
+                    f'{share:>7.1%}'
+                )
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+    from twicorder.search.tasks import TaskManager
+    Config.setup(*sys.argv[1:3])
+    task_manager = TaskManager()
+    tuner = FrequencyTuner()
+    tuner.load(task_manager.tasks)
+    print(tuner.report(task_manager.tasks))
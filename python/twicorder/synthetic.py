@@ -0,0 +1,756 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import random
+
+from datetime import datetime, timezone
+
+from twicorder.constants import TW_TIME_FORMAT
+from twicorder.utils import write
+
+# Epoch of Twitter snowflake IDs, in milliseconds
+TWEPOCH = 1288834974657
+
+WORDS = [
+    'news', 'today', 'vote', 'people', 'data', 'world', 'great', 'time',
+    'climate', 'music', 'game', 'city', 'love', 'health', 'market', 'school',
+    'science', 'story', 'report', 'live', 'watch', 'week', 'team', 'power',
+]
+
+LANGS = ['en', 'en', 'en', 'es', 'de', 'fr', 'und']
+
+# Name, country code, country and bounding box as west, south, east, north
+PLACES = [
+    ('London', 'GB', 'United Kingdom', (-0.510, 51.286, 0.334, 51.692)),
+    ('Oslo', 'NO', 'Norway', (10.489, 59.809, 10.951, 60.135)),
+    ('New York', 'US', 'United States', (-74.026, 40.683, -73.910, 40.877)),
+    ('Berlin', 'DE', 'Germany', (13.088, 52.338, 13.761, 52.675)),
+    ('Madrid', 'ES', 'Spain', (-3.889, 40.312, -3.518, 40.643)),
+]
+
+# Length of tweet texts in the stream before they are truncated
+STREAM_TEXT_LENGTH = 140
+
+
+def snowflake(timestamp_ms, sequence=0, worker=0):
+    """
+    Builds a Twitter style snowflake ID.
+
+    Args:
+        timestamp_ms (int): Creation time in milliseconds since the epoch
+        sequence (int): Sequence number within the millisecond
+        worker (int): Worker number
+
+    Returns:
+        int: Snowflake ID
+
+    """
+    return (
+        ((timestamp_ms - TWEPOCH) << 22) |
+        ((worker & 0x3FF) << 12) |
+        (sequence & 0xFFF)
+    )
+
+
+def snowflake_to_ms(snowflake_id):
+    """
+    Reads the creation time from a snowflake ID.
+
+    Args:
+        snowflake_id (int): Snowflake ID
+
+    Returns:
+        int: Creation time in milliseconds since the epoch
+
+    """
+    return (int(snowflake_id) >> 22) + TWEPOCH
+
+
+def stable_int(text, bits=32):
+    """
+    Hashes text to an integer that stays the same between sessions.
+
+    Args:
+        text (str): Text
+        bits (int): Size of integer in bits
+
+    Returns:
+        int: Hash
+
+    """
+    digest = hashlib.blake2s(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & ((1 << bits) - 1)
+
+
+def ms_to_str(timestamp_ms):
+    stamp = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return stamp.strftime(TW_TIME_FORMAT)
+
+
+def make_user(user_id=None, screen_name=None):
+    """
+    Generates a user object. Users are deterministic, so the same ID or screen
+    name always gives the same user.
+
+    Args:
+        user_id (int): User ID
+        screen_name (str): Screen name, used if no user ID is given
+
+    Returns:
+        dict: User
+
+    """
+    if user_id is None:
+        user_id = stable_int(screen_name.lower(), bits=40)
+    user_id = int(user_id)
+    rng = random.Random(user_id)
+    screen_name = screen_name or f'user_{user_id}'
+    created_ms = TWEPOCH + rng.randrange(0, 10 * 365 * 24 * 3600 * 1000)
+    return {
+        'id': user_id,
+        'id_str': str(user_id),
+        'name': screen_name.replace('_', ' ').title(),
+        'screen_name': screen_name,
+        'location': rng.choice(['', 'London', 'Oslo', 'New York', 'Berlin']),
+        'description': ' '.join(rng.sample(WORDS, 5)),
+        'url': None,
+        'entities': {'description': {'urls': []}},
+        'protected': False,
+        'followers_count': rng.randrange(0, 100000),
+        'friends_count': rng.randrange(0, 5000),
+        'listed_count': rng.randrange(0, 500),
+        'created_at': ms_to_str(created_ms),
+        'favourites_count': rng.randrange(0, 50000),
+        'utc_offset': None,
+        'time_zone': None,
+        'geo_enabled': rng.random() < 0.2,
+        'verified': rng.random() < 0.05,
+        'statuses_count': rng.randrange(1, 100000),
+        'lang': None,
+        'contributors_enabled': False,
+        'is_translator': False,
+        'profile_image_url_https': (
+            f'https://pbs.twimg.com/profile_images/{user_id}/normal.jpg'
+        ),
+        'default_profile': True,
+        'default_profile_image': False,
+    }
+
+
+def make_tweet(tweet_id, term=None, search=False):
+    """
+    Generates a tweet in extended tweet mode. Tweets are deterministic, so the
+    same ID always gives the same tweet. If a search term is given, the tweet
+    is made to match it, the way the search API would.
+
+    Args:
+        tweet_id (int): Tweet ID
+        term (str): Single search term, such as "@handle", "to:handle",
+            "from:handle", "#hashtag", "$symbol" or a plain word
+        search (bool): Add search metadata
+
+    Returns:
+        dict: Tweet
+
+    """
+    tweet_id = int(tweet_id)
+    rng = random.Random(tweet_id)
+    term = term or ''
+    words = rng.sample(WORDS, rng.randrange(4, 10))
+    author = make_user(user_id=rng.randrange(1, 50000))
+    reply_to = None
+    hashtags = []
+    symbols = []
+    mentions = []
+
+    if term.startswith('from:'):
+        author = make_user(screen_name=term[5:])
+    elif term.startswith('to:'):
+        reply_to = make_user(screen_name=term[3:])
+    elif term.startswith('@'):
+        mentions.append(make_user(screen_name=term[1:]))
+    elif term.startswith('#'):
+        hashtags.append(term[1:])
+    elif term.startswith('$'):
+        symbols.append(term[1:].upper())
+    elif term:
+        words.insert(rng.randrange(len(words) + 1), term)
+    if rng.random() < 0.3:
+        mentions.append(make_user(user_id=rng.randrange(1, 50000)))
+    if rng.random() < 0.3:
+        hashtags.append(rng.choice(WORDS))
+
+    entities = {
+        'hashtags': [],
+        'symbols': [],
+        'user_mentions': [],
+        'urls': [],
+    }
+    text = ''
+
+    def append(token):
+        nonlocal text
+        if text:
+            text += ' '
+        start = len(text)
+        text += token
+        return [start, len(text)]
+
+    if reply_to:
+        mention = {
+            'screen_name': reply_to['screen_name'],
+            'name': reply_to['name'],
+            'id': reply_to['id'],
+            'id_str': reply_to['id_str'],
+        }
+        mention['indices'] = append(f'@{reply_to["screen_name"]}')
+        entities['user_mentions'].append(mention)
+    for word in words:
+        append(word)
+    for user in mentions:
+        mention = {
+            'screen_name': user['screen_name'],
+            'name': user['name'],
+            'id': user['id'],
+            'id_str': user['id_str'],
+        }
+        mention['indices'] = append(f'@{user["screen_name"]}')
+        entities['user_mentions'].append(mention)
+    for hashtag in hashtags:
+        indices = append(f'#{hashtag}')
+        entities['hashtags'].append({'text': hashtag, 'indices': indices})
+    for symbol in symbols:
+        indices = append(f'${symbol}')
+        entities['symbols'].append({'text': symbol, 'indices': indices})
+
+    tweet = {
+        'created_at': ms_to_str(snowflake_to_ms(tweet_id)),
+        'id': tweet_id,
+        'id_str': str(tweet_id),
+        'full_text': text,
+        'truncated': False,
+        'display_text_range': [0, len(text)],
+        'entities': entities,
+        'source': '<a href="https://example.com" rel="nofollow">Synthetic</a>',
+        'in_reply_to_status_id': None,
+        'in_reply_to_status_id_str': None,
+        'in_reply_to_user_id': reply_to['id'] if reply_to else None,
+        'in_reply_to_user_id_str': reply_to['id_str'] if reply_to else None,
+        'in_reply_to_screen_name': (
+            reply_to['screen_name'] if reply_to else None
+        ),
+        'user': author,
+        'geo': None,
+        'coordinates': None,
+        'place': None,
+        'contributors': None,
+        'is_quote_status': False,
+        'retweet_count': rng.randrange(0, 1000),
+        'favorite_count': rng.randrange(0, 5000),
+        'favorited': False,
+        'retweeted': False,
+        'lang': rng.choice(LANGS),
+    }
+    if search:
+        tweet['metadata'] = {
+            'iso_language_code': tweet['lang'],
+            'result_type': 'recent',
+        }
+    return tweet
+
+
+def make_place(place_id, exact=False):
+    """
+    Generates a place, with the location fields of a geotagged tweet.
+    Places are deterministic, so the same ID always gives the same place.
+
+    Args:
+        place_id (int): Seed for the place
+        exact (bool): Add exact coordinates within the place
+
+    Returns:
+        dict: Fields to update the tweet with
+
+    """
+    rng = random.Random(place_id)
+    name, country_code, country, (west, south, east, north) = rng.choice(
+        PLACES
+    )
+    place = {
+        'id': f'{stable_int(name, bits=64):016x}',
+        'url': f'https://api.twitter.com/1.1/geo/id/{name.lower()}.json',
+        'place_type': 'city',
+        'name': name,
+        'full_name': f'{name}, {country_code}',
+        'country_code': country_code,
+        'country': country,
+        'bounding_box': {
+            'type': 'Polygon',
+            'coordinates': [[
+                [west, south], [west, north], [east, north], [east, south],
+            ]],
+        },
+        'attributes': {},
+    }
+    fields = {'place': place, 'geo': None, 'coordinates': None}
+    if exact:
+        longitude = round(rng.uniform(west, east), 6)
+        latitude = round(rng.uniform(south, north), 6)
+        fields['geo'] = {'type': 'Point', 'coordinates': [latitude, longitude]}
+        fields['coordinates'] = {
+            'type': 'Point', 'coordinates': [longitude, latitude]
+        }
+    return fields
+
+
+def make_media(media_id, tweet, indices, photo=1):
+    """
+    Generates a photo entity for the given tweet.
+
+    Args:
+        media_id (int): Media ID
+        tweet (dict): Tweet the photo is attached to
+        indices (list[int]): Position of the photo's link in the tweet text
+        photo (int): Number of the photo within the tweet, from 1
+
+    Returns:
+        dict: Media entity
+
+    """
+    code = f'{stable_int(str(media_id), bits=48):x}'
+    screen_name = tweet['user']['screen_name']
+    return {
+        'id': media_id,
+        'id_str': str(media_id),
+        'indices': indices,
+        'media_url': f'http://pbs.twimg.com/media/{code}.jpg',
+        'media_url_https': f'https://pbs.twimg.com/media/{code}.jpg',
+        'url': f'https://t.co/{code}',
+        'display_url': f'pic.twitter.com/{code}',
+        'expanded_url': (
+            f'https://twitter.com/{screen_name}/status/{tweet["id"]}/photo/'
+            f'{photo}'
+        ),
+        'type': 'photo',
+        'sizes': {
+            'thumb': {'w': 150, 'h': 150, 'resize': 'crop'},
+            'small': {'w': 680, 'h': 510, 'resize': 'fit'},
+            'medium': {'w': 1200, 'h': 900, 'resize': 'fit'},
+            'large': {'w': 2048, 'h': 1536, 'resize': 'fit'},
+        },
+    }
+
+
+def to_stream(tweet):
+    """
+    Converts a tweet from the shape returned by the REST API in extended mode
+    to the shape delivered by the streaming API, the reverse of
+    utils.stream_to_search. Texts over 140 characters, and tweets with
+    photos, are truncated, with the full text and entities moved to
+    "extended_tweet".
+
+    Args:
+        tweet (dict): Tweet in extended mode
+
+    Returns:
+        dict: Tweet as streamed
+
+    """
+    tweet = dict(tweet)
+    tweet.pop('metadata', None)
+    full_text = tweet.pop('full_text')
+    display_text_range = tweet.pop('display_text_range')
+    extended_entities = tweet.pop('extended_entities', None)
+    entities = tweet['entities']
+    if len(full_text) > STREAM_TEXT_LENGTH or extended_entities:
+        tweet['text'] = full_text[:STREAM_TEXT_LENGTH - 1] + '\u2026'
+        tweet['truncated'] = True
+        tweet['entities'] = {
+            key: [e for e in items if e['indices'][1] < STREAM_TEXT_LENGTH]
+            for key, items in entities.items() if key != 'media'
+        }
+        extended_tweet = {
+            'full_text': full_text,
+            'display_text_range': display_text_range,
+            'entities': entities,
+        }
+        if extended_entities:
+            extended_tweet['extended_entities'] = extended_entities
+        tweet['extended_tweet'] = extended_tweet
+    else:
+        tweet['text'] = full_text
+        if display_text_range != [0, len(full_text)]:
+            tweet['display_text_range'] = display_text_range
+    for key in ('retweeted_status', 'quoted_status'):
+        if tweet.get(key):
+            tweet[key] = to_stream(tweet[key])
+    tweet['timestamp_ms'] = str(snowflake_to_ms(tweet['id']))
+    tweet['quote_count'] = 0
+    tweet['reply_count'] = 0
+    tweet['filter_level'] = 'low'
+    return tweet
+
+
+def _append_text(tweet, token):
+    """
+    Appends a token to the text of a tweet.
+
+    Args:
+        tweet (dict): Tweet in extended mode
+        token (str): Token
+
+    Returns:
+        list[int]: Indices of the token in the text
+
+    """
+    start = len(tweet['full_text']) + 1
+    tweet['full_text'] += ' ' + token
+    return [start, start + len(token)]
+
+
+class TweetCorpus(object):
+    """
+    Generates a realistic corpus of raw tweets, with retweets, quotes, long
+    texts, photos, places and mentions, in the shapes delivered by the
+    streaming API and returned by the REST API. Tweets are deterministic for
+    a given seed, so the same corpus can be written again to compare runs.
+
+    The corpus is written in the layouts the exporter reads endpoints from:
+    stream files in "stream", and user timelines in
+    "<search_dir>/<account>/timeline".
+    """
+
+    def __init__(self, start_ms=1577836800000, rate=1., retweet_rate=.2,
+                 quote_rate=.1, long_rate=.2, media_rate=.1, place_rate=.05,
+                 duplicate_rate=.05, seed=0):
+        self._start_ms = int(start_ms)
+        self._rate = rate
+        self._retweet_rate = retweet_rate
+        self._quote_rate = quote_rate
+        self._long_rate = long_rate
+        self._media_rate = media_rate
+        self._place_rate = place_rate
+        self._duplicate_rate = duplicate_rate
+        self._seed = seed
+
+    def tweet(self, tweet_id, term=None, search=False, nested=True):
+        """
+        Generates a tweet in extended mode, the shape returned by the REST
+        API.
+
+        Args:
+            tweet_id (int): Tweet ID
+            term (str): Search term the tweet matches, see make_tweet()
+            search (bool): Add search metadata
+            nested (bool): Allow the tweet to be a retweet or quote
+
+        Returns:
+            dict: Tweet
+
+        """
+        rng = random.Random(f'{self._seed}:{tweet_id}')
+        tweet = make_tweet(tweet_id, term, search=search)
+        kind = rng.random() if nested else 1.
+        if kind < self._retweet_rate + self._quote_rate:
+            original = self.tweet(
+                self._original_id(rng, tweet_id), search=search, nested=False
+            )
+            if kind < self._retweet_rate:
+                return self._retweet(tweet, original)
+            self._quote(tweet, original)
+        if rng.random() < self._long_rate:
+            while len(tweet['full_text']) <= STREAM_TEXT_LENGTH + 20:
+                _append_text(tweet, rng.choice(WORDS))
+            tweet['display_text_range'] = [0, len(tweet['full_text'])]
+        if rng.random() < self._media_rate:
+            self._add_photos(tweet, rng)
+        if rng.random() < self._place_rate:
+            tweet.update(make_place(tweet_id, exact=rng.random() < .5))
+        return tweet
+
+    @staticmethod
+    def _original_id(rng, tweet_id):
+        """
+        ID of an older tweet to retweet or quote.
+        """
+        week_ms = 7 * 24 * 3600 * 1000
+        timestamp_ms = snowflake_to_ms(tweet_id) - rng.randrange(1, week_ms)
+        return snowflake(
+            timestamp_ms, sequence=rng.randrange(4096), worker=1023
+        )
+
+    @staticmethod
+    def _retweet(tweet, original):
+        """
+        Turns a tweet into a retweet of the original, with its text and
+        entities.
+        """
+        author = original['user']
+        prefix = f'RT @{author["screen_name"]}: '
+        shift = len(prefix)
+
+        def shifted(items):
+            return [
+                dict(i, indices=[index + shift for index in i['indices']])
+                for i in items
+            ]
+
+        entities = {
+            key: shifted(items) for key, items in original['entities'].items()
+        }
+        entities['user_mentions'].insert(0, {
+            'screen_name': author['screen_name'],
+            'name': author['name'],
+            'id': author['id'],
+            'id_str': author['id_str'],
+            'indices': [3, 4 + len(author['screen_name'])],
+        })
+        full_text = prefix + original['full_text']
+        tweet.update(
+            full_text=full_text,
+            display_text_range=[0, len(full_text)],
+            entities=entities,
+            in_reply_to_user_id=None,
+            in_reply_to_user_id_str=None,
+            in_reply_to_screen_name=None,
+            is_quote_status=original['is_quote_status'],
+            retweet_count=original['retweet_count'],
+            favorite_count=0,
+            lang=original['lang'],
+            retweeted_status=original,
+        )
+        if original.get('extended_entities'):
+            tweet['extended_entities'] = {
+                'media': shifted(original['extended_entities']['media'])
+            }
+        return tweet
+
+    @staticmethod
+    def _quote(tweet, original):
+        """
+        Makes a tweet quote the original, linking to it at the end of its
+        text.
+        """
+        screen_name = original['user']['screen_name']
+        permalink = (
+            f'https://twitter.com/{screen_name}/status/{original["id"]}'
+        )
+        url = f'https://t.co/{stable_int(permalink, bits=48):x}'
+        display_url = f'twitter.com/{screen_name}/status/\u2026'
+        tweet['entities']['urls'].append({
+            'url': url,
+            'expanded_url': permalink,
+            'display_url': display_url,
+            'indices': _append_text(tweet, url),
+        })
+        tweet.update(
+            is_quote_status=True,
+            quoted_status_id=original['id'],
+            quoted_status_id_str=original['id_str'],
+            quoted_status_permalink={
+                'url': url, 'expanded': permalink, 'display': display_url
+            },
+            quoted_status=original,
+        )
+
+    @staticmethod
+    def _add_photos(tweet, rng):
+        """
+        Attaches one to four photos to a tweet, linked at the end of its text
+        and left out of its display range.
+        """
+        media_id = snowflake(snowflake_to_ms(tweet['id']), worker=1022)
+        first = make_media(media_id, tweet, [0, 0])
+        first['indices'] = _append_text(tweet, first['url'])
+        photos = [first] + [
+            dict(
+                make_media(media_id + idx, tweet, first['indices'], idx + 1),
+                url=first['url'],
+                display_url=first['display_url'],
+            )
+            for idx in range(1, rng.randrange(1, 5))
+        ]
+        tweet['entities']['media'] = [first]
+        tweet['extended_entities'] = {'media': photos}
+
+    def stream_tweets(self, count, start=0):
+        """
+        Generates tweets as streamed, with a share of them repeating earlier
+        tweets, the way retweeted tweets are delivered more than once.
+
+        Args:
+            count (int): Number of tweets
+            start (int): Index of the first tweet
+
+        Yields:
+            dict: Tweet as streamed
+
+        """
+        stream = TweetStream('stream', self._start_ms, self._rate)
+        rng = random.Random(f'{self._seed}:stream:{start}')
+        for index in range(start, start + count):
+            if index and rng.random() < self._duplicate_rate:
+                index = rng.randrange(index)
+            yield to_stream(self.tweet(stream.tweet_id(index)))
+
+    def timeline_tweets(self, account, count, start=0):
+        """
+        Generates tweets by the given account, as returned by the user
+        timeline endpoint.
+
+        Args:
+            account (str): Screen name
+            count (int): Number of tweets
+            start (int): Index of the first tweet
+
+        Yields:
+            dict: Tweet in extended mode
+
+        """
+        stream = TweetStream(account, self._start_ms, self._rate)
+        for index in range(start, start + count):
+            yield self.tweet(stream.tweet_id(index), term=f'from:{account}')
+
+    def write(self, root, stream_files=10, accounts=(), timeline_files=2,
+              tweets_per_file=1000, compress=False, search_dir='search'):
+        """
+        Writes the corpus as raw files.
+
+        Args:
+            root (str): Raw data directory
+            stream_files (int): Number of stream files
+            accounts (list[str]): Screen names of accounts to write user
+                timelines for
+            timeline_files (int): Number of timeline files per account
+            tweets_per_file (int): Number of tweets per file
+            compress (bool): Write compressed files
+            search_dir (str): Directory for search results in the raw data
+                directory
+
+        Returns:
+            list[str]: Paths of files written
+
+        """
+        postfix = '.zip' if compress else '.txt'
+        batches = []
+        for file_idx in range(stream_files):
+            tweets = self.stream_tweets(
+                tweets_per_file, start=file_idx * tweets_per_file
+            )
+            batches.append((os.path.join(root, 'stream'), 'tweets_', tweets))
+        for account in accounts:
+            save_dir = os.path.join(root, search_dir, account, 'timeline')
+            for file_idx in range(timeline_files):
+                tweets = self.timeline_tweets(
+                    account, tweets_per_file, start=file_idx * tweets_per_file
+                )
+                batches.append((save_dir, '', tweets))
+        paths = []
+        for save_dir, prefix, tweets in batches:
+            lines = [json.dumps(t) for t in tweets]
+            marker = json.loads(lines[0])
+            stamp = datetime.strptime(marker['created_at'], TW_TIME_FORMAT)
+            filename = (
+                f'{prefix}{stamp:%Y-%m-%d_%H-%M-%S}_{marker["id"]}{postfix}'
+            )
+            file_path = os.path.join(save_dir, filename)
+            write('\n'.join(lines) + '\n', file_path, mode='w')
+            paths.append(file_path)
+        return paths
+
+
+class TweetStream(object):
+    """
+    Endless stream of tweet IDs, arriving at a steady rate from the given
+    start time onwards. IDs are snowflakes, so they sort by creation time, and
+    any tweet can be found from its index without generating the ones before
+    it.
+    """
+
+    def __init__(self, key, start_ms, rate=1.):
+        self._key = key
+        self._start_ms = int(start_ms)
+        self._rate = rate
+        self._worker = stable_int(key, bits=10)
+
+    @property
+    def key(self):
+        return self._key
+
+    def tweet_id(self, index):
+        """
+        ID of the tweet with the given index.
+
+        Args:
+            index (int): Tweet index, 0 for the first tweet in the stream
+
+        Returns:
+            int: Tweet ID
+
+        """
+        timestamp_ms = self._start_ms + int(index * 1000 / self._rate)
+        return snowflake(timestamp_ms, sequence=index, worker=self._worker)
+
+    def count(self, now_ms):
+        """
+        Number of tweets that have arrived by the given time.
+
+        Args:
+            now_ms (int): Time in milliseconds since the epoch
+
+        Returns:
+            int: Tweet count
+
+        """
+        if now_ms < self._start_ms:
+            return 0
+        return int((now_ms - self._start_ms) * self._rate / 1000) + 1
+
+    def index_at_most(self, tweet_id, now_ms):
+        """
+        Index of the newest tweet with an ID no higher than the given one.
+
+        Args:
+            tweet_id (int): Tweet ID
+            now_ms (int): Time in milliseconds since the epoch
+
+        Returns:
+            int: Tweet index, -1 if there is no such tweet
+
+        """
+        tweet_id = int(tweet_id)
+        count = self.count(now_ms)
+        elapsed = snowflake_to_ms(tweet_id) - self._start_ms
+        index = min(int(elapsed * self._rate / 1000) + 1, count - 1)
+        while index >= 0 and self.tweet_id(index) > tweet_id:
+            index -= 1
+        while index + 1 < count and self.tweet_id(index + 1) <= tweet_id:
+            index += 1
+        return index
+
+    def page(self, now_ms, count, since_id=None, max_id=None):
+        """
+        Newest tweet IDs that have arrived by the given time, newest first,
+        the way the API pages through them.
+
+        Args:
+            now_ms (int): Time in milliseconds since the epoch
+            count (int): Max number of IDs
+            since_id (int): Only IDs higher than this one
+            max_id (int): Only IDs up to and including this one
+
+        Returns:
+            list[int]: Tweet IDs
+
+        """
+        top = self.count(now_ms) - 1
+        if max_id is not None:
+            top = self.index_at_most(max_id, now_ms)
+        bottom = 0
+        if since_id is not None:
+            bottom = self.index_at_most(since_id, now_ms) + 1
+        bottom = max(bottom, top - count + 1)
+        return [self.tweet_id(i) for i in range(top, bottom - 1, -1)]
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
+import json
 import logging
 import os
 import sqlite3
 import sys
+import time
 
 from datetime import datetime
 from gzip import GzipFile
@@ -19,6 +22,9 @@ from twicorder.constants import (
 )
 from twicorder.config import Config
 
+# Bytes to read at a time when streaming files
+CHUNK_SIZE = 1024 * 1024
+
 
 class TwiLogger:
 
@@ -113,7 +119,7 @@ class AppData:
 
     def __init__(self):
         self._config = Config.get()
-        self._data_path = os.path.join(self._config['appdata'])
+        self._data_path = os.path.join(self._config['appdata_dir'])
         os.makedirs(self._data_path, exist_ok=True)
         filepath = os.path.join(self._data_path, 'twicorder.sql')
         self._conn = sqlite3.connect(
@@ -147,6 +153,73 @@ class AppData:
             '''
         )
 
+    def _make_checkpoint_table(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS query_checkpoints (
+                query_hash TEXT PRIMARY KEY,
+                query_name TEXT NOT NULL,
+                output TEXT,
+                kwargs TEXT NOT NULL,
+                cursor TEXT,
+                timestamp INTEGER NOT NULL
+            )
+            '''
+        )
+
+    def _make_task_stats_table(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS task_stats (
+                task_hash TEXT PRIMARY KEY,
+                yield_rate REAL,
+                frequency REAL,
+                last_yield REAL,
+                runs INTEGER NOT NULL
+            )
+            '''
+        )
+
+    def _make_archive_slices_table(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS archive_slices (
+                plan_hash TEXT NOT NULL,
+                from_date TEXT NOT NULL,
+                to_date TEXT NOT NULL,
+                tweet_count INTEGER NOT NULL,
+                done INTEGER NOT NULL,
+                PRIMARY KEY (plan_hash, from_date)
+            )
+            '''
+        )
+
+    def _make_hydration_tables(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS hydration_batches (
+                job_hash TEXT NOT NULL,
+                batch_index INTEGER NOT NULL,
+                hydrated INTEGER NOT NULL,
+                missing INTEGER NOT NULL,
+                PRIMARY KEY (job_hash, batch_index)
+            )
+            '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS hydration_missing (
+                job_hash TEXT NOT NULL,
+                tweet_id INTEGER NOT NULL,
+                PRIMARY KEY (job_hash, tweet_id)
+            )
+            '''
+        )
+
     def add_query_tweet(self, query_name, tweet_id, timestamp):
         self._make_query_table(query_name)
         cursor = self._conn.cursor()
@@ -171,6 +244,41 @@ class AppData:
             tweets
         )
 
+    def get_seen_query_tweets(self, query_name, tweet_ids):
+        """
+        Looks up which of the given tweets have already been found by queries
+        of the given kind, without loading all the IDs stored for them.
+
+        Args:
+            query_name (str): Query name
+            tweet_ids (list[int]): Tweet IDs
+
+        Returns:
+            set[int]: IDs of tweets found before
+
+        """
+        self._make_query_table(query_name)
+        cursor = self._conn.cursor()
+        seen = set()
+        # Stay well within SQLite's limit on the number of query parameters
+        chunk_size = 500
+        for idx in range(0, len(tweet_ids), chunk_size):
+            chunk = tweet_ids[idx:idx + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(
+                f'''
+                SELECT
+                    tweet_id
+                FROM
+                    {query_name}
+                WHERE
+                    tweet_id IN ({placeholders})
+                ''',
+                chunk
+            )
+            seen.update(row[0] for row in cursor.fetchall())
+        return seen
+
     def get_query_tweets(self, query_name):
         self._make_query_table(query_name)
         cursor = self._conn.cursor()
@@ -217,6 +325,290 @@ class AppData:
         return result[0]
 
 
+    def set_query_checkpoint(self, query_hash, query_name, output, kwargs,
+                             cursor=None):
+        """
+        Stores a queued or partially completed query, along with its
+        pagination cursor, so it can be resumed in a later session.
+
+        Args:
+            query_hash (str): Query UID
+            query_name (str): Query name, used to look up the query type
+            output (str): Query output directory
+            kwargs (dict): Keyword arguments the query was created with
+            cursor (dict): Pagination state of the query
+
+        """
+        self._make_checkpoint_table()
+        cursor_str = json.dumps(cursor) if cursor is not None else None
+        db_cursor = self._conn.cursor()
+        db_cursor.execute(
+            '''
+            INSERT OR REPLACE INTO query_checkpoints VALUES (
+                ?, ?, ?, ?, ?, ?
+            )
+            ''',
+            (
+                query_hash,
+                query_name,
+                output,
+                json.dumps(kwargs),
+                cursor_str,
+                int(time.time())
+            )
+        )
+
+    def get_query_checkpoints(self):
+        """
+        Lists all checkpointed queries, oldest first.
+
+        Returns:
+            list[tuple]: Query hash, query name, output, kwargs and cursor
+
+        """
+        self._make_checkpoint_table()
+        db_cursor = self._conn.cursor()
+        db_cursor.execute(
+            '''
+            SELECT
+                query_hash, query_name, output, kwargs, cursor
+            FROM
+                query_checkpoints
+            ORDER BY
+                timestamp
+            '''
+        )
+        checkpoints = []
+        for query_hash, query_name, output, kwargs, cursor in db_cursor:
+            checkpoints.append((
+                query_hash,
+                query_name,
+                output,
+                json.loads(kwargs),
+                json.loads(cursor) if cursor else None
+            ))
+        return checkpoints
+
+    def get_query_checkpoint(self, query_hash):
+        """
+        Reads the pagination cursor checkpointed for the given query.
+
+        Args:
+            query_hash (str): Query UID
+
+        Returns:
+            dict: Pagination state, None if no checkpoint was found
+
+        """
+        self._make_checkpoint_table()
+        db_cursor = self._conn.cursor()
+        db_cursor.execute(
+            '''
+            SELECT
+                cursor
+            FROM
+                query_checkpoints
+            WHERE
+                query_hash=?
+            ''',
+            (query_hash,)
+        )
+        result = db_cursor.fetchone()
+        if not result or not result[0]:
+            return
+        return json.loads(result[0])
+
+    def remove_query_checkpoint(self, query_hash):
+        self._make_checkpoint_table()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            DELETE FROM query_checkpoints WHERE query_hash=?
+            ''',
+            (query_hash,)
+        )
+
+    def set_task_stats(self, stats):
+        """
+        Stores the tuning state of tasks.
+
+        Args:
+            stats (list[tuple]): Task hash, yield rate, tuned frequency, time
+                of last yield and number of runs for each task
+
+        """
+        self._make_task_stats_table()
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            '''
+            INSERT OR REPLACE INTO task_stats VALUES (
+                ?, ?, ?, ?, ?
+            )
+            ''',
+            stats
+        )
+
+    def get_task_stats(self):
+        """
+        Reads the tuning state of all tasks.
+
+        Returns:
+            dict: Yield rate, tuned frequency, time of last yield and number of
+                runs by task hash
+
+        """
+        self._make_task_stats_table()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                task_hash, yield_rate, frequency, last_yield, runs
+            FROM
+                task_stats
+            '''
+        )
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def set_archive_slice(self, plan_hash, from_date, to_date, tweet_count,
+                          done):
+        """
+        Stores the progress of a full-archive time slice.
+
+        Args:
+            plan_hash (str): Hash of the plan the slice belongs to
+            from_date (str): Slice start, as "YYYYMMDDHHmm"
+            to_date (str): Slice end, as "YYYYMMDDHHmm"
+            tweet_count (int): Number of tweets found in the slice
+            done (bool): True if the slice has been searched to the end
+
+        """
+        self._make_archive_slices_table()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            INSERT OR REPLACE INTO archive_slices VALUES (
+                ?, ?, ?, ?, ?
+            )
+            ''',
+            (plan_hash, from_date, to_date, tweet_count, int(done))
+        )
+
+    def get_archive_slices(self, plan_hash):
+        """
+        Reads all time slices stored for a full-archive plan.
+
+        Args:
+            plan_hash (str): Hash of the plan
+
+        Returns:
+            list[tuple]: From date, to date, tweet count and done state for
+                each slice, newest first
+
+        """
+        self._make_archive_slices_table()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                from_date, to_date, tweet_count, done
+            FROM
+                archive_slices
+            WHERE
+                plan_hash=?
+            ORDER BY
+                from_date DESC
+            ''',
+            (plan_hash,)
+        )
+        return [(f, t, c, bool(d)) for f, t, c, d in cursor.fetchall()]
+
+    @auto_commit
+    def add_hydration_batch(self, job_hash, batch_index, hydrated, missing):
+        """
+        Records a completed hydration batch, along with the IDs of tweets that
+        could not be found.
+
+        Args:
+            job_hash (str): Hash of the hydration job
+            batch_index (int): Index of the batch within the job
+            hydrated (int): Number of tweets found
+            missing (list[int]): IDs of tweets that could not be found
+
+        """
+        self._make_hydration_tables()
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            '''
+            INSERT OR REPLACE INTO hydration_missing VALUES (
+                ?, ?
+            )
+            ''',
+            [(job_hash, tweet_id) for tweet_id in missing]
+        )
+        cursor.execute(
+            '''
+            INSERT OR REPLACE INTO hydration_batches VALUES (
+                ?, ?, ?, ?
+            )
+            ''',
+            (job_hash, batch_index, hydrated, len(missing))
+        )
+
+    def get_hydration_batches(self, job_hash):
+        """
+        Lists the batches already completed for a hydration job.
+
+        Args:
+            job_hash (str): Hash of the hydration job
+
+        Returns:
+            set[int]: Batch indices
+
+        """
+        self._make_hydration_tables()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                batch_index
+            FROM
+                hydration_batches
+            WHERE
+                job_hash=?
+            ''',
+            (job_hash,)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def get_hydration_missing(self, job_hash):
+        """
+        Lists IDs of tweets a hydration job could not find.
+
+        Args:
+            job_hash (str): Hash of the hydration job
+
+        Returns:
+            list[int]: Tweet IDs
+
+        """
+        self._make_hydration_tables()
+        cursor = self._conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                tweet_id
+            FROM
+                hydration_missing
+            WHERE
+                job_hash=?
+            ORDER BY
+                tweet_id
+            ''',
+            (job_hash,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
 def twopen(filename, mode='r'):
     """
     Replacement method for Python's build-in open. Adds the option to handle
@@ -282,6 +674,85 @@ def readlines(filename):
         return data
 
 
+def open_binary(filename, chunk_size=CHUNK_SIZE):
+    """
+    Opens a plain or compressed file for reading bytes through a buffer of
+    the given size. Compressed files are decompressed as they are read.
+
+    Args:
+        filename (str): Path to file
+        chunk_size (int): Buffer size in bytes
+
+    Returns:
+        BufferedReader: File object
+
+    Raises:
+        IOError: If extension is unknown.
+
+    """
+    filename = os.path.expanduser(filename)
+    ext = os.path.splitext(filename)[-1].strip('.')
+    if ext in REGULAR_EXTENSIONS:
+        return open(file=filename, mode='rb', buffering=chunk_size)
+    elif ext in COMPRESSED_EXTENSIONS:
+        # GzipFile buffers decompressed data in small pieces of its own.
+        # Reading through a larger buffer decompresses in chunk sized reads.
+        gzip_file = GzipFile(filename=filename, mode='rb')
+        return io.BufferedReader(gzip_file, buffer_size=chunk_size)
+    else:
+        raise IOError('Unrecognised format: {}'.format(ext))
+
+
+def iterlines(filename, offset=0, chunk_size=CHUNK_SIZE):
+    """
+    Streams the lines of a plain or compressed file. The file is read in
+    chunks, so memory use stays the same regardless of the size of the file.
+
+    Args:
+        filename (str): Path to file to read
+        offset (int): Byte offset to start reading from, into the
+            decompressed data for compressed files
+        chunk_size (int): Bytes to read at a time
+
+    Yields:
+        bytes: Line, including its line ending
+
+    """
+    with open_binary(filename, chunk_size) as file_object:
+        if offset:
+            file_object.seek(offset)
+        yield from file_object
+
+
+def iterrecords(filename, strict=False):
+    """
+    Streams the records of a file with one JSON record per line, such as the
+    raw files written by the listener and search queries. Blank lines are
+    skipped.
+
+    Args:
+        filename (str): Path to file to read
+        strict (bool): Raise on lines which are not valid JSON, rather than
+            logging and skipping them
+
+    Yields:
+        dict: Record
+
+    Raises:
+        ValueError: If strict and a line is not valid JSON
+
+    """
+    for idx, line in enumerate(iterlines(filename)):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            if strict:
+                raise
+            TwiLogger.warning(f'Unable to read line {filename}:{idx + 1}')
+
+
 def write(data, filename, mode='a'):
     """
     Appending data to the given file.
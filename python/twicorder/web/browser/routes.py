@@ -13,7 +13,7 @@ from subprocess import check_output
 from twicorder import mongo
 from twicorder.config import Config
 from twicorder.constants import TW_TIME_FORMAT
-from twicorder.utils import readlines, TwiLogger
+from twicorder.utils import iterrecords, TwiLogger
 from twicorder.web.browser import app, db
 from twicorder.web.browser.forms import LoginForm, RegistrationForm
 from twicorder.web.browser.models import User
@@ -194,8 +194,7 @@ def raw(req_path):
         return abort(404)
 
     found_tweet = None
-    for line in readlines(abs_path):
-        tweet = json.loads(line)
+    for tweet in iterrecords(abs_path):
         if tweet.get('id_str') == tweet_id:
             found_tweet = tweet
             break
@@ -223,10 +222,8 @@ def index(req_path):
 
     # Check if path is a file and serve
     if os.path.isfile(abs_path):
-        tweets = [json.loads(l) for l in readlines(abs_path)]
-
         # Filter out lines not containing tweets, such as delete messages.
-        tweets = [t for t in tweets if t.get('id')]
+        tweets = [t for t in iterrecords(abs_path) if t.get('id')]
 
         for t in tweets:
             format_tweet(t)
@@ -9,7 +9,7 @@ import os
 from PyQt5 import QtCore
 
 from twicorder.config import Config
-from twicorder.utils import readlines
+from twicorder.utils import iterlines
 
 
 class TweetLoader(QtCore.QThread):
@@ -30,7 +30,7 @@ class TweetLoader(QtCore.QThread):
         self.loading_started.emit(len(paths))
         for idx, path in enumerate(paths):
             self.start_file.emit(idx + 1)
-            for line in readlines(path):
+            for line in iterlines(path):
                 try:
                     self.tweet_loaded.emit(json.loads(line))
                 except Exception:
@@ -2,11 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import glob
-import json
 import os
 
 from twicorder.config import Config
-from twicorder.utils import read
+from twicorder.utils import iterrecords
 
 
 class TwiFile(object):
@@ -43,8 +42,7 @@ class TwiFile(object):
     @property
     def data(self):
         if not self.__data:
-            for line in read(self.__path).splitlines():
-                self.__data.append(json.loads(line))
+            self.__data.extend(iterrecords(self.__path))
         return self.__data
 
 